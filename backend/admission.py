@@ -0,0 +1,149 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
+
+from loguru import logger
+
+from loop_monitor import LoopLagMonitor
+
+PENDING_TTL_SECONDS = 90 # Outbound calls still ringing hold a slot at most this long
+CANCEL_GRACE_SECONDS = 30 # Time given to cancelled calls to finish their uploads
+
+
+class AdmissionDecision(NamedTuple):
+    admitted: bool
+    reason: Optional[str] = None
+    retry_after: int = 0
+
+
+class AdmissionController:
+    """
+    Decides whether the process can take another call.
+
+    Counts live pipelines plus outbound calls that were dialed but have not
+    connected their media stream yet, globally and per agent, and refuses new
+    work while the event loop is lagging or the process is draining.
+    """
+
+    def __init__(self, max_calls: int, max_loop_lag_ms: float, lag_monitor: LoopLagMonitor,
+                 retry_after: int = 30):
+        self.max_calls = max_calls
+        self.max_loop_lag_ms = max_loop_lag_ms
+        self.lag_monitor = lag_monitor
+        self.retry_after = retry_after
+        self.active = {}  # call_sid -> {"agent_id", "started_at", "task"}
+        self.pending = {} # call_sid -> {"agent_id", "expires_at"}
+        self.rejected = {"draining": 0, "capacity": 0, "agent_capacity": 0, "loop_lag": 0}
+        self.draining = False
+        self.drain_started_at: Optional[float] = None
+        self.drain_deadline: Optional[float] = None
+        self.drain_cancelled = 0
+
+    def _expire_pending(self):
+        now = time.time()
+        for call_sid in [sid for sid, p in self.pending.items() if p["expires_at"] < now]:
+            del self.pending[call_sid]
+
+    def load(self, agent_id: Optional[str] = None) -> int:
+        self._expire_pending()
+        calls = list(self.active.values()) + list(self.pending.values())
+        if agent_id is None:
+            return len(calls)
+        return sum(1 for c in calls if c["agent_id"] == agent_id)
+
+    def _refusal_reason(self, agent_id: str, agent_limit: Optional[int]) -> Optional[str]:
+        if self.draining:
+            return "draining"
+        if self.lag_monitor.current_lag_ms > self.max_loop_lag_ms:
+            return "loop_lag"
+        if self.max_calls and self.load() >= self.max_calls:
+            return "capacity"
+        if agent_limit and self.load(agent_id) >= agent_limit:
+            return "agent_capacity"
+        return None
+
+    def check(self, agent_id: str, agent_limit: Optional[int] = None) -> AdmissionDecision:
+        """Checks capacity for a new call of `agent_id` without reserving it."""
+        reason = self._refusal_reason(agent_id, agent_limit)
+        if reason is None:
+            return AdmissionDecision(True)
+
+        self.rejected[reason] += 1
+        logger.warning(f"Admission refused for agent {agent_id}: {reason} ({self.load()} calls)")
+        return AdmissionDecision(False, reason, self.retry_after)
+
+    async def wait_for_capacity(self, agent_id: str, agent_limit: Optional[int], timeout: float) -> AdmissionDecision:
+        """Waits up to `timeout` seconds for capacity, then decides."""
+        deadline = time.monotonic() + timeout
+        while self._refusal_reason(agent_id, agent_limit) and time.monotonic() < deadline:
+            await asyncio.sleep(min(1.0, max(0.0, deadline - time.monotonic())))
+        return self.check(agent_id, agent_limit)
+
+    def reserve(self, call_sid: str, agent_id: str):
+        """Holds a slot for a call that is ringing (outbound) or about to connect its stream (inbound)."""
+        self.pending[call_sid] = {"agent_id": agent_id, "expires_at": time.time() + PENDING_TTL_SECONDS}
+
+    def is_reserved(self, call_sid: str) -> bool:
+        self._expire_pending()
+        return call_sid in self.pending or call_sid in self.active
+
+    @contextmanager
+    def track(self, call_sid: str, agent_id: str):
+        """Marks a pipeline as live for the duration of the block."""
+        self.pending.pop(call_sid, None)
+        self.active[call_sid] = {"agent_id": agent_id, "started_at": time.time(), "task": asyncio.current_task()}
+        try:
+            yield
+        finally:
+            self.active.pop(call_sid, None)
+
+    def start_draining(self, timeout: float):
+        """Stops admitting new calls. Live calls keep running until drain() times out."""
+        if not self.draining:
+            logger.info(f"Draining: refusing new calls, {len(self.active)} live calls get up to {timeout:.0f}s to finish")
+            self.draining = True
+            self.drain_started_at = time.time()
+            self.drain_deadline = self.drain_started_at + timeout
+
+    async def drain(self, timeout: float):
+        """
+        Waits for live calls (and the uploads they run on hangup) to finish.
+        Calls still running at the deadline are cancelled, which ends them and
+        lets their cleanup upload recording and transcript.
+        """
+        self.start_draining(timeout)
+        while (self.active or self.pending) and time.time() < self.drain_deadline:
+            await asyncio.sleep(0.5)
+            self._expire_pending()
+
+        leftovers = [c["task"] for c in self.active.values() if c["task"] and not c["task"].done()]
+        if leftovers:
+            logger.warning(f"Drain deadline reached, cancelling {len(leftovers)} live calls")
+            self.drain_cancelled += len(leftovers)
+            for task in leftovers:
+                task.cancel()
+            await asyncio.wait(leftovers, timeout=CANCEL_GRACE_SECONDS)
+
+        logger.info("Drain complete.")
+
+    @property
+    def drained(self) -> bool:
+        return self.draining and not self.active
+
+    def snapshot(self) -> dict:
+        self._expire_pending()
+        per_agent = {}
+        for call in list(self.active.values()) + list(self.pending.values()):
+            per_agent[call["agent_id"]] = per_agent.get(call["agent_id"], 0) + 1
+        return {
+            "active_calls": len(self.active),
+            "pending_calls": len(self.pending),
+            "max_calls": self.max_calls,
+            "max_loop_lag_ms": self.max_loop_lag_ms,
+            "calls_per_agent": per_agent,
+            "rejected": dict(self.rejected),
+            "draining": self.draining,
+            "drain_deadline": self.drain_deadline,
+            "loop": self.lag_monitor.snapshot(),
+        }
@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from loguru import logger
+
+DB_FILE = os.getenv("AGENT_DB_FILE", "agent_settings.db")
+
+
+class VersionConflict(Exception):
+    """The agent changed since the version the caller read."""
+
+    def __init__(self, agent_id: str, expected: int, current: int):
+        super().__init__(f"Agent {agent_id} is at version {current}, not {expected}")
+        self.agent_id = agent_id
+        self.expected = expected
+        self.current = current
+
+
+class AgentStore:
+    """
+    Agent configurations in SQLite, one row per agent.
+
+    Every write runs in its own transaction and bumps the agent's version; each
+    version is also kept in `agent_versions`, so a call that started on version
+    N keeps using it while the agent is edited (or deleted) mid-campaign.
+    """
+
+    def __init__(self, path: str = DB_FILE):
+        self.path = path
+        self._local = threading.local() # sqlite3 connections are per thread
+        with self._transaction() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS agents (
+                    id TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )""")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS agent_versions (
+                    id TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (id, version)
+                )""")
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, isolation_level=None, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL") # Readers never wait for a writer
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE") # Take the write lock up front: read-modify-write cannot interleave
+        try:
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _decode(data: str, version: int) -> Dict[str, Any]:
+        agent = json.loads(data)
+        agent["version"] = version
+        return agent
+
+    def _write(self, db: sqlite3.Connection, agent_id: str, agent: Dict[str, Any]) -> Dict[str, Any]:
+        # Versions keep increasing across delete/re-create, so a pinned version never changes meaning
+        (last,) = db.execute("SELECT COALESCE(MAX(version), 0) FROM agent_versions WHERE id = ?", (agent_id,)).fetchone()
+        version = last + 1
+        agent = {k: v for k, v in agent.items() if k != "version"}
+        data = json.dumps(agent, ensure_ascii=False)
+        now = time.time()
+        # Upsert keeps the rowid, so the agent list keeps its creation order
+        db.execute("""
+            INSERT INTO agents (id, version, data, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET version = excluded.version, data = excluded.data, updated_at = excluded.updated_at
+            """, (agent_id, version, data, now))
+        db.execute("INSERT INTO agent_versions (id, version, data, created_at) VALUES (?, ?, ?, ?)",
+                   (agent_id, version, data, now))
+        return {**agent, "version": version}
+
+    # --- Reads ---
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM agents").fetchone()[0]
+
+    def list(self) -> Dict[str, Dict[str, Any]]:
+        rows = self._connection().execute("SELECT id, version, data FROM agents ORDER BY rowid")
+        return {agent_id: self._decode(data, version) for agent_id, version, data in rows}
+
+    def get(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute("SELECT version, data FROM agents WHERE id = ?", (agent_id,)).fetchone()
+        return self._decode(row[1], row[0]) if row else None
+
+    def get_version(self, agent_id: str, version: int) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            "SELECT data FROM agent_versions WHERE id = ? AND version = ?", (agent_id, version)
+        ).fetchone()
+        return self._decode(row[0], version) if row else None
+
+    # --- Writes ---
+
+    def put(self, agent_id: str, agent: Dict[str, Any]) -> Dict[str, Any]:
+        """Creates or replaces an agent."""
+        with self._transaction() as db:
+            return self._write(db, agent_id, agent)
+
+    def update(self, agent_id: str, changes: Dict[str, Any], expected_version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Merges `changes` into the agent. With `expected_version`, raises
+        VersionConflict if someone else saved in between.
+        """
+        with self._transaction() as db:
+            row = db.execute("SELECT version, data FROM agents WHERE id = ?", (agent_id,)).fetchone()
+            if row is None:
+                return None
+            if expected_version is not None and expected_version != row[0]:
+                raise VersionConflict(agent_id, expected_version, row[0])
+            agent = json.loads(row[1])
+            agent.update(changes)
+            return self._write(db, agent_id, agent)
+
+    def delete(self, agent_id: str) -> bool:
+        """Removes the agent; its versions stay for calls that pinned one."""
+        with self._transaction() as db:
+            return db.execute("DELETE FROM agents WHERE id = ?", (agent_id,)).rowcount > 0
+
+    def import_agents(self, agents: Dict[str, Dict[str, Any]]) -> int:
+        """Loads agents (e.g. from the old JSON file) in a single transaction."""
+        with self._transaction() as db:
+            for agent_id, agent in agents.items():
+                self._write(db, agent_id, agent)
+        logger.info(f"Imported {len(agents)} agents into {self.path}")
+        return len(agents)
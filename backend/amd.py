@@ -0,0 +1,80 @@
+"""
+Answering-machine detection (AMD) results and their per-mode metrics.
+
+AMD_MODE=sync is Twilio's regular AMD: the call is held in silence until
+detection finishes and /voice gets `AnsweredBy`. In async mode /voice (and
+the bot) start as soon as the call is answered and the result arrives later
+on /amd-status; a machine is then sent to the agent's voicemail message or
+hung up. `summarize` compares modes on what that trade is about: how long
+a person waits for the greeting, and how often they hang up early.
+"""
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from call_metrics import percentile
+
+MACHINE_RESULTS = {"machine_start", "machine_end_beep", "machine_end_silence", "machine_end_other", "fax"}
+MESSAGE_END_RESULTS = {"machine_end_beep", "machine_end_silence", "machine_end_other"} # Recording has started
+EARLY_HANGUP_SECONDS = float(os.getenv("AMD_EARLY_HANGUP_SECONDS", "10")) # A person leaving this fast counts as a hang-up
+
+
+def is_machine(answered_by: Optional[str]) -> bool:
+    return (answered_by or "").lower() in MACHINE_RESULTS
+
+
+class AMDResults:
+    """Latest AMD result per call, until the call's metrics are written."""
+
+    def __init__(self, ttl: float = 3600):
+        self.ttl = ttl
+        self.results = {} # call_sid -> {"answered_by", "amd_ms", "received_at", "action"?}
+
+    def record(self, call_sid: str, answered_by: Optional[str], amd_ms: Optional[str] = None) -> Dict[str, Any]:
+        now = time.time()
+        self.results = {sid: r for sid, r in self.results.items() if now - r["received_at"] < self.ttl}
+        result = {
+            "answered_by": (answered_by or "unknown").lower(),
+            "amd_ms": int(amd_ms) if amd_ms and str(amd_ms).isdigit() else None,
+            "received_at": now,
+        }
+        self.results[call_sid] = result
+        return result
+
+    def get(self, call_sid: str) -> Optional[Dict[str, Any]]:
+        return self.results.get(call_sid)
+
+
+def summarize(calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Per AMD mode: results, answer-to-greeting latency and early hang-ups of people."""
+    modes = {}
+    for call in calls:
+        data = call["data"]
+        if "amd_mode" not in data:
+            continue
+        entry = modes.setdefault(data["amd_mode"], {"calls": 0, "answered_by": {}, "greeting": [], "humans": 0, "hangups": 0})
+        entry["calls"] += 1
+        answered_by = data.get("answered_by") or "pending"
+        entry["answered_by"][answered_by] = entry["answered_by"].get(answered_by, 0) + 1
+        if is_machine(answered_by):
+            continue
+
+        # People, plus calls AMD had not classified (async results can arrive after a short call)
+        entry["humans"] += 1
+        if data.get("answer_to_greeting_ms") is not None:
+            entry["greeting"].append(data["answer_to_greeting_ms"])
+        answered_at = data.get("answered_at") or call["started_at"]
+        if data.get("ended_by") == "caller" and call["ended_at"] - answered_at < EARLY_HANGUP_SECONDS:
+            entry["hangups"] += 1
+
+    return [{
+        "amd_mode": mode,
+        "calls": entry["calls"],
+        "answered_by": entry["answered_by"],
+        "answer_to_greeting_ms": {"p50": percentile(entry["greeting"], 50), "p90": percentile(entry["greeting"], 90)},
+        "human_calls": entry["humans"],
+        "human_hangup_rate": round(entry["hangups"] / entry["humans"], 3) if entry["humans"] else None,
+    } for mode, entry in sorted(modes.items())]
+
+
+results = AMDResults()
@@ -0,0 +1,147 @@
+import os
+import time
+import asyncio
+import datetime
+from typing import Callable, Optional
+from loguru import logger
+
+import gcs
+
+RECORDINGS_PREFIX = "grabaciones/"
+TRANSCRIPTS_PREFIX = "transcripciones/"
+REFRESH_SECONDS = int(os.getenv("ARTIFACT_INDEX_REFRESH_SECONDS", "60"))
+FULL_REFRESH_SECONDS = int(os.getenv("ARTIFACT_INDEX_FULL_REFRESH_SECONDS", "3600"))
+RECENT_DAYS = 2 # Date folders re-listed on an incremental refresh (yesterday covers calls across midnight)
+
+WAV_HEADER_BYTES = 44
+PCM_BYTES_PER_SECOND = 8000 * 2 # Recordings are 8kHz 16-bit mono
+
+
+class ArtifactIndex:
+    """
+    In-memory index of the recordings, waveforms and transcripts in GCS, keyed
+    by call_sid, so the call list can ask about a whole page in one request.
+
+    Built from a prefix listing (one request per 1000 objects, names and sizes
+    only). Later refreshes re-list only the recent date folders of
+    `grabaciones/`; `transcripciones/` is flat (a listing costs one request
+    per 1000 calls ever made), so new transcripts come from the spool, which
+    reports every upload this process finishes, and the full re-list every
+    FULL_REFRESH_SECONDS picks up the rest.
+    """
+
+    def __init__(self, lister: Callable[[str], list] = gcs.list_blobs,
+                 refresh_seconds: float = REFRESH_SECONDS, full_refresh_seconds: float = FULL_REFRESH_SECONDS):
+        self.lister = lister
+        self.refresh_seconds = refresh_seconds
+        self.full_refresh_seconds = full_refresh_seconds
+        self.recordings = {} # call_sid -> {"blob", "size", "updated"}
+        self.waveforms = {}  # call_sid -> blob name
+        self.transcripts = {} # call_sid -> {"blob", "size", "updated"}
+        self.refreshed_at = 0.0
+        self.full_refreshed_at = 0.0
+        self.listings = 0
+        self._uploads = [] # (time, job) since the last full refresh, replayed over the next one
+        self._lock = asyncio.Lock()
+
+    def add(self, name: str, size: Optional[int], updated=None):
+        """Files one object under its call_sid; names that are not call artifacts are ignored."""
+        entry = {"blob": name, "size": size, "updated": updated.isoformat() if updated else None}
+        if name.startswith(TRANSCRIPTS_PREFIX) and name.endswith(".json"):
+            self.transcripts[name[len(TRANSCRIPTS_PREFIX):-5]] = entry
+        elif name.startswith(RECORDINGS_PREFIX):
+            filename = name.rsplit("/", 1)[-1]
+            if filename.endswith(".waveform.json"):
+                self.waveforms[filename[:-len(".waveform.json")]] = name
+            elif filename.endswith((".wav", ".flac")):
+                self.recordings[os.path.splitext(filename)[0]] = entry
+
+    def contains(self, name: str) -> bool:
+        """Whether the index has this object. False means "not known", not "missing"."""
+        if name.startswith(TRANSCRIPTS_PREFIX) and name.endswith(".json"):
+            entry = self.transcripts.get(name[len(TRANSCRIPTS_PREFIX):-5])
+            return bool(entry and entry["blob"] == name)
+        filename = name.rsplit("/", 1)[-1]
+        if filename.endswith(".waveform.json"):
+            return self.waveforms.get(filename[:-len(".waveform.json")]) == name
+        entry = self.recordings.get(os.path.splitext(filename)[0])
+        return bool(entry and entry["blob"] == name)
+
+    def record_upload(self, job: dict):
+        """Upload spool listener: indexes what this process just uploaded."""
+        self._uploads.append((time.time(), job))
+        self.add(job["blob_name"], job.get("size"), datetime.datetime.now(datetime.timezone.utc))
+
+    def _list(self, prefixes: list) -> list:
+        objects = []
+        for prefix in prefixes:
+            objects.extend(self.lister(prefix))
+            self.listings += 1
+        return objects
+
+    async def refresh(self, force: bool = False):
+        """Re-lists GCS if the index is older than refresh_seconds (or `force`)."""
+        async with self._lock: # Concurrent page loads share one listing
+            now = time.time()
+            if not force and now - self.refreshed_at < self.refresh_seconds:
+                return
+
+            full = force or now - self.full_refreshed_at >= self.full_refresh_seconds
+            if full:
+                prefixes = [RECORDINGS_PREFIX, TRANSCRIPTS_PREFIX]
+            else:
+                today = datetime.date.today()
+                prefixes = [f"{RECORDINGS_PREFIX}{today - datetime.timedelta(days=d)}/" for d in range(RECENT_DAYS)]
+
+            started = time.perf_counter()
+            objects = await asyncio.to_thread(self._list, prefixes)
+            if full:
+                # A full listing also drops objects deleted from the bucket
+                self.recordings, self.waveforms, self.transcripts = {}, {}, {}
+                self.full_refreshed_at = now
+            for name, size, updated in objects:
+                self.add(name, size, updated)
+            if full:
+                # Uploads that finished while the listing was in flight may be missing from it
+                self._uploads = [(t, job) for t, job in self._uploads if t >= now]
+                for _, job in self._uploads:
+                    self.add(job["blob_name"], job.get("size"))
+            self.refreshed_at = now
+            logger.info(f"Artifact index {'full' if full else 'incremental'} refresh: {len(objects)} objects in {time.perf_counter() - started:.2f}s")
+
+    def lookup(self, call_sid: str) -> dict:
+        recording = self.recordings.get(call_sid)
+        transcript = self.transcripts.get(call_sid)
+        result = {
+            "recording": None,
+            "transcript": None,
+            "waveform": call_sid in self.waveforms,
+        }
+        if recording:
+            is_wav = recording["blob"].endswith(".wav")
+            duration = None
+            if is_wav and recording["size"] is not None:
+                duration = round(max(0, recording["size"] - WAV_HEADER_BYTES) / PCM_BYTES_PER_SECOND, 2)
+            result["recording"] = {
+                "format": "wav" if is_wav else "flac",
+                "size": recording["size"],
+                "duration_seconds": duration, # FLAC size says nothing about length
+                "updated": recording["updated"],
+            }
+        if transcript:
+            result["transcript"] = {"size": transcript["size"], "updated": transcript["updated"]}
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "recordings": len(self.recordings),
+            "waveforms": len(self.waveforms),
+            "transcripts": len(self.transcripts),
+            "refreshed_at": self.refreshed_at or None,
+            "full_refreshed_at": self.full_refreshed_at or None,
+            "listings": self.listings,
+        }
+
+
+# Process-wide index; the upload spool feeds it as uploads finish
+index = ArtifactIndex()
@@ -0,0 +1,510 @@
+"""
+Offline micro-benchmarks for the code that runs per audio frame or per request.
+
+Every benchmark reports the best-of-N time per operation (the least noisy
+statistic for micro-benchmarks, as timeit recommends) and is compared against
+the stored baseline (benchmark_baseline.json). A benchmark fails when it is
+slower than its baseline by more than its tolerance. Baselines are machine
+specific: regenerate them on the host that runs the check.
+
+Usage:
+    python benchmark.py                       # run all, exit 1 on regression
+    python benchmark.py -k recorder           # run only matching benchmarks
+    python benchmark.py --report report.json  # write machine-readable report
+    python benchmark.py --update-baseline     # store current results as baseline
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from loguru import logger
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(BASE_DIR, "benchmark_baseline.json")
+DEFAULT_TOLERANCE = 0.50  # 50% slower than baseline is a regression
+DEFAULT_REPEAT = 9
+
+# name -> {"setup": callable, "ops": int, "tolerance": float | None}
+BENCHMARKS = {}
+
+
+def benchmark(name: str, ops: int = 1, tolerance: float = None):
+    """
+    Registers a benchmark. The decorated setup function returns a tuple
+    (run, teardown) where `run()` performs `ops` operations and `teardown`
+    may be None.
+    """
+    def register(setup):
+        BENCHMARKS[name] = {"setup": setup, "ops": ops, "tolerance": tolerance}
+        return setup
+    return register
+
+
+# --- Fixtures ---
+
+FRAME_BYTES = 160  # 20ms of 8kHz mu-law, the size Twilio sends
+
+
+def _mulaw_frame(seed: int = 0) -> bytes:
+    return bytes((i * 37 + seed) % 256 for i in range(FRAME_BYTES))
+
+
+def _media_message(payload: str, stream_sid: str = "MZ" + "0" * 32) -> str:
+    return json.dumps({
+        "event": "media",
+        "streamSid": stream_sid,
+        "media": {"track": "inbound", "chunk": "1", "timestamp": "20", "payload": payload},
+    })
+
+
+class _FakeWebSocket:
+    """Minimal stand-in for the FastAPI WebSocket used by RecordingWebSocket."""
+
+    def __init__(self, message: str):
+        self._message = message
+
+    async def receive_text(self) -> str:
+        return self._message
+
+    async def send_text(self, data: str):
+        return None
+
+
+def _new_recorder():
+    from recorder import CallRecorder
+    return CallRecorder("CA_benchmark")
+
+
+def _discard_recorder(recorder):
+    recorder.closed = True
+    try:
+        recorder.wav_file.close()
+        recorder.temp_file.close()
+    finally:
+        if os.path.exists(recorder.temp_file.name):
+            os.remove(recorder.temp_file.name)
+
+
+def _large_agent_settings(agent_count: int = 200) -> dict:
+    prompt = ("Eres un agente de cobranzas de SIAC. Cliente {{nombre}}, deuda {{monto}}. " * 60).strip()
+    agents = {}
+    for i in range(agent_count):
+        agent_id = "default" if i == 0 else f"agent-{i:04d}"
+        agents[agent_id] = {
+            "id": agent_id,
+            "name": f"Agente {i}",
+            "system_prompt": prompt,
+            "voice_id": "Charon",
+            "language": "es-US",
+            "variables": [
+                {"key": f"var_{j}", "description": "Variable de prueba", "example": "valor"}
+                for j in range(8)
+            ],
+        }
+    return {"agents": agents}
+
+
+# --- Benchmarks ---
+
+@benchmark("recorder.write_chunk", ops=1000, tolerance=0.75)
+def bench_recorder_write_chunk():
+    recorder = _new_recorder()
+    payload = base64.b64encode(_mulaw_frame()).decode("ascii")
+
+    def run():
+        for _ in range(1000):
+            recorder.write_chunk(payload)
+
+    return run, lambda: _discard_recorder(recorder)
+
+
+@benchmark("recording_ws.receive_text", ops=1000)
+def bench_recording_ws_receive():
+    from recorder import RecordingWebSocket
+    recorder = _new_recorder()
+    message = _media_message(base64.b64encode(_mulaw_frame()).decode("ascii"))
+    ws = RecordingWebSocket(_FakeWebSocket(message), recorder)
+    loop = asyncio.new_event_loop()
+
+    async def batch():
+        for _ in range(1000):
+            await ws.receive_text()
+
+    def teardown():
+        loop.close()
+        _discard_recorder(recorder)
+
+    return lambda: loop.run_until_complete(batch()), teardown
+
+
+@benchmark("recording_ws.send_text", ops=1000)
+def bench_recording_ws_send():
+    from recorder import RecordingWebSocket
+    recorder = _new_recorder()
+    message = _media_message(base64.b64encode(_mulaw_frame(7)).decode("ascii"))
+    ws = RecordingWebSocket(_FakeWebSocket(message), recorder)
+    loop = asyncio.new_event_loop()
+
+    async def batch():
+        for _ in range(1000):
+            await ws.send_text(message)
+
+    def teardown():
+        loop.close()
+        _discard_recorder(recorder)
+
+    return lambda: loop.run_until_complete(batch()), teardown
+
+
+def _settings_fixture():
+    import settings_manager
+    from agent_store import AgentStore
+    tmp_dir = tempfile.mkdtemp(prefix="siac_bench_")
+    path = os.path.join(tmp_dir, "agent_settings.db")
+    store = AgentStore(path)
+    store.import_agents(_large_agent_settings()["agents"])
+
+    original = settings_manager.store
+    settings_manager.store = store
+
+    def teardown():
+        settings_manager.store = original
+        shutil.rmtree(tmp_dir)
+
+    return settings_manager.SettingsManager, teardown
+
+
+@benchmark("settings.load_settings", ops=20, tolerance=0.75)
+def bench_settings_load():
+    manager, teardown = _settings_fixture()
+
+    def run():
+        for _ in range(20):
+            manager.load_settings()
+
+    return run, teardown
+
+
+@benchmark("settings.get_agent", ops=20, tolerance=0.75)
+def bench_settings_get_agent():
+    manager, teardown = _settings_fixture()
+
+    def run():
+        for i in range(20):
+            manager.get_agent(f"agent-{i + 1:04d}")
+
+    return run, teardown
+
+
+@benchmark("settings.update_agent", ops=20, tolerance=0.75)
+def bench_settings_update_agent():
+    manager, teardown = _settings_fixture()
+
+    def run():
+        for i in range(20):
+            manager.update_agent(f"agent-{i + 1:04d}", {"name": f"Agente {i} editado"})
+
+    return run, teardown
+
+
+@benchmark("bot.render_prompt", ops=100)
+def bench_render_prompt():
+    from settings_manager import SettingsManager
+    prompt = _large_agent_settings(1)["agents"]["default"]["system_prompt"]
+    variables = {"nombre": "Juan Pérez", "monto": "1.250.000"}
+    variables.update({f"var_{j}": f"valor {j}" for j in range(8)})
+
+    def run():
+        for _ in range(100):
+            SettingsManager.render_prompt(prompt, variables)
+
+    return run, None
+
+
+def _stream_response(transcript_logger, text: str, chunk_chars: int):
+    for i in range(0, len(text), chunk_chars):
+        transcript_logger.aggregator.feed(text[i:i + chunk_chars], 0.0, "2026-01-01T00:00:00")
+    transcript_logger._flush_response()
+
+
+@benchmark("transcript.stream_response", ops=200)
+def bench_stream_response():
+    from transcript_logger import TranscriptLogger
+    transcript_logger = TranscriptLogger("CA_benchmark")
+    speech = "Hola, buenas tardes. Le llamo de parte de SIAC para hablar sobre su saldo pendiente. " * 6
+    thought = "**Initiating The Interaction**\n\nI've established the caller's identity and will now explain the debt.\n\n\n"
+
+    def run():
+        for i in range(200):
+            # Output transcription arrives a few words per chunk
+            _stream_response(transcript_logger, thought + speech if i % 4 == 0 else speech, 24)
+        transcript_logger.history.clear()
+
+    return run, None
+
+
+@benchmark("transcript.stream_response[long]", ops=1)
+def bench_stream_long_response():
+    from transcript_logger import TranscriptLogger
+    transcript_logger = TranscriptLogger("CA_benchmark")
+    monologue = "Le explico las condiciones del acuerdo de pago, cuota por cuota. " * 400 # ~26k chars
+
+    def run():
+        _stream_response(transcript_logger, monologue, 8)
+        transcript_logger.history.clear()
+
+    return run, None
+
+
+@benchmark("mulaw.decode_frames[50]", ops=50)
+def bench_mulaw_decode_batch():
+    import numpy as np
+    import mulaw
+    frames = [_mulaw_frame(i) for i in range(50)]
+    out = np.empty(FRAME_BYTES * 50, dtype=np.int16)
+    return lambda: mulaw.decode_frames(frames, out=out), None
+
+
+@benchmark("mulaw.encode[50 frames]", ops=50)
+def bench_mulaw_encode_batch():
+    import numpy as np
+    import mulaw
+    pcm = mulaw.decode_frames([_mulaw_frame(i) for i in range(50)])
+    out = np.empty(pcm.size, dtype=np.uint8)
+    return lambda: mulaw.encode(pcm, out=out), None
+
+
+@benchmark("mulaw.ulaw2lin[1 frame]", ops=1000)
+def bench_mulaw_decode_single():
+    import mulaw
+    frame = _mulaw_frame()
+
+    def run():
+        for _ in range(1000):
+            mulaw.ulaw2lin(frame)
+
+    return run, None
+
+
+def _bot_audio(seconds: float, rate: int = 24000):
+    import numpy as np
+    t = np.arange(int(rate * seconds)) / rate
+    speech_like = 6000 * np.sin(2 * np.pi * 220 * t) + 2000 * np.sin(2 * np.pi * 3100 * t)
+    return speech_like.astype(np.int16)
+
+
+for _quality in ("fast", "medium", "high"):
+    @benchmark(f"resampler.24k_to_8k[{_quality}, 20ms chunk]", ops=500)
+    def bench_resampler_chunk(quality=_quality):
+        from resampler import StreamingResampler
+        resampler = StreamingResampler(24000, 8000, quality)
+        chunk = _bot_audio(0.02)
+
+        def run():
+            for _ in range(500):
+                resampler.process(chunk)
+
+        return run, None
+
+
+@benchmark("resampler.24k_to_8k[medium, call minute]", ops=1)
+def bench_resampler_call_minute():
+    # CPU for one minute of bot audio, fed in 20ms chunks as the pipeline does
+    from resampler import StreamingResampler
+    resampler = StreamingResampler(24000, 8000, "medium")
+    audio = _bot_audio(60)
+    chunks = [audio[i:i + 480] for i in range(0, audio.size, 480)]
+
+    def run():
+        for chunk in chunks:
+            resampler.process(chunk)
+
+    return run, None
+
+
+@benchmark("serializer.serialize[20ms bot audio]", ops=200)
+def bench_serializer_serialize():
+    from pipecat.frames.frames import OutputAudioRawFrame
+    from twilio_serializer import MulawTwilioFrameSerializer
+    serializer = MulawTwilioFrameSerializer(stream_sid="MZ" + "0" * 32)
+    frame = OutputAudioRawFrame(audio=_bot_audio(0.02).tobytes(), sample_rate=24000, num_channels=1)
+    loop = asyncio.new_event_loop()
+
+    async def batch():
+        for _ in range(200):
+            await serializer.serialize(frame)
+
+    return lambda: loop.run_until_complete(batch()), loop.close
+
+
+@benchmark("vad.analyzer[per call]", ops=20)
+def bench_vad_analyzer():
+    # Blocking work at the start of each call; the model session is loaded once by warm-up
+    import vad
+    vad.model_session()
+
+    return lambda: [vad.SharedSileroVADAnalyzer() for _ in range(20)], None
+
+
+try:
+    import soxr  # What pipecat's default resampler uses, one independent call per chunk
+except ImportError:
+    soxr = None
+
+if soxr is not None:
+    @benchmark("soxr.resample[24k_to_8k VHQ, 20ms chunk]", ops=500)
+    def bench_soxr_chunk():
+        chunk = _bot_audio(0.02)
+
+        def run():
+            for _ in range(500):
+                soxr.resample(chunk, 24000, 8000, quality="VHQ")
+
+        return run, None
+
+
+try:
+    import audioop  # Removed in Python 3.13; only needed for the comparison
+except ImportError:
+    audioop = None
+
+if audioop is not None:
+    @benchmark("audioop.ulaw2lin[50 frames]", ops=50)
+    def bench_audioop_decode_batch():
+        frames = [_mulaw_frame(i) for i in range(50)]
+        return lambda: [audioop.ulaw2lin(f, 2) for f in frames], None
+
+    @benchmark("audioop.lin2ulaw[50 frames]", ops=50)
+    def bench_audioop_encode_batch():
+        pcm = audioop.ulaw2lin(b"".join(_mulaw_frame(i) for i in range(50)), 2)
+        return lambda: audioop.lin2ulaw(pcm, 2), None
+
+    @benchmark("audioop.ulaw2lin[1 frame]", ops=1000)
+    def bench_audioop_decode_single():
+        frame = _mulaw_frame()
+
+        def run():
+            for _ in range(1000):
+                audioop.ulaw2lin(frame, 2)
+
+        return run, None
+
+
+# --- Runner ---
+
+def measure(name: str, spec: dict, repeat: int) -> dict:
+    run, teardown = spec["setup"]()
+    try:
+        run()  # warm-up
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            samples.append((time.perf_counter() - started) / spec["ops"])
+    finally:
+        if teardown:
+            teardown()
+
+    return {
+        "name": name,
+        "ops": spec["ops"],
+        "repeat": repeat,
+        "median_ns": statistics.median(samples) * 1e9,
+        "min_ns": min(samples) * 1e9,
+        "max_ns": max(samples) * 1e9,
+    }
+
+
+def load_baseline(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("benchmarks", {})
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> dict:
+    reference = baseline.get(result["name"])
+    if not reference:
+        result["status"] = "new"
+        return result
+
+    ratio = result["min_ns"] / reference["min_ns"]
+    result["baseline_ns"] = reference["min_ns"]
+    result["ratio"] = round(ratio, 3)
+    result["tolerance"] = tolerance
+    result["status"] = "regression" if ratio > 1 + tolerance else "ok"
+    return result
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Hot path micro-benchmarks")
+    parser.add_argument("-k", dest="pattern", help="Run only benchmarks whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help=f"Override allowed slowdown ratio (default {DEFAULT_TOLERANCE})")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--report", help="Write JSON report to this path")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    # Keep per-operation logging out of the measurements and the console
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    baseline = load_baseline(args.baseline)
+    results = []
+    for name, spec in BENCHMARKS.items():
+        if args.pattern and args.pattern not in name:
+            continue
+        tolerance = args.tolerance if args.tolerance is not None else (spec["tolerance"] or DEFAULT_TOLERANCE)
+        result = compare(measure(name, spec, args.repeat), baseline, tolerance)
+        results.append(result)
+
+        detail = f"x{result['ratio']:.2f} vs baseline" if "ratio" in result else "no baseline"
+        print(f"{result['status'].upper():<10} {name:<40} {result['min_ns'] / 1000:>10.2f} us/op  ({detail})")
+
+    report = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment(),
+        "benchmarks": {r["name"]: r for r in results},
+    }
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        stored = load_baseline(args.baseline)
+        for r in results:
+            stored[r["name"]] = {"min_ns": r["min_ns"], "median_ns": r["median_ns"], "ops": r["ops"]}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "benchmarks": stored}, f, indent=2, sort_keys=True)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    regressions = [r["name"] for r in results if r["status"] == "regression"]
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,16 @@
 import os
-import sys
-from typing import Optional
+import asyncio
+from typing import Callable, Optional
 
 from fastapi import WebSocket
 from loguru import logger
-from pydantic_settings import BaseSettings, SettingsConfigDict
 
-from pipecat.audio.vad.silero import SileroVADAnalyzer
+from pipecat.audio.vad.vad_analyzer import VADParams
 from pipecat.pipeline.pipeline import Pipeline
 from pipecat.pipeline.runner import PipelineRunner
 from pipecat.pipeline.task import PipelineTask, PipelineParams
 from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContext
-from pipecat.serializers.twilio import TwilioFrameSerializer
-from pipecat.services.gemini_multimodal_live.gemini import GeminiMultimodalLiveLLMService
-from pipecat.transports.network.fastapi_websocket import (
-    FastAPIWebsocketParams,
-    FastAPIWebsocketTransport,
-)
+from pipecat.transports.network.fastapi_websocket import FastAPIWebsocketParams
 from pipecat.processors.frame_processor import FrameProcessor
 from pipecat.frames.frames import InputAudioRawFrame, UserStartedSpeakingFrame, EndFrame
 import time
@@ -45,47 +39,67 @@ class SilenceTimeout(FrameProcessor):
 
 from settings_manager import SettingsManager
 from transcript_logger import TranscriptLogger
+from twilio_serializer import MulawTwilioFrameSerializer
+from pacing import PacedWebsocketTransport
+from config import settings
+from vad import SharedSileroVADAnalyzer
+from turn_metrics import LLMUsageMeter, TurnLatencyTracker
+import call_accounting
+import call_metrics
+import llm_backends
+import llm_routing
+import live_events
+
+call_accounting.install() # Charge loop CPU time to the call each callback belongs to
+
+async def run_bot(websocket: WebSocket, stream_sid: str, call_sid: str, call_variables: dict[str, str] = {}, agent_id: str = "default",
+                  agent_version: Optional[int] = None, answered_at: Optional[float] = None, campaign_id: Optional[str] = None,
+                  llm_factory: Optional[Callable[..., FrameProcessor]] = None, hang_up: bool = True):
+    """
+    Runs one call. `llm_factory(agent_config=, model=, voice_id=, system_instruction=, on_setup=)`
+    replaces the agent's LLM backend (replays use a scripted one); `hang_up=False`
+    keeps the serializer from ending the call through Twilio's API.
+    """
+    # Load Specific Agent Settings: the version pinned when the call was placed, else the current one.
+    # Loaded once, so edits made during the call do not affect it.
+    agent_config = None
+    if agent_version is not None:
+        agent_config = SettingsManager.get_agent_version(agent_id, agent_version)
+    if not agent_config:
+        agent_config = SettingsManager.get_agent(agent_id)
+    if not agent_config:
+        logger.error(f"Agent {agent_id} not found, falling back to default.")
+        agent_config = SettingsManager.get_agent("default") or {}
 
-logger.remove()
-logger.add(sys.stderr, level="INFO")
-
-class Settings(BaseSettings):
-    TWILIO_ACCOUNT_SID: str
-    TWILIO_AUTH_TOKEN: str
-    TWILIO_PHONE_NUMBER: str
-    GOOGLE_API_KEY: str
-    DOMAIN: str = "localhost" # Public domain (ngrok/production)
-    PORT: int = 8765
-
-    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
+    logger.info(f"Call {call_sid} using agent {agent_id} version {agent_config.get('version')}")
+    turn_taking = SettingsManager.turn_taking(agent_config, call_sid)
+    logger.info(f"Call {call_sid} turn taking: {turn_taking}")
 
-settings = Settings()
+    usage = call_accounting.CallUsage()
+    usage_token = call_accounting.current.set(usage) # Inherited by every task the pipeline creates
+    vad_analyzer = SharedSileroVADAnalyzer(params=VADParams(**turn_taking["vad"]))
 
-async def run_bot(websocket: WebSocket, stream_sid: str, call_sid: str, call_variables: dict[str, str] = {}, agent_id: str = "default"):
-    transport = FastAPIWebsocketTransport(
+    transport = PacedWebsocketTransport(
         websocket=websocket,
         params=FastAPIWebsocketParams(
             audio_out_enabled=True,
             add_wav_header=False,
             vad_enabled=True,
-            vad_analyzer=SileroVADAnalyzer(),
+            vad_analyzer=vad_analyzer,
             vad_audio_passthrough=True,
-            serializer=TwilioFrameSerializer(
+            serializer=MulawTwilioFrameSerializer(
                 stream_sid=stream_sid,
                 call_sid=call_sid,
                 account_sid=settings.TWILIO_ACCOUNT_SID,
-                auth_token=settings.TWILIO_AUTH_TOKEN
+                auth_token=settings.TWILIO_AUTH_TOKEN,
+                resampler_quality=settings.RESAMPLER_QUALITY,
+                params=MulawTwilioFrameSerializer.InputParams(auto_hang_up=hang_up),
             ),
         ),
+        frame_ms=settings.OUTBOUND_FRAME_MS,
+        jitter_ms=settings.OUTBOUND_JITTER_MS,
     )
 
-    
-    # Load Specific Agent Settings
-    agent_config = SettingsManager.get_agent(agent_id)
-    if not agent_config:
-        logger.error(f"Agent {agent_id} not found, falling back to default.")
-        agent_config = SettingsManager.get_agent("default") or {}
-
     voice_id = agent_config.get("voice_id", "Charon")
     system_instruction = agent_config.get("system_prompt", "")
     
@@ -93,20 +107,21 @@ async def run_bot(websocket: WebSocket, stream_sid: str, call_sid: str, call_var
     # Replace {{key}} with value
     if call_variables:
         logger.info(f"Injecting variables into prompt for {call_sid}: {call_variables}")
-        for key, value in call_variables.items():
-            placeholder = "{{" + key + "}}"
-            system_instruction = system_instruction.replace(placeholder, str(value))
+        system_instruction = SettingsManager.render_prompt(system_instruction, call_variables)
     else:
         logger.info(f"No variables to inject for {call_sid}")
 
-    llm = GeminiMultimodalLiveLLMService(
-        api_key=settings.GOOGLE_API_KEY,
-        model_name="gemini-2.0-flash-exp",
-        voice_id=voice_id,
-        system_instruction=system_instruction,
-        transcribe_user_audio=True,
-        transcribe_model_audio=True,
-    )
+    # Agent's backend/model, or its fallback while the primary is answering slowly
+    route = llm_routing.router.choose(SettingsManager.llm_route(agent_config))
+    logger.info(f"Call {call_sid} LLM: {route['backend']} {route['model']}"
+                + (f" (fallback: {route['reason']})" if route["fallback"] else ""))
+
+    def record_latency(metric: str, ms: float):
+        llm_routing.router.record(route["backend"], route["model"], metric, ms)
+
+    create_llm = llm_factory or (lambda **kwargs: llm_backends.create(route["backend"], **kwargs))
+    llm = create_llm(agent_config=agent_config, model=route["model"], voice_id=voice_id, system_instruction=system_instruction,
+                     on_setup=lambda ms: record_latency("setup", ms))
 
     messages = [] # System instruction is now handled by the service directly via `system_instruction` param
 
@@ -122,6 +137,11 @@ async def run_bot(websocket: WebSocket, stream_sid: str, call_sid: str, call_var
     # Initialize Transcript Logger
     transcript_logger = TranscriptLogger(call_sid)
     
+    turn_tracker = TurnLatencyTracker(stop_secs=turn_taking["vad"]["stop_secs"],
+                                      on_turn=lambda turn: record_latency("response", turn["response_ms"]),
+                                      on_interruption=lambda: live_events.hub.publish(call_sid, "barge_in"))
+    started_at = time.time()
+
     # Initialize Silence Timeout (50s)
     silence_timeout = SilenceTimeout(timeout=50)
 
@@ -130,7 +150,9 @@ async def run_bot(websocket: WebSocket, stream_sid: str, call_sid: str, call_var
             transport.input(),
             # silence_timeout, # Check for user silence immediately after transport input
             llm,
+            LLMUsageMeter(usage), # Generated audio and reported tokens
             transcript_logger, # Logs frames from LLM (content) and user (transcriptions)
+            turn_tracker, # Caller-stops-talking -> bot-starts-talking latency per turn
             transport.output(),
         ]
     )
@@ -138,15 +160,55 @@ async def run_bot(websocket: WebSocket, stream_sid: str, call_sid: str, call_var
     task = PipelineTask(
         pipeline,
         params=PipelineParams(
-            allow_interruptions=True, # Handles VAD interruptions automatically with the transport's VAD
+            allow_interruptions=turn_taking["allow_interruptions"], # Barge-in via the transport's VAD
+            enable_usage_metrics=True,
         ),
     )
 
+    @transport.event_handler("on_client_disconnected")
+    async def on_client_disconnected(transport, client):
+        # Twilio closed the stream (hang up): end now instead of waiting for the idle timeout
+        await task.cancel()
+
     runner = PipelineRunner()
 
+    ended_by = "caller" # The bot never hangs up on its own; Twilio closing the stream means the line dropped
+    live_events.hub.publish(call_sid, "call_started", agent_id=agent_id, campaign_id=campaign_id,
+                            llm=f"{route['backend']}/{route['model']}")
     try:
         await runner.run(task)
+    except asyncio.CancelledError:
+        ended_by = "cancelled"
+        raise
     finally:
+        call_accounting.current.reset(usage_token)
         # Ensure transcript is uploaded even if call ends abruptly
         logger.info("Pipeline finished. Triggering transcript upload...")
         await transcript_logger.upload_history()
+        live_events.hub.publish(call_sid, "call_ended", ended_by=ended_by, duration_seconds=round(time.time() - started_at, 1),
+                                turns=len(turn_tracker.turns), interruptions=turn_tracker.interruptions,
+                                artifacts={ # Served once the uploads finish (see /calls/artifacts)
+                                    "recording": f"/calls/{call_sid}/recording",
+                                    "transcription": f"/calls/{call_sid}/transcription",
+                                    "waveform": f"/calls/{call_sid}/waveform",
+                                })
+        try:
+            await asyncio.to_thread(
+                call_metrics.get_store().record_call,
+                call_sid, agent_id, agent_config.get("version"), turn_taking["variant"], started_at, time.time(),
+                turn_tracker.turns, {
+                    "interruptions": turn_tracker.interruptions,
+                    "turn_taking": turn_taking,
+                    "answered_at": answered_at,
+                    "answer_to_greeting_ms": round((turn_tracker.greeted_at - answered_at) * 1000)
+                        if answered_at and turn_tracker.greeted_at else None,
+                    "ended_by": ended_by,
+                    "campaign_id": campaign_id,
+                    "variables": call_variables,
+                    **usage.fields(time.time() - started_at, vad_analyzer.cpu_seconds),
+                    "llm": route,
+                    "llm_session": llm.stats() if hasattr(llm, "stats") else None,
+                },
+            )
+        except Exception as e:
+            logger.error(f"Failed to record call metrics for {call_sid}: {e}")
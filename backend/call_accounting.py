@@ -0,0 +1,148 @@
+"""
+Per-call resource usage: what each call costs us and where its CPU goes.
+
+run_bot makes a CallUsage current (a context variable) before building the
+pipeline. Every asyncio task Pipecat creates for the call copies that
+context, so install() can charge the CPU time of each loop callback to the
+call it belongs to; the media tap and the LLM usage meter count frames and
+bytes into the same object. Upload sizes and times arrive after the call has
+been recorded and are merged into its record by the upload spool listener.
+"""
+import os
+import math
+import time
+import asyncio
+import datetime
+import contextvars
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+import call_metrics
+from artifact_index import RECORDINGS_PREFIX, TRANSCRIPTS_PREFIX
+
+TWILIO_COST_PER_MINUTE = float(os.getenv("TWILIO_COST_PER_MINUTE", "0")) # Billed per started minute
+LLM_COST_PER_AUDIO_SECOND = float(os.getenv("LLM_COST_PER_AUDIO_SECOND", "0")) # Audio in + out
+
+current: contextvars.ContextVar[Optional["CallUsage"]] = contextvars.ContextVar("call_usage", default=None)
+
+
+class CallUsage:
+    def __init__(self):
+        self.cpu_seconds = 0.0 # Event loop callbacks run for this call
+        self.media = {"in_frames": 0, "in_bytes": 0, "out_frames": 0, "out_bytes": 0} # Twilio media, mu-law bytes
+        self.llm_audio_out_seconds = 0.0
+        self.llm_tokens = {"prompt": 0, "completion": 0, "total": 0}
+
+    def count_media(self, direction: str, payload: str):
+        self.media[f"{direction}_frames"] += 1
+        self.media[f"{direction}_bytes"] += len(payload) // 4 * 3 - payload[-2:].count("=") # Decoded size of the base64
+
+    def fields(self, wall_seconds: float, vad_cpu_seconds: float = 0.0) -> Dict[str, Any]:
+        """The call record's usage fields."""
+        return {
+            "wall_seconds": round(wall_seconds, 3),
+            "cpu_seconds": round(self.cpu_seconds + vad_cpu_seconds, 3),
+            "vad_cpu_seconds": round(vad_cpu_seconds, 3),
+            "media": dict(self.media),
+            "llm_audio_in_seconds": round(self.media["in_bytes"] / 8000, 2), # Every inbound frame is streamed to the model
+            "llm_audio_out_seconds": round(self.llm_audio_out_seconds, 2),
+            "llm_tokens": dict(self.llm_tokens),
+        }
+
+
+# --- CPU time per call ---
+
+_run = asyncio.events.Handle._run
+
+
+def _accounted_run(self):
+    usage = self._context.get(current)
+    if usage is None:
+        return _run(self)
+    started = time.thread_time()
+    try:
+        return _run(self)
+    finally:
+        usage.cpu_seconds += time.thread_time() - started
+
+
+def install():
+    """Charges loop callbacks to the CallUsage current in their context (idempotent)."""
+    asyncio.events.Handle._run = _accounted_run
+
+
+# --- Artifacts ---
+
+def artifact_kind(blob_name: str) -> Optional[str]:
+    if blob_name.startswith(TRANSCRIPTS_PREFIX):
+        return "transcript"
+    if blob_name.startswith(RECORDINGS_PREFIX):
+        return "waveform" if blob_name.endswith(".waveform.json") else "recording"
+    return None
+
+
+def record_upload(job: dict):
+    """Upload spool listener: adds the artifact's size and upload time to its call's record."""
+    call_sid, kind = job.get("metadata", {}).get("call_sid"), artifact_kind(job["blob_name"])
+    if not call_sid or not kind:
+        return
+    fields = {f"{kind}_bytes": job.get("size"), f"{kind}_upload_ms": round(job.get("upload_seconds", 0) * 1000)}
+    if "trimmed_start_ms" in job["metadata"]: # Subtract from transcript/waveform offsets to seek the trimmed WAV
+        fields["recording_trimmed_start_ms"] = job["metadata"]["trimmed_start_ms"]
+
+    async def merge():
+        try:
+            if not await asyncio.to_thread(call_metrics.get_store().merge_data, call_sid, fields):
+                logger.debug(f"No call record for {call_sid} yet, {kind} usage not recorded")
+        except Exception as e:
+            logger.error(f"Failed to record {kind} usage for {call_sid}: {e}")
+
+    asyncio.get_running_loop().create_task(merge())
+
+
+# --- Aggregation ---
+
+def summarize(calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Usage totals per agent, campaign and (UTC) day, most expensive first."""
+    groups = {}
+    for call in calls:
+        data = call["data"]
+        if "wall_seconds" not in data:
+            continue # Recorded before usage accounting
+        day = datetime.datetime.fromtimestamp(call["started_at"], datetime.timezone.utc).date().isoformat()
+        key = (call["agent_id"], data.get("campaign_id"), day)
+        entry = groups.setdefault(key, {
+            "calls": 0, "wall_seconds": 0.0, "billed_minutes": 0, "cpu_seconds": 0.0, "vad_cpu_seconds": 0.0,
+            "media_in_bytes": 0, "media_out_bytes": 0, "llm_audio_in_seconds": 0.0, "llm_audio_out_seconds": 0.0,
+            "llm_total_tokens": 0, "llm_reconnects": 0, "recording_bytes": 0, "transcript_bytes": 0, "upload_ms": 0,
+        })
+        entry["calls"] += 1
+        entry["wall_seconds"] += data["wall_seconds"]
+        entry["billed_minutes"] += math.ceil(data["wall_seconds"] / 60)
+        entry["cpu_seconds"] += data.get("cpu_seconds", 0)
+        entry["vad_cpu_seconds"] += data.get("vad_cpu_seconds", 0)
+        entry["media_in_bytes"] += data.get("media", {}).get("in_bytes", 0)
+        entry["media_out_bytes"] += data.get("media", {}).get("out_bytes", 0)
+        entry["llm_audio_in_seconds"] += data.get("llm_audio_in_seconds", 0)
+        entry["llm_audio_out_seconds"] += data.get("llm_audio_out_seconds", 0)
+        entry["llm_total_tokens"] += data.get("llm_tokens", {}).get("total", 0)
+        entry["llm_reconnects"] += (data.get("llm_session") or {}).get("reconnects", 0)
+        entry["recording_bytes"] += data.get("recording_bytes") or 0
+        entry["transcript_bytes"] += data.get("transcript_bytes") or 0
+        entry["upload_ms"] += sum(data.get(f"{kind}_upload_ms") or 0 for kind in ("recording", "transcript", "waveform"))
+
+    result = []
+    for (agent_id, campaign_id, day), entry in groups.items():
+        llm_audio_seconds = entry["llm_audio_in_seconds"] + entry["llm_audio_out_seconds"]
+        result.append({
+            "agent_id": agent_id,
+            "campaign_id": campaign_id,
+            "day": day,
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in entry.items()},
+            "cpu_seconds_per_call_minute": round(entry["cpu_seconds"] / (entry["wall_seconds"] / 60), 3)
+                if entry["wall_seconds"] else None,
+            "estimated_cost": round(entry["billed_minutes"] * TWILIO_COST_PER_MINUTE
+                                    + llm_audio_seconds * LLM_COST_PER_AUDIO_SECOND, 4),
+        })
+    return sorted(result, key=lambda r: (-r["estimated_cost"], -r["cpu_seconds"]))
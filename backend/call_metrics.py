@@ -0,0 +1,170 @@
+import os
+import json
+import math
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+DB_FILE = os.getenv("CALL_METRICS_DB_FILE", "call_metrics.db")
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100), None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+class CallMetricsStore:
+    """
+    Per-call measurements in SQLite: one row per call in `calls` (agent,
+    version, turn-taking variant) and one per bot response in `turns`, so
+    variants can be compared on pooled per-turn latency.
+    """
+
+    def __init__(self, path: str = DB_FILE):
+        self.path = path
+        self._local = threading.local()
+        with self._transaction() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS calls (
+                    call_sid TEXT PRIMARY KEY,
+                    agent_id TEXT NOT NULL,
+                    agent_version INTEGER,
+                    variant TEXT,
+                    started_at REAL NOT NULL,
+                    ended_at REAL,
+                    data TEXT NOT NULL
+                )""")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS turns (
+                    call_sid TEXT NOT NULL,
+                    turn INTEGER NOT NULL,
+                    latency_ms REAL NOT NULL,
+                    response_ms REAL NOT NULL,
+                    PRIMARY KEY (call_sid, turn)
+                )""")
+            db.execute("CREATE INDEX IF NOT EXISTS calls_agent ON calls (agent_id, started_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, isolation_level=None, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def record_call(self, call_sid: str, agent_id: str, agent_version: Optional[int], variant: Optional[str],
+                    started_at: float, ended_at: float, turns: List[Dict[str, float]], data: Dict[str, Any]):
+        """Stores a finished call and its turns (replacing an earlier record of the same call)."""
+        with self._transaction() as db:
+            db.execute("""
+                INSERT OR REPLACE INTO calls (call_sid, agent_id, agent_version, variant, started_at, ended_at, data)
+                VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (call_sid, agent_id, agent_version, variant, started_at, ended_at, json.dumps(data)))
+            db.execute("DELETE FROM turns WHERE call_sid = ?", (call_sid,))
+            db.executemany(
+                "INSERT INTO turns (call_sid, turn, latency_ms, response_ms) VALUES (?, ?, ?, ?)",
+                [(call_sid, i, t["latency_ms"], t["response_ms"]) for i, t in enumerate(turns)],
+            )
+
+    def merge_data(self, call_sid: str, fields: Dict[str, Any]) -> bool:
+        """Adds fields to a recorded call's data (e.g. a result that arrived after it ended)."""
+        with self._transaction() as db:
+            row = db.execute("SELECT data FROM calls WHERE call_sid = ?", (call_sid,)).fetchone()
+            if row is None:
+                return False
+            db.execute("UPDATE calls SET data = ? WHERE call_sid = ?", (json.dumps({**json.loads(row[0]), **fields}), call_sid))
+            return True
+
+    def turns(self, call_sid: str) -> List[Dict[str, float]]:
+        rows = self._connection().execute(
+            "SELECT latency_ms, response_ms FROM turns WHERE call_sid = ? ORDER BY turn", (call_sid,)
+        )
+        return [{"latency_ms": latency, "response_ms": response} for latency, response in rows]
+
+    def calls_since(self, since: float) -> List[Dict[str, Any]]:
+        rows = self._connection().execute(
+            "SELECT call_sid, agent_id, variant, started_at, ended_at, data FROM calls WHERE started_at >= ?", (since,)
+        )
+        return [
+            {"call_sid": sid, "agent_id": agent_id, "variant": variant, "started_at": started_at,
+             "ended_at": ended_at, "data": json.loads(data)}
+            for sid, agent_id, variant, started_at, ended_at, data in rows
+        ]
+
+    def calls_by_sid(self, call_sids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """call_sid -> recorded call, for those of `call_sids` that have one."""
+        if not call_sids:
+            return {}
+        rows = self._connection().execute(
+            "SELECT call_sid, agent_id, agent_version, variant, started_at, ended_at, data FROM calls"
+            f" WHERE call_sid IN ({', '.join('?' * len(call_sids))})", call_sids
+        )
+        return {
+            sid: {"call_sid": sid, "agent_id": agent, "agent_version": version, "variant": variant,
+                  "started_at": started_at, "ended_at": ended_at, "data": json.loads(data)}
+            for sid, agent, version, variant, started_at, ended_at, data in rows
+        }
+
+    def compare_variants(self, agent_id: str, since: float = 0) -> List[Dict[str, Any]]:
+        """Turn latency per variant for the agent's calls started after `since`."""
+        db = self._connection()
+        variants = {}
+        for variant, data in db.execute(
+            "SELECT variant, data FROM calls WHERE agent_id = ? AND started_at >= ?", (agent_id, since)
+        ):
+            entry = variants.setdefault(variant, {"calls": 0, "interruptions": 0, "settings": None,
+                                                  "latency": [], "response": []})
+            data = json.loads(data)
+            entry["calls"] += 1
+            entry["interruptions"] += data.get("interruptions", 0)
+            entry["settings"] = data.get("turn_taking") # The latest call's settings
+
+        for variant, latency, response in db.execute("""
+                SELECT c.variant, t.latency_ms, t.response_ms FROM turns t JOIN calls c ON c.call_sid = t.call_sid
+                WHERE c.agent_id = ? AND c.started_at >= ?""", (agent_id, since)):
+            variants[variant]["latency"].append(latency)
+            variants[variant]["response"].append(response)
+
+        result = []
+        for variant, entry in sorted(variants.items(), key=lambda item: item[0] or ""):
+            latency, response = entry["latency"], entry["response"]
+            result.append({
+                "variant": variant,
+                "calls": entry["calls"],
+                "turns": len(latency),
+                "latency_ms": {
+                    "p50": percentile(latency, 50),
+                    "p90": percentile(latency, 90),
+                    "mean": round(sum(latency) / len(latency), 1) if latency else None,
+                },
+                "response_ms_p50": percentile(response, 50),
+                "interruptions_per_call": round(entry["interruptions"] / entry["calls"], 2),
+                "settings": entry["settings"],
+            })
+        return result
+
+
+store: Optional[CallMetricsStore] = None
+
+
+def get_store() -> CallMetricsStore:
+    global store
+    if store is None:
+        store = CallMetricsStore(DB_FILE)
+    return store
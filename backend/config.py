@@ -0,0 +1,48 @@
+import sys
+from typing import Optional
+
+from loguru import logger
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+# Kept free of Pipecat so the web app can import it without loading the bot
+
+logger.remove()
+logger.add(sys.stderr, level="INFO")
+
+
+class Settings(BaseSettings):
+    TWILIO_ACCOUNT_SID: str
+    TWILIO_AUTH_TOKEN: str
+    TWILIO_PHONE_NUMBER: str
+    GOOGLE_API_KEY: str
+    DOMAIN: str = "localhost" # Public domain (ngrok/production)
+    PORT: int = 8765
+
+    # Admission control
+    MAX_CONCURRENT_CALLS: int = 20 # Live + ringing calls per process, 0 disables the limit
+    MAX_LOOP_LAG_MS: float = 200 # Refuse new calls while the event loop lags more than this
+    LOOP_STALL_MS: float = 100 # Capture the stack of whatever blocks the event loop longer than this (0 disables)
+    ADMISSION_RETRY_AFTER: int = 30 # Seconds suggested to /call clients when refused
+    ADMISSION_QUEUE_SECONDS: int = 0 # >0 keeps busy inbound callers waiting up to this long instead of hanging up
+
+    # Drain / deploys
+    DRAIN_TIMEOUT_SECONDS: float = 630 # Longest call (time_limit=600) plus upload margin
+    DRAIN_NOTICE_SECONDS: float = 6 # Time /readyz reports draining before shutdown can start
+    SHUTDOWN_GRACE_SECONDS: float = 10 # After the drain, connections still open are closed after this long
+    ADMIN_TOKEN: Optional[str] = None # If set, required as X-Admin-Token on every /admin route
+
+    # Outbound audio to Twilio
+    OUTBOUND_FRAME_MS: int = 20 # Size of each media message (multiple of 10)
+    OUTBOUND_JITTER_MS: int = 60 # Audio sent ahead of real time; absorbs event-loop hiccups
+    RESAMPLER_QUALITY: str = "medium" # fast | medium | high: filter length, CPU vs aliasing
+
+    # Answering-machine detection on outbound calls
+    AMD_MODE: str = "sync" # sync (Twilio holds the call until AMD decides) | async (bot starts at once, /amd-status acts later) | off
+
+    # Artifact downloads (recordings, transcripts, previews)
+    ARTIFACT_DELIVERY: str = "proxy" # proxy | redirect (307 to a signed URL)
+    SIGNED_URL_TTL_SECONDS: int = 600
+
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
+
+settings = Settings()
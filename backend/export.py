@@ -0,0 +1,275 @@
+"""
+Bulk export of calls for analytics and audits: one record per call in a date
+range (optionally one agent) with its Twilio status, agent, variables, how it
+ended, the recorded call data and the full transcript from transcripciones/.
+
+The call list comes from Twilio's call log, so calls with no metrics record
+(older than the metrics store, or whose write failed) are exported too, with
+the fields only the metrics store knows left empty. The log is read one
+window of EXPORT_WINDOW_HOURS at a time and joined with the metrics store a
+page at a time; transcripts are fetched by a bounded number of parallel
+downloads and written out in call order as they arrive, so memory is bounded
+by one window's call list however long the range is. Every record carries a
+`cursor`: pass the last one received to resume an interrupted export right
+after it.
+
+Usage:
+    python export.py --since 2026-10-01 --until 2026-10-08 > llamadas.jsonl
+    python export.py --since 2026-10-01 --cursor <último cursor> >> llamadas.jsonl  # retomar
+    python export.py --since 2026-10-01 --agent-id ventas --format parquet --out llamadas.parquet
+"""
+import os
+import sys
+import json
+import time
+import base64
+import asyncio
+import argparse
+import datetime
+import collections
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from twilio.rest import Client
+
+import gcs
+import call_metrics
+from config import settings
+
+PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "200")) # Calls per metrics-store query
+WINDOW_HOURS = float(os.getenv("EXPORT_WINDOW_HOURS", "24")) # Span of each call-log query
+FETCH_CONCURRENCY = int(os.getenv("EXPORT_FETCH_CONCURRENCY", "8")) # Transcript downloads in flight
+TRANSCRIPT_PREFIX = "transcripciones/"
+CONNECTED = ("completed", "in-progress") # Statuses of calls that can have a transcript
+
+
+def parse_time(value: str) -> float:
+    """Epoch seconds for an ISO date or datetime (UTC unless it says otherwise)."""
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+def encode_cursor(call: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(f"{call['started_at']!r}|{call['call_sid']}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        started_at, call_sid = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return float(started_at), call_sid
+    except Exception:
+        raise ValueError(f"Invalid cursor {cursor!r}")
+
+
+def twilio_calls(start: float, end: float) -> List[Dict[str, Any]]:
+    """Calls in Twilio's log that started in [start, end), oldest first."""
+    client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+    calls = []
+    for c in client.calls.list(start_time_after=datetime.datetime.fromtimestamp(start, datetime.timezone.utc),
+                               start_time_before=datetime.datetime.fromtimestamp(end, datetime.timezone.utc),
+                               page_size=1000):
+        started_at = c.start_time.timestamp() if c.start_time else None
+        if started_at is None or not start <= started_at < end: # Twilio's bounds are inclusive; windows must not overlap
+            continue
+        calls.append({
+            "call_sid": c.sid,
+            "status": c.status,
+            "direction": c.direction,
+            "from": c._from,
+            "to": c.to,
+            "started_at": started_at,
+            "ended_at": c.end_time.timestamp() if c.end_time else None,
+            "duration": int(c.duration) if c.duration else None,
+        })
+    calls.sort(key=lambda call: (call["started_at"], call["call_sid"]))
+    return calls
+
+
+def fetch_transcript(call_sid: str) -> Optional[list]:
+    data = gcs.download_bytes(f"{TRANSCRIPT_PREFIX}{call_sid}.json")
+    return json.loads(data) if data is not None else None
+
+
+def iso(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat()
+
+
+def record(call: Dict[str, Any], transcript: Optional[list], error: Optional[str] = None) -> Dict[str, Any]:
+    metrics = call["metrics"] or {} # None: the call has no metrics record
+    data = metrics.get("data") or {}
+    entry = {
+        "call_sid": call["call_sid"],
+        "status": call["status"],
+        "direction": call["direction"],
+        "from": call["from"],
+        "to": call["to"],
+        "agent_id": metrics.get("agent_id"),
+        "agent_version": metrics.get("agent_version"),
+        "campaign_id": data.get("campaign_id"),
+        "started_at": iso(call["started_at"]),
+        "ended_at": iso(call["ended_at"]),
+        "duration_seconds": call["duration"],
+        "ended_by": data.get("ended_by"),
+        "variables": data.get("variables") or {}, # Not recorded for calls older than the export
+        "data": metrics.get("data"),
+        "transcript": transcript,
+        "cursor": encode_cursor(call),
+    }
+    if error:
+        entry["transcript_error"] = error
+    return entry
+
+
+async def _calls(since: float, until: float, agent_id: Optional[str], after: Optional[Tuple[float, str]],
+                 page_size: int, list_calls: Callable[[float, float], List[Dict[str, Any]]]) -> AsyncIterator[Dict[str, Any]]:
+    """Twilio's calls in [since, until) in (started_at, call_sid) order, each with its metrics record or None."""
+    store = call_metrics.get_store()
+    start = after[0] if after else since # Resuming: the window starts at the cursor's call
+    while start < until:
+        end = min(start + WINDOW_HOURS * 3600, until)
+        calls = await asyncio.to_thread(list_calls, start, end)
+        if after:
+            calls = [call for call in calls if (call["started_at"], call["call_sid"]) > after]
+        for i in range(0, len(calls), page_size):
+            page = calls[i:i + page_size]
+            metrics = await asyncio.to_thread(store.calls_by_sid, [call["call_sid"] for call in page])
+            for call in page:
+                call["metrics"] = metrics.get(call["call_sid"])
+                if agent_id and (call["metrics"] or {}).get("agent_id") != agent_id:
+                    continue # Calls without metrics have no known agent
+                yield call
+        start = end
+
+
+async def export_calls(since: float, until: float, agent_id: Optional[str] = None, cursor: Optional[str] = None,
+                       fetch: Callable[[str], Optional[list]] = fetch_transcript, page_size: int = PAGE_SIZE,
+                       concurrency: int = FETCH_CONCURRENCY,
+                       list_calls: Callable[[float, float], List[Dict[str, Any]]] = twilio_calls) -> AsyncIterator[Dict[str, Any]]:
+    """Export records in call order; at most `concurrency` transcript downloads run at a time."""
+    after = decode_cursor(cursor) if cursor else None
+    pending = collections.deque() # (call, download task or None), oldest first
+
+    async def next_record() -> Dict[str, Any]:
+        call, task = pending.popleft()
+        try:
+            return record(call, await task if task else None)
+        except Exception as e: # One unreadable transcript should not end the export
+            return record(call, None, str(e))
+
+    try:
+        async for call in _calls(since, until, agent_id, after, page_size, list_calls):
+            task = None # Busy, unanswered, failed...: nothing to download
+            if call["status"] in CONNECTED:
+                task = asyncio.ensure_future(asyncio.to_thread(fetch, call["call_sid"]))
+            pending.append((call, task))
+            if len(pending) >= concurrency:
+                yield await next_record()
+        while pending:
+            yield await next_record()
+    finally:
+        for _, task in pending: # Client went away
+            if task:
+                task.cancel()
+
+
+async def jsonl(records: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    async for entry in records:
+        yield json.dumps(entry, ensure_ascii=False) + "\n"
+
+
+async def write_parquet(records: AsyncIterator[Dict[str, Any]], path: str, batch_size: int = PAGE_SIZE) -> Optional[str]:
+    """
+    Writes the records to a Parquet file in row groups of `batch_size`; nested
+    fields (variables, data, transcript) are JSON strings. Returns the last cursor.
+    Needs pyarrow, which the server itself does not.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    schema = pa.schema([
+        ("call_sid", pa.string()), ("status", pa.string()), ("direction", pa.string()), ("from", pa.string()),
+        ("to", pa.string()), ("agent_id", pa.string()), ("agent_version", pa.int64()),
+        ("campaign_id", pa.string()), ("started_at", pa.timestamp("ms", tz="UTC")),
+        ("ended_at", pa.timestamp("ms", tz="UTC")), ("duration_seconds", pa.int64()), ("ended_by", pa.string()),
+        ("variables", pa.string()), ("data", pa.string()), ("transcript", pa.string()),
+        ("transcript_error", pa.string()), ("cursor", pa.string()),
+    ])
+    nested = ("variables", "data", "transcript")
+    batch, cursor = [], None
+
+    def flush(writer):
+        columns = {name: [entry.get(name) for entry in batch] for name in schema.names}
+        for name in nested:
+            columns[name] = [json.dumps(value, ensure_ascii=False) if value is not None else None for value in columns[name]]
+        for name in ("started_at", "ended_at"):
+            columns[name] = [datetime.datetime.fromisoformat(value) if value else None for value in columns[name]]
+        writer.write_table(pa.table(columns, schema=schema))
+        batch.clear()
+
+    with pq.ParquetWriter(path, schema) as writer:
+        async for entry in records:
+            batch.append(entry)
+            cursor = entry["cursor"]
+            if len(batch) >= batch_size:
+                await asyncio.to_thread(flush, writer)
+        if batch:
+            await asyncio.to_thread(flush, writer)
+    return cursor
+
+
+async def run(args) -> int:
+    since = parse_time(args.since)
+    until = parse_time(args.until) if args.until else time.time()
+    records = export_calls(since, until, args.agent_id, args.cursor, concurrency=args.concurrency)
+    started, count, cursor = time.perf_counter(), 0, None
+
+    async def counted():
+        nonlocal count, cursor
+        async for entry in records:
+            count += 1
+            cursor = entry["cursor"]
+            yield entry
+
+    if args.format == "parquet":
+        await write_parquet(counted(), args.out)
+    else:
+        out = open(args.out, "a" if args.cursor else "w", encoding="utf-8") if args.out else sys.stdout
+        try:
+            async for line in jsonl(counted()):
+                out.write(line)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    print(f"Exported {count} calls in {time.perf_counter() - started:.1f}s"
+          + (f"; resume with --cursor {cursor}" if cursor else ""), file=sys.stderr)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", required=True, help="Start date/datetime (ISO, UTC unless it has an offset)")
+    parser.add_argument("--until", help="End date/datetime, exclusive (default: now)")
+    parser.add_argument("--agent-id", help="Only this agent's calls")
+    parser.add_argument("--cursor", help="Resume after the record with this cursor")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--out", help="Output file (JSONL defaults to stdout; appended to when resuming)")
+    parser.add_argument("--concurrency", type=int, default=FETCH_CONCURRENCY, help="Parallel transcript downloads")
+    args = parser.parse_args(argv)
+
+    if args.format == "parquet" and not args.out:
+        parser.error("--format parquet needs --out")
+    try:
+        return asyncio.run(run(args))
+    except (ValueError, RuntimeError, FileNotFoundError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
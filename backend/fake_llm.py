@@ -0,0 +1,112 @@
+"""
+Scripted stand-in for the Gemini Live service, for offline replays and tests.
+
+It behaves like the real service as far as the rest of the pipeline can
+tell: it consumes caller audio, answers each turn (after the VAD says the
+caller stopped) with text plus 24kHz audio, stops on barge-in, and emits the
+caller's transcription. The replies come from a script, e.g. the assistant
+lines of a stored transcript, so a replay is deterministic.
+"""
+import asyncio
+import datetime
+from typing import List, Optional
+
+import numpy as np
+from pipecat.frames.frames import (
+    CancelFrame,
+    EndFrame,
+    Frame,
+    InputAudioRawFrame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    LLMTextFrame,
+    StartFrame,
+    StartInterruptionFrame,
+    TranscriptionFrame,
+    TTSAudioRawFrame,
+    TTSStartedFrame,
+    TTSStoppedFrame,
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+SAMPLE_RATE = 24000 # What Gemini Live produces
+CHUNK_SECONDS = 0.04
+
+
+def synthesize(text: str, chars_per_second: float = 14.0, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """Deterministic speech-like audio (a modulated tone) as long as reading `text` takes."""
+    seconds = max(0.5, len(text) / chars_per_second)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    envelope = 0.55 + 0.45 * np.sin(2 * np.pi * 3.0 * t) # ~syllable rate
+    tone = np.sin(2 * np.pi * 180 * t) + 0.3 * np.sin(2 * np.pi * 540 * t)
+    return (tone * envelope * 6000).astype(np.int16).tobytes()
+
+
+class ScriptedLLMService(FrameProcessor):
+    def __init__(self, replies: List[str], user_texts: Optional[List[str]] = None, greeting: Optional[str] = None,
+                 response_delay: float = 0.6, chars_per_second: float = 14.0, trace=None):
+        super().__init__()
+        self.replies = list(replies)
+        self.user_texts = list(user_texts or [])
+        self.greeting = greeting
+        self.response_delay = response_delay # Stand-in for model time to first audio
+        self.chars_per_second = chars_per_second
+        self.trace = trace # Optional callable(event, **fields)
+        self.turn = 0
+        self._response_task = None
+
+    def _trace(self, event: str, **fields):
+        if self.trace:
+            self.trace(event, **fields)
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, InputAudioRawFrame):
+            return # Consumed, as the real service streams it to the model
+        await self.push_frame(frame, direction)
+
+        if isinstance(frame, StartFrame) and self.greeting:
+            await self._respond(self.greeting, None)
+        elif isinstance(frame, UserStartedSpeakingFrame):
+            self._trace("user_started_speaking")
+            await self._cancel_response() # Caller kept talking: that turn is not over
+        elif isinstance(frame, UserStoppedSpeakingFrame):
+            self._trace("user_stopped_speaking")
+            if self.turn < len(self.replies):
+                user_text = self.user_texts[self.turn] if self.turn < len(self.user_texts) else None
+                await self._respond(self.replies[self.turn], user_text, advance=True)
+        elif isinstance(frame, StartInterruptionFrame):
+            self._trace("interruption")
+            await self._cancel_response()
+        elif isinstance(frame, (EndFrame, CancelFrame)):
+            await self._cancel_response() # Call is over mid-answer
+
+    async def _respond(self, reply: str, user_text: Optional[str], advance: bool = False):
+        await self._cancel_response()
+        self._response_task = self.create_task(self._speak(reply, user_text, advance))
+
+    async def _cancel_response(self):
+        if self._response_task:
+            await self.cancel_task(self._response_task) # Also unregisters a finished one
+        self._response_task = None
+
+    async def _speak(self, reply: str, user_text: Optional[str], advance: bool):
+        await asyncio.sleep(self.response_delay)
+        if advance:
+            self.turn += 1
+        if user_text:
+            await self.push_frame(TranscriptionFrame(user_text, "user", datetime.datetime.now().isoformat()))
+        self._trace("llm_response", text=reply)
+
+        await self.push_frame(LLMFullResponseStartFrame())
+        await self.push_frame(TTSStartedFrame())
+        audio = synthesize(reply, self.chars_per_second)
+        chunk = int(CHUNK_SECONDS * SAMPLE_RATE) * 2
+        for i in range(0, len(audio), chunk):
+            await self.push_frame(TTSAudioRawFrame(audio=audio[i:i + chunk], sample_rate=SAMPLE_RATE, num_channels=1))
+        await self.push_frame(LLMTextFrame(reply))
+        await self.push_frame(TTSStoppedFrame())
+        await self.push_frame(LLMFullResponseEndFrame())
@@ -0,0 +1,114 @@
+import os
+import time
+import asyncio
+import datetime
+import functools
+from typing import Optional
+from google.cloud import storage
+from google.cloud.exceptions import NotFound
+
+# Constants
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+KEY_FILE = os.path.join(BASE_DIR, "mundimotos-481115-c652dd31ca7c.json")
+BUCKET_NAME = "asistente-siac-voz-logs"
+
+
+@functools.lru_cache(maxsize=1)
+def get_bucket() -> storage.Bucket:
+    """Shared bucket handle; building a client per request re-reads the key and opens new connections."""
+    if not os.path.exists(KEY_FILE):
+        raise FileNotFoundError(f"GCS Key file not found: {KEY_FILE}")
+    storage_client = storage.Client.from_service_account_json(KEY_FILE)
+    return storage_client.bucket(BUCKET_NAME)
+
+
+def upload_file(local_path: str, blob_name: str, content_type: str):
+    blob = get_bucket().blob(blob_name)
+    blob.upload_from_filename(local_path, content_type=content_type)
+
+
+def list_blobs(prefix: str) -> list:
+    """(name, size, updated) for every object under `prefix`; only those fields are fetched."""
+    blobs = get_bucket().list_blobs(prefix=prefix, fields="items(name,size,updated),nextPageToken")
+    return [(blob.name, blob.size, blob.updated) for blob in blobs]
+
+
+# --- Downloads ---
+
+CHUNK_SIZE = 256 * 1024 # Fixed read size for proxied downloads
+_signed_urls = {} # (blob_name, content_type) -> (url, expires_at)
+
+
+def signed_url(blob_name: str, ttl_seconds: int, content_type: Optional[str] = None) -> str:
+    """
+    V4 signed GET URL, signed locally with the service-account key (no request
+    to GCS). Reused for half its lifetime so browsers can cache the object.
+    """
+    now = time.time()
+    cached = _signed_urls.get((blob_name, content_type))
+    if cached and cached[1] - now > ttl_seconds / 2:
+        return cached[0]
+
+    url = get_bucket().blob(blob_name).generate_signed_url(
+        version="v4",
+        expiration=datetime.timedelta(seconds=ttl_seconds),
+        method="GET",
+        response_type=content_type,
+    )
+    if len(_signed_urls) > 10000:
+        _signed_urls.clear()
+    _signed_urls[(blob_name, content_type)] = (url, now + ttl_seconds)
+    return url
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple]:
+    """(start, end) inclusive for a single `bytes=` range, None for no/unsupported range."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start, _, end = header[6:].strip().partition("-")
+    try:
+        if not start: # Suffix range: last N bytes
+            return max(0, size - int(end)), size - 1
+        return int(start), min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        return None
+
+
+async def open_blob(blob_name: str):
+    """Blob with metadata loaded (size, content type), or None if it does not exist."""
+    blob = get_bucket().blob(blob_name)
+    try:
+        await asyncio.to_thread(blob.reload)
+    except NotFound:
+        return None
+    return blob
+
+
+def blob_exists(blob_name: str) -> bool:
+    return get_bucket().blob(blob_name).exists()
+
+
+def download_bytes(blob_name: str) -> Optional[bytes]:
+    """Whole object, or None if it does not exist."""
+    try:
+        return get_bucket().blob(blob_name).download_as_bytes()
+    except NotFound:
+        return None
+
+
+async def stream_blob(blob: storage.Blob, start: int = 0, end: Optional[int] = None, chunk_size: int = CHUNK_SIZE):
+    """Yields bytes start..end (inclusive) in fixed-size chunks, reading in a worker thread."""
+    end = blob.size - 1 if end is None else end
+    remaining = end - start + 1
+    reader = await asyncio.to_thread(blob.open, "rb", chunk_size=chunk_size)
+    try:
+        if start:
+            await asyncio.to_thread(reader.seek, start)
+        while remaining > 0:
+            chunk = await asyncio.to_thread(reader.read, min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        reader.close()
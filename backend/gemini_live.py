@@ -0,0 +1,192 @@
+import json
+import time
+import asyncio
+from typing import Callable, Optional
+
+from loguru import logger
+from websockets.exceptions import ConnectionClosed
+
+from pipecat.frames.frames import ErrorFrame
+from pipecat.metrics.metrics import LLMTokenUsage
+from pipecat.services.gemini_multimodal_live import events
+from pipecat.services.gemini_multimodal_live.gemini import GeminiMultimodalLiveLLMService
+
+from llm_routing import FAILED_SETUP_MS
+
+RECONNECT_BASE_DELAY = 0.25 # Doubled per attempt
+
+
+class ResumableGeminiLiveService(GeminiMultimodalLiveLLMService):
+    """
+    Gemini Live service that survives upstream drops and long calls.
+
+    - Session resumption: the server keeps sending resumption handles; when
+      the websocket closes (a network drop, or the server's GoAway before it
+      recycles the connection) the service reconnects with the latest one and
+      the conversation continues where it was, instead of the call dying.
+      Without a handle yet, it reconnects to a fresh session with the same
+      system prompt.
+    - Context compression: a sliding window (kept to `compression_target_tokens`
+      once the context reaches `compression_trigger_tokens`) so per-turn
+      latency does not grow with the call. Pipecat 0.0.67 builds this setting
+      but its Setup model drops it, so the setup message is completed here.
+    - Token usage the server reports is passed on as usage metrics.
+
+    `stats()` has the reconnects and session setup time for the call record;
+    `on_setup(ms)` is called every time a session is ready (or fails to open).
+    """
+
+    def __init__(self, *args, session_resumption: bool = True, max_reconnects: int = 3,
+                 context_compression: bool = True, compression_trigger_tokens: Optional[int] = None,
+                 compression_target_tokens: Optional[int] = None, on_setup: Optional[Callable[[float], None]] = None,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session_resumption = session_resumption
+        self.max_reconnects = max_reconnects
+        self.compression = None
+        if context_compression:
+            self.compression = {"sliding_window": {}}
+            if compression_target_tokens:
+                self.compression["sliding_window"]["target_tokens"] = compression_target_tokens
+            if compression_trigger_tokens:
+                self.compression["trigger_tokens"] = compression_trigger_tokens
+
+        self.resumption_handle = None
+        self.reconnects = 0
+        self.resumed = 0 # Reconnects that kept the conversation
+        self.go_aways = 0
+        self.context_tokens = None # Prompt size of the latest turn, i.e. what compression keeps in check
+        self.setup_ms = None # Connect -> setupComplete of the first session
+        self.on_setup = on_setup
+        self._connect_started = None
+        self._reconnecting = False
+
+    def stats(self) -> dict:
+        return {
+            "reconnects": self.reconnects,
+            "resumed": self.resumed,
+            "go_aways": self.go_aways,
+            "context_tokens": self.context_tokens,
+            "setup_ms": self.setup_ms,
+        }
+
+    async def _connect(self):
+        if self._websocket:
+            return
+        self._connect_started = time.monotonic()
+        await super()._connect()
+        if not self._websocket: # Logged by the base class
+            self._connect_started = None
+            self._report_setup(FAILED_SETUP_MS)
+
+    async def _handle_evt_setup_complete(self, evt):
+        if self._connect_started is not None:
+            setup_ms = round((time.monotonic() - self._connect_started) * 1000, 1)
+            self._connect_started = None
+            if self.setup_ms is None:
+                self.setup_ms = setup_ms
+            self._report_setup(setup_ms)
+        await super()._handle_evt_setup_complete(evt)
+
+    def _report_setup(self, ms: float):
+        if self.on_setup:
+            self.on_setup(ms)
+
+    async def send_client_event(self, event):
+        message = event.model_dump(exclude_none=True)
+        if isinstance(event, events.Config):
+            if self.compression:
+                message["setup"]["context_window_compression"] = self.compression
+            if self.session_resumption:
+                message["setup"]["session_resumption"] = {"handle": self.resumption_handle} if self.resumption_handle else {}
+        await self._ws_send(message)
+
+    async def _ws_send(self, message):
+        if self._reconnecting:
+            return # Caller audio during the gap is dropped; the resumed session picks up from what it has
+        try:
+            if self._websocket:
+                await self._websocket.send(json.dumps(message))
+        except ConnectionClosed:
+            pass # The receive task sees the close and reconnects
+        except Exception as e:
+            if self._disconnecting:
+                return
+            logger.error(f"Error sending message to websocket: {e}")
+            await self.push_error(ErrorFrame(error=f"Error sending client event: {e}", fatal=True))
+
+    async def _receive_task_handler(self):
+        websocket = self._websocket
+        reason = "closed"
+        try:
+            async for message in websocket:
+                try:
+                    data = json.loads(message)
+                    evt = events.ServerEvent.model_validate(data)
+                except Exception as e:
+                    logger.error(f"Error parsing server event: {e}")
+                    continue
+                await self._handle_session_messages(data)
+
+                if evt.setupComplete:
+                    await self._handle_evt_setup_complete(evt)
+                elif evt.serverContent and evt.serverContent.modelTurn:
+                    await self._handle_evt_model_turn(evt)
+                elif evt.serverContent and evt.serverContent.turnComplete:
+                    await self._handle_evt_turn_complete(evt)
+                elif evt.serverContent and evt.serverContent.outputTranscription:
+                    await self._handle_evt_output_transcription(evt)
+                elif evt.toolCall:
+                    await self._handle_evt_tool_call(evt)
+        except ConnectionClosed as e:
+            reason = str(e)
+
+        if not self._disconnecting and websocket is self._websocket:
+            await self._reconnect(reason)
+
+    async def _handle_session_messages(self, data: dict):
+        update = data.get("sessionResumptionUpdate")
+        if update and update.get("resumable") and update.get("newHandle"):
+            self.resumption_handle = update["newHandle"]
+        if "goAway" in data:
+            self.go_aways += 1
+            logger.info(f"Gemini session ending in {data['goAway'].get('timeLeft')}, will resume")
+        usage = data.get("usageMetadata")
+        if usage:
+            self.context_tokens = usage.get("promptTokenCount", self.context_tokens)
+            await self.start_llm_usage_metrics(LLMTokenUsage(
+                prompt_tokens=usage.get("promptTokenCount", 0),
+                completion_tokens=usage.get("responseTokenCount", 0),
+                total_tokens=usage.get("totalTokenCount", 0),
+            ))
+
+    async def _reconnect(self, reason: str):
+        if self.reconnects >= self.max_reconnects:
+            await self.push_error(ErrorFrame(error=f"Gemini session lost ({reason}), out of reconnects", fatal=True))
+            return
+
+        self._reconnecting = True
+        try:
+            if self._bot_is_speaking:
+                await self._handle_interruption() # Close out the cut-off answer
+            if self._transcribe_audio_task:
+                await self.cancel_task(self._transcribe_audio_task) # _connect starts a new one
+                self._transcribe_audio_task = None
+            self._websocket = None
+            self._api_session_ready = False
+
+            while self.reconnects < self.max_reconnects:
+                self.reconnects += 1
+                await asyncio.sleep(RECONNECT_BASE_DELAY * 2 ** (self.reconnects - 1))
+                resuming = self.resumption_handle is not None
+                logger.warning(f"Gemini session lost ({reason}), reconnect {self.reconnects}/{self.max_reconnects}"
+                               f"{' resuming' if resuming else ' with a new session'}")
+                self._reconnecting = False # Let the setup message through
+                await self._connect()
+                if self._websocket:
+                    self.resumed += int(resuming)
+                    return
+                self._reconnecting = True
+        finally:
+            self._reconnecting = False
+        await self.push_error(ErrorFrame(error=f"Gemini session lost ({reason}), reconnect failed", fatal=True))
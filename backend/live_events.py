@@ -0,0 +1,138 @@
+"""
+Live events of the calls in progress, fanned out to supervisors' browsers
+(GET /calls/live, server-sent events).
+
+Publishing never waits: each subscriber has its own bounded buffer, and when
+a slow browser lets it fill up the oldest events are dropped (and the
+subscriber is told how many), so a stalled connection can never hold up the
+call pipelines that publish.
+"""
+import json
+import time
+import asyncio
+import collections
+import itertools
+from typing import Any, Dict, Optional
+
+SUBSCRIBER_BUFFER = 256 # Events kept per subscriber before the oldest are dropped
+HEARTBEAT_SECONDS = 15 # SSE comment so proxies keep an idle stream open
+
+
+class Subscriber:
+    def __init__(self, call_sid: Optional[str] = None, agent_id: Optional[str] = None, maxlen: int = SUBSCRIBER_BUFFER):
+        self.call_sid = call_sid
+        self.agent_id = agent_id
+        self.events = collections.deque(maxlen=maxlen)
+        self.dropped = 0 # Not yet reported to the client
+        self.dropped_total = 0
+        self.closed = False # Server shutting down: the stream ends once what is pending is sent
+        self._ready = asyncio.Event()
+
+    def wants(self, event: Dict[str, Any]) -> bool:
+        if self.call_sid and event["call_sid"] != self.call_sid:
+            return False
+        return not self.agent_id or event.get("agent_id") == self.agent_id
+
+    def put(self, event: Dict[str, Any]):
+        if len(self.events) == self.events.maxlen:
+            self.dropped += 1 # deque drops the oldest
+            self.dropped_total += 1
+        self.events.append(event)
+        self._ready.set()
+
+    async def get(self, timeout: float) -> list:
+        """Pending events (oldest first), or [] after `timeout` seconds with none."""
+        if not self.events and not self.closed:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        events = list(self.events)
+        self.events.clear()
+        return events
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+
+class LiveEvents:
+    def __init__(self):
+        self.subscribers = set()
+        self.active = {} # call_sid -> call_started event, replayed to new subscribers
+        self.published = 0
+        self.closed = False
+        self._ids = itertools.count(1)
+
+    def publish(self, call_sid: str, kind: str, **data):
+        """Sends an event to every interested subscriber. Never blocks; call from the event loop."""
+        call = self.active.get(call_sid)
+        event = {
+            "id": next(self._ids),
+            "type": kind,
+            "call_sid": call_sid,
+            "agent_id": data.pop("agent_id", None) or (call or {}).get("agent_id"),
+            "at": round(time.time(), 3),
+            **data,
+        }
+        if kind == "call_started":
+            self.active[call_sid] = event
+        elif kind == "call_ended":
+            self.active.pop(call_sid, None)
+        self.published += 1
+        for subscriber in self.subscribers:
+            if subscriber.wants(event):
+                subscriber.put(event)
+
+    def subscribe(self, call_sid: Optional[str] = None, agent_id: Optional[str] = None) -> Subscriber:
+        subscriber = Subscriber(call_sid, agent_id)
+        if self.closed:
+            subscriber.close()
+        for event in self.active.values(): # Calls already in progress
+            if subscriber.wants(event):
+                subscriber.put(event)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def close(self):
+        """Ends every stream (and any opened later) so the server can shut down with browsers connected."""
+        self.closed = True
+        for subscriber in self.subscribers:
+            subscriber.close()
+
+    async def stream(self, subscriber: Subscriber):
+        """SSE body for a subscriber; unsubscribes when the client goes away."""
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                events = await subscriber.get(HEARTBEAT_SECONDS)
+                if subscriber.dropped:
+                    yield sse("dropped", {"count": subscriber.dropped})
+                    subscriber.dropped = 0
+                if not events and not subscriber.closed:
+                    yield ": keep-alive\n\n"
+                for event in events:
+                    yield sse(event["type"], event, event["id"])
+                if subscriber.closed:
+                    return
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> dict:
+        return {
+            "active_calls": len(self.active),
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "dropped": sum(s.dropped_total for s in self.subscribers),
+        }
+
+
+def sse(kind: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    return (f"id: {event_id}\n" if event_id else "") + f"event: {kind}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+hub = LiveEvents()
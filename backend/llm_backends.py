@@ -0,0 +1,55 @@
+"""
+LLM services by backend name. A backend is a factory
+
+    factory(agent_config=, model=, voice_id=, system_instruction=, on_setup=) -> FrameProcessor
+
+registered with @backend("name"); agents pick one (and a model) in their
+`llm` settings. `on_setup(ms)` should be called when the upstream session is
+ready, for the latency router (backends with no session can ignore it).
+"""
+from typing import Callable, Dict
+
+from pipecat.processors.frame_processor import FrameProcessor
+
+from config import settings
+from settings_manager import SettingsManager
+from gemini_live import ResumableGeminiLiveService
+from fake_llm import ScriptedLLMService
+
+BACKENDS: Dict[str, Callable[..., FrameProcessor]] = {}
+
+
+def backend(name: str):
+    def register(factory: Callable[..., FrameProcessor]):
+        BACKENDS[name] = factory
+        return factory
+    return register
+
+
+def create(name: str, **kwargs) -> FrameProcessor:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend {name!r} (available: {', '.join(sorted(BACKENDS))})")
+    return BACKENDS[name](**kwargs)
+
+
+@backend("gemini_live")
+def gemini_live(agent_config: dict, model: str, voice_id: str, system_instruction: str, on_setup=None) -> FrameProcessor:
+    return ResumableGeminiLiveService(
+        api_key=settings.GOOGLE_API_KEY,
+        model=model,
+        voice_id=voice_id,
+        system_instruction=system_instruction,
+        transcribe_user_audio=True,
+        on_setup=on_setup,
+        **SettingsManager.llm_session(agent_config), # Resumption and context compression thresholds
+    )
+
+
+FAKE_GREETING = "Hola, le habla el agente de prueba."
+FAKE_REPLY = "Entendido. ¿Hay algo más en lo que le pueda ayudar?"
+
+
+@backend("fake")
+def fake(agent_config: dict, model: str, voice_id: str, system_instruction: str, on_setup=None) -> FrameProcessor:
+    # Local stand-in: no upstream, fixed answers after ~the usual model delay (load tests, demos without a key)
+    return ScriptedLLMService([FAKE_REPLY] * 200, greeting=FAKE_GREETING)
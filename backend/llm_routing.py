@@ -0,0 +1,79 @@
+"""
+Per-agent LLM routing with latency fallback.
+
+Each agent names a backend and model (`llm`), optionally with a `fallback`
+and thresholds. Session-setup and first-response latencies are measured per
+backend/model as calls run; while the primary's recent median exceeds a
+threshold, new calls go to the fallback. Samples expire after
+LLM_ROUTING_WINDOW_SECONDS, so once the primary has gone quiet long enough
+it gets calls (and fresh measurements) again.
+"""
+import os
+import time
+import collections
+from typing import Any, Dict, Optional
+
+from call_metrics import percentile
+
+ROUTING_WINDOW_SECONDS = float(os.getenv("LLM_ROUTING_WINDOW_SECONDS", "300"))
+MIN_SAMPLES = int(os.getenv("LLM_ROUTING_MIN_SAMPLES", "3")) # Fewer recent samples than this never trigger a fallback
+FAILED_SETUP_MS = 60000.0 # Recorded when the session could not be opened at all
+
+LIMITS = {"setup": "max_setup_ms", "response": "max_response_ms"}
+
+
+class LatencyRouter:
+    def __init__(self, window: float = ROUTING_WINDOW_SECONDS, min_samples: int = MIN_SAMPLES, max_samples: int = 200):
+        self.window = window
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.samples = {} # (backend, model, metric) -> deque of (time, ms)
+        self.routed = collections.Counter() # (backend, model, fallback) -> calls
+
+    def record(self, backend: str, model: str, metric: str, ms: float):
+        key = (backend, model, metric)
+        if key not in self.samples:
+            self.samples[key] = collections.deque(maxlen=self.max_samples)
+        self.samples[key].append((time.time(), ms))
+
+    def recent(self, backend: str, model: str, metric: str) -> list:
+        cutoff = time.time() - self.window
+        return [ms for t, ms in self.samples.get((backend, model, metric), ()) if t >= cutoff]
+
+    def slow(self, route: Dict[str, Any], llm: Dict[str, Any]) -> Optional[str]:
+        """Why `route` is too slow for these thresholds right now, or None."""
+        for metric, limit_key in LIMITS.items():
+            limit = llm.get(limit_key)
+            if not limit:
+                continue
+            values = self.recent(route["backend"], route["model"], metric)
+            if len(values) >= self.min_samples and percentile(values, 50) > limit:
+                return f"{metric} p50 {percentile(values, 50):.0f}ms > {limit:.0f}ms"
+        return None
+
+    def choose(self, llm: Dict[str, Any]) -> Dict[str, Any]:
+        """Backend and model for a new call: the primary unless it is slow and there is a fallback."""
+        primary = {"backend": llm["backend"], "model": llm["model"]}
+        route = {**primary, "fallback": False, "reason": None}
+        fallback = llm.get("fallback")
+        if fallback:
+            reason = self.slow(primary, llm)
+            if reason:
+                route = {"backend": fallback.get("backend") or llm["backend"], "model": fallback["model"],
+                         "fallback": True, "reason": reason}
+        self.routed[(route["backend"], route["model"], route["fallback"])] += 1
+        return route
+
+    def snapshot(self) -> list:
+        models = {}
+        for (backend, model, metric), samples in self.samples.items():
+            values = self.recent(backend, model, metric)
+            entry = models.setdefault((backend, model), {"backend": backend, "model": model})
+            entry[metric] = {"samples": len(values), "p50_ms": percentile(values, 50), "p90_ms": percentile(values, 90)}
+        for (backend, model, fallback), calls in self.routed.items():
+            entry = models.setdefault((backend, model), {"backend": backend, "model": model})
+            entry["fallback_calls" if fallback else "primary_calls"] = calls
+        return list(models.values())
+
+
+router = LatencyRouter()
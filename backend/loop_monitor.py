@@ -0,0 +1,166 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+import collections
+from typing import Optional
+
+from loguru import logger
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+LOOP_CALLBACK_FILE = os.path.join("asyncio", "events.py") # Handle._run: frames below it are the loop itself
+STACK_FRAMES = 12 # Innermost frames kept per offender
+
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag: how late a periodic timer wakes up compared to
+    when it was scheduled. Every live call's audio runs on this loop, so lag
+    here is heard as stutter.
+
+    A watchdog thread also watches a heartbeat the loop records every quarter
+    of `stall_threshold_ms`: when the loop has not recorded one for longer
+    than the threshold, it is stuck in some synchronous code, so the watchdog
+    grabs the loop thread's stack right then and charges the stall to its call
+    site (the innermost frame in our code, e.g. the line calling the Twilio
+    client or writing the WAV). Offenders are counted by call site.
+    """
+
+    def __init__(self, interval: float = 0.1, window: int = 50, stall_threshold_ms: float = 100):
+        self.interval = interval
+        self.samples = collections.deque(maxlen=window) # Recent lag samples in ms
+        self.max_lag_ms = 0.0
+        self.stall_threshold_ms = stall_threshold_ms
+        self.stalls = 0
+        self.offenders = {} # call site -> {"count", "total_ms", "max_ms", "last_at", "stack"}
+        self._task: Optional[asyncio.Task] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self.heartbeat = stall_threshold_ms / 4000 # Seconds between heartbeats
+        self._beat = None # When the loop last recorded a heartbeat (monotonic)
+        self._loop_thread_id = None
+        self._stalled_site = None # Call site of the stall in progress, charged when the loop comes back
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        if self.stall_threshold_ms and self._watchdog is None:
+            self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+            self._loop_thread_id = threading.get_ident()
+            self._stop.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self):
+        for task in (self._task, self._heartbeat_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._heartbeat_task = None
+        if self._watchdog:
+            self._stop.set()
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (time.perf_counter() - started - self.interval) * 1000)
+            self.record(lag_ms)
+
+    def record(self, lag_ms: float):
+        self.samples.append(lag_ms)
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        if lag_ms > 250 and not self._stalled_site:
+            logger.warning(f"Event loop lag {lag_ms:.0f}ms")
+
+    # --- Blocking-call detection (watchdog thread) ---
+
+    async def _heartbeat(self):
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.heartbeat)
+            site, self._stalled_site = self._stalled_site, None
+            if site: # Back from a stall the watchdog caught: charge its length (to within a heartbeat)
+                blocked_ms = (time.monotonic() - self._beat) * 1000
+                offender = self.offenders[site]
+                offender["total_ms"] += blocked_ms
+                offender["max_ms"] = max(offender["max_ms"], blocked_ms)
+                logger.warning(f"Event loop blocked {blocked_ms:.0f}ms at {site}")
+
+    def _watch(self):
+        poll = max(0.005, self.heartbeat / 2)
+        captured_beat = None
+        while not self._stop.wait(poll):
+            beat = self._beat
+            if beat is None or beat == captured_beat:
+                continue
+            if (time.monotonic() - beat) * 1000 > self.stall_threshold_ms:
+                captured_beat = beat # One capture per stall
+                self._capture()
+
+    def _capture(self):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = traceback.extract_stack(frame)
+        for i in range(len(stack) - 1, -1, -1):
+            if stack[i].filename.endswith(LOOP_CALLBACK_FILE):
+                stack = traceback.StackSummary.from_list(stack[i + 1:]) # Just the callback that is blocking
+                break
+        stack = traceback.StackSummary.from_list(stack[-STACK_FRAMES:])
+        if not stack:
+            return
+        site = call_site(stack)
+        self.stalls += 1
+        offender = self.offenders.setdefault(site, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        offender["count"] += 1
+        offender["last_at"] = round(time.time())
+        offender["stack"] = [f"{f.filename}:{f.lineno} in {f.name}" for f in stack]
+        self._stalled_site = site # The loop thread adds the duration once it is back
+        logger.warning(f"Event loop blocked over {self.stall_threshold_ms:.0f}ms at {site}:\n"
+                       + "".join(traceback.format_list(stack[-4:])))
+
+    @property
+    def current_lag_ms(self) -> float:
+        """Worst lag over the recent window, so one bad tick is not averaged away."""
+        return max(self.samples) if self.samples else 0.0
+
+    def snapshot(self) -> dict:
+        samples = sorted(self.samples)
+        return {
+            "current_lag_ms": round(self.current_lag_ms, 1),
+            "p50_lag_ms": round(samples[len(samples) // 2], 1) if samples else 0.0,
+            "max_lag_ms": round(self.max_lag_ms, 1),
+            "interval_ms": self.interval * 1000,
+            "samples": len(samples),
+        }
+
+    def blocking_report(self, limit: int = 20) -> dict:
+        """Call sites that stalled the loop, worst total first."""
+        offenders = sorted(self.offenders.items(), key=lambda item: item[1]["total_ms"], reverse=True)[:limit]
+        return {
+            "stall_threshold_ms": self.stall_threshold_ms,
+            "stalls": self.stalls,
+            "offenders": [
+                {"site": site, **{k: round(v, 1) if isinstance(v, float) else v for k, v in offender.items()}}
+                for site, offender in offenders
+            ],
+        }
+
+
+def call_site(stack: traceback.StackSummary) -> str:
+    """Innermost frame in the app's own code (else the innermost frame) as `file:line in function`."""
+    for frame in reversed(stack):
+        if frame.filename.startswith(APP_DIR) and frame.filename != __file__:
+            break
+    else:
+        frame = stack[-1]
+    return f"{os.path.relpath(frame.filename, APP_DIR) if frame.filename.startswith(APP_DIR) else frame.filename}:{frame.lineno} in {frame.name}"
@@ -1,32 +1,135 @@
+import time
+IMPORT_STARTED = time.perf_counter() # Cold-start import cost, reported by /readyz
+
+import os
 import json
+import uuid
+import secrets
+import functools
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
 import uvicorn
-from fastapi import FastAPI, WebSocket, Request, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, StreamingResponse, Response
+import asyncio
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, HTTPException, Header, Depends
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, Response, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from twilio.twiml.voice_response import VoiceResponse, Connect, Stream
 from twilio.rest import Client
 from loguru import logger
 from dotenv import load_dotenv
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
-from bot import run_bot, settings
+# Pipecat (bot, vad) is imported during warm-up, not here: it is most of the cold-start cost
+from config import settings
 from settings_manager import SettingsManager
+from agent_store import VersionConflict
+from admission import AdmissionController
+from loop_monitor import LoopLagMonitor
+from recorder import CallRecorder, RecordingWebSocket
+from warmup import Warmup
+import upload_spool
+import postcall
+import gcs
+import waveform
+import artifact_index
+import previews
+import static_assets
+import call_metrics
+import call_accounting
+import amd
+import llm_routing
+import live_events
+import export
 
 load_dotenv()
 
-app = FastAPI()
+loop_monitor = LoopLagMonitor(stall_threshold_ms=settings.LOOP_STALL_MS)
+admission = AdmissionController(
+    max_calls=settings.MAX_CONCURRENT_CALLS,
+    max_loop_lag_ms=settings.MAX_LOOP_LAG_MS,
+    lag_monitor=loop_monitor,
+    retry_after=settings.ADMISSION_RETRY_AFTER,
+)
+
+@functools.lru_cache(maxsize=1)
+def twilio_client() -> Client:
+    return Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+
+def import_bot():
+    import bot # noqa: F401 - Pipecat and the Gemini service
+
+def load_vad_model():
+    import vad
+    vad.model_session()
+
+def load_agents():
+    SettingsManager.load_settings() # Opens the store, importing the legacy JSON on first start
+
+startup = Warmup()
+startup.add("pipecat", import_bot)
+startup.add("vad", load_vad_model, after="pipecat")
+startup.add("agents", load_agents)
+startup.add("call_metrics", call_metrics.get_store, required=False)
+startup.add("twilio", twilio_client, required=False)
+startup.add("storage", gcs.get_bucket, required=False) # Artifacts fall back to loading it on first use
+startup.add("previews", previews.cache.load, required=False, after="storage")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info(f"App imported in {startup.import_ms:.0f}ms")
+    warmup_task = asyncio.create_task(startup.run())
+    loop_monitor.start()
+    upload_spool.spool.listeners.append(artifact_index.index.record_upload)
+    upload_spool.spool.listeners.append(call_accounting.record_upload)
+    await upload_spool.spool.start()
+    postcall.pipeline.start()
+    yield
+    warmup_task.cancel()
+    await postcall.pipeline.stop()
+    await upload_spool.spool.stop()
+    upload_spool.spool.listeners.remove(artifact_index.index.record_upload)
+    upload_spool.spool.listeners.remove(call_accounting.record_upload)
+    await loop_monitor.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 # In-memory store for call variables: {call_sid: variables_dict}
 call_context_store = {}
 
-# Data Models
 # Data Models
 class VariableDefinition(BaseModel):
     key: str
     description: str
     example: str
 
+class VADSettings(BaseModel):
+    confidence: float = Field(0.7, ge=0, le=1) # Silero speech probability threshold
+    start_secs: float = Field(0.2, ge=0, le=2) # Speech needed before the caller "starts" talking
+    stop_secs: float = Field(0.8, ge=0, le=3) # Silence before their turn ends and the bot can answer
+    min_volume: float = Field(0.6, ge=0, le=1)
+
+class LLMSessionSettings(BaseModel):
+    session_resumption: bool = True # Reconnect to the same session after an upstream drop
+    max_reconnects: int = Field(3, ge=0, le=10)
+    context_compression: bool = True # Sliding window over the conversation (the system prompt is kept)
+    compression_trigger_tokens: Optional[int] = Field(16000, ge=1000) # Context size that triggers it
+    compression_target_tokens: Optional[int] = Field(8000, ge=500) # What it is cut down to
+
+class LLMRoute(BaseModel):
+    backend: Literal["gemini_live", "fake"] = "gemini_live" # See llm_backends
+    model: str = "models/gemini-2.0-flash-live-001"
+
+class LLMSettings(LLMRoute):
+    fallback: Optional[LLMRoute] = None # Takes new calls while the primary is over the thresholds below
+    max_setup_ms: Optional[float] = Field(None, gt=0) # Recent median session setup time
+    max_response_ms: Optional[float] = Field(None, gt=0) # Recent median caller-stops -> bot-audio time
+
+class TurnTakingVariant(BaseModel):
+    name: str
+    weight: float = Field(1, ge=0) # Share of calls, relative to the other variants
+    vad: Optional[VADSettings] = None # Overrides the agent's
+    allow_interruptions: Optional[bool] = None
+
 class AgentConfig(BaseModel):
     id: str = "default"
     name: str = "Nuevo Agente"
@@ -34,11 +137,24 @@ class AgentConfig(BaseModel):
     voice_id: str
     language: str = "es-US"
     variables: list[VariableDefinition] = []
+    max_concurrent_calls: Optional[int] = None # Per-agent limit on top of MAX_CONCURRENT_CALLS
+    vad: VADSettings = VADSettings()
+    allow_interruptions: bool = True # Caller can talk over the bot
+    turn_taking_variants: list[TurnTakingVariant] = [] # A/B test: each call gets one, see /agents/{id}/turn-latency
+    llm: LLMSettings = LLMSettings()
+    llm_session: LLMSessionSettings = LLMSessionSettings()
+    voicemail_message: Optional[str] = None # Said after the beep when async AMD finds a machine; {{variables}} allowed
+    version: Optional[int] = None # Version the client edited; a stale one gets 409 instead of overwriting
 
 class CallRequest(BaseModel):
     to_number: str
     agent_id: str = "default"
     variables: dict[str, str] = {}
+    campaign_id: Optional[str] = None # Groups calls in /admin/usage
+    defer_seconds: int = 0 # Wait up to this long for capacity before refusing the call
+
+class ArtifactsRequest(BaseModel):
+    call_sids: list[str]
 
 # Allow CORS for development
 app.add_middleware(
@@ -70,16 +186,26 @@ async def get_agent(agent_id: str):
         raise HTTPException(status_code=404, detail="Agent not found")
     return agent
 
+@app.get("/agents/{agent_id}/turn-latency")
+async def get_turn_latency(agent_id: str, days: float = 7):
+    """
+    Per-turn latency (caller stops talking -> bot audio starts) for the agent's
+    recent calls, by turn-taking variant, to compare VAD settings.
+    """
+    since = time.time() - days * 86400
+    variants = await asyncio.to_thread(call_metrics.get_store().compare_variants, agent_id, since)
+    return {"agent_id": agent_id, "since": since, "variants": variants}
+
 @app.post("/agents")
 async def create_agent(config: AgentConfig):
     """Create a new agent."""
-    import uuid
     # If no ID provided or default, generate one (unless it's explicitly default which is reserved)
     agent_id = config.id
     if not agent_id or agent_id == "new":
         agent_id = str(uuid.uuid4())
     
     agent_data = config.dict()
+    agent_data.pop("version")
     agent_data["id"] = agent_id
     
     created_agent = SettingsManager.create_agent(agent_id, agent_data)
@@ -93,7 +219,12 @@ async def update_agent(agent_id: str, config: AgentConfig):
     if config.voice_id not in valid_voices:
         logger.warning(f"Invalid voice_id {config.voice_id}, proceeding anyway.")
     
-    updated_agent = SettingsManager.update_agent(agent_id, config.dict())
+    agent_data = config.dict()
+    expected_version = agent_data.pop("version")
+    try:
+        updated_agent = SettingsManager.update_agent(agent_id, agent_data, expected_version)
+    except VersionConflict as e:
+        raise HTTPException(status_code=409, detail=f"Agent was modified by someone else (now version {e.current}), reload it.")
     if not updated_agent:
          raise HTTPException(status_code=404, detail="Agent not found")
          
@@ -111,11 +242,6 @@ async def delete_agent(agent_id: str):
     return {"status": "deleted"}
 
 
-# Initialize Twilio Client
-twilio_client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-
-
-
 @app.post("/call")
 async def make_call(call_request: CallRequest):
     """
@@ -124,29 +250,57 @@ async def make_call(call_request: CallRequest):
     if not settings.DOMAIN or settings.DOMAIN == "localhost":
         raise HTTPException(status_code=500, detail="DOMAIN env var must be set to a public URL (e.g. ngrok) for outbound calls.")
 
-    try:
-        # Check if agent exists
-        agent = SettingsManager.get_agent(call_request.agent_id)
-        if not agent:
-             raise HTTPException(status_code=404, detail=f"Agent configured '{call_request.agent_id}' not found.")
+    # Check if agent exists
+    agent = SettingsManager.get_agent(call_request.agent_id)
+    if not agent:
+         raise HTTPException(status_code=404, detail=f"Agent configured '{call_request.agent_id}' not found.")
+
+    # Refuse (retryable) instead of dialing into an overloaded process
+    decision = await admission.wait_for_capacity(
+        call_request.agent_id, agent.get("max_concurrent_calls"), min(call_request.defer_seconds, 60)
+    )
+    if not decision.admitted:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Call capacity exhausted ({decision.reason}), retry later.",
+            headers={"Retry-After": str(decision.retry_after)},
+        )
 
+    try:
         # The URL that Twilio will fetch when the call is answered.
         # It must scream back the TwiML to connect to the Media Stream.
         twiml_url = f"https://{settings.DOMAIN}/voice"
         
-        call = twilio_client.calls.create(
+        if settings.AMD_MODE == "async":
+            # The bot answers right away; the result (after the beep, for machines) comes to /amd-status
+            amd_options = {
+                "machine_detection": "DetectMessageEnd",
+                "async_amd": "true",
+                "async_amd_status_callback": f"https://{settings.DOMAIN}/amd-status",
+                "async_amd_status_callback_method": "POST",
+            }
+        elif settings.AMD_MODE == "sync":
+            amd_options = {"machine_detection": "Enable"} # Detect voicemail before /voice
+        else:
+            amd_options = {}
+
+        call = twilio_client().calls.create(
             to=call_request.to_number,
             from_=settings.TWILIO_PHONE_NUMBER,
             url=twiml_url,
-            machine_detection='Enable', # Detect voicemail
-            time_limit=600 # 10 minutes max duration
+            time_limit=600, # 10 minutes max duration
+            **amd_options,
         )
         logger.info(f"Outbound call initiated: {call.sid} using Agent: {call_request.agent_id}")
+        admission.reserve(call.sid, call_request.agent_id)
         
         # Store context (variables + AGENT ID) for this call
         context_data = {
             "variables": call_request.variables,
-            "agent_id": call_request.agent_id
+            "agent_id": call_request.agent_id,
+            "agent_version": agent["version"], # Pinned: edits after dialing do not change this call
+            "amd_mode": settings.AMD_MODE,
+            "campaign_id": call_request.campaign_id,
         }
         call_context_store[call.sid] = context_data
         logger.info(f"Stored context for {call.sid}: {context_data}")
@@ -169,7 +323,7 @@ async def get_calls(limit: int = 20):
     Fetch recent calls from Twilio log.
     """
     try:
-        calls = twilio_client.calls.list(limit=limit)
+        calls = twilio_client().calls.list(limit=limit)
         call_data = []
         for c in calls:
             call_data.append({
@@ -188,102 +342,173 @@ async def get_calls(limit: int = 20):
         logger.error(f"Failed to fetch calls: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/calls/live")
+async def stream_live_calls(call_sid: Optional[str] = None, agent_id: Optional[str] = None):
+    """
+    Server-sent events for calls in progress (optionally one call or agent):
+    call_started (also sent on connect for calls already running), turn
+    (each finalized caller/bot turn), barge_in, call_ended (with artifact
+    links) and dropped (events this client was too slow to receive).
+    """
+    subscriber = live_events.hub.subscribe(call_sid, agent_id)
+    return StreamingResponse(live_events.hub.stream(subscriber), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/calls/artifacts")
+async def get_call_artifacts(request: ArtifactsRequest):
+    """
+    Recording/transcript availability, sizes and durations for a page of calls,
+    answered from the artifact index instead of one GCS probe per call.
+    """
+    if len(request.call_sids) > 500:
+        raise HTTPException(status_code=400, detail="At most 500 call_sids per request")
+
+    index = artifact_index.index
+    try:
+        await index.refresh()
+    except Exception as e:
+        if not index.refreshed_at:
+            logger.error(f"Failed to build artifact index: {e}")
+            raise HTTPException(status_code=503, detail="Artifact index unavailable")
+        logger.warning(f"Artifact index refresh failed, serving stale data: {e}")
+
+    return {
+        "artifacts": {sid: index.lookup(sid) for sid in request.call_sids},
+        "indexed_at": index.refreshed_at,
+    }
+
+async def deliver_blob(request: Request, blob_name: str, media_type: str, not_found: str, known: bool = False):
+    """
+    Serves a GCS object according to ARTIFACT_DELIVERY: a redirect to a
+    short-lived signed URL, so this process moves no artifact bytes, or a
+    fixed-size chunked proxy with Range support for seeking in the player.
+    """
+    if settings.ARTIFACT_DELIVERY == "redirect":
+        # Signing is local and would succeed for a missing object too
+        known = known or artifact_index.index.contains(blob_name)
+        if not known and not await asyncio.to_thread(gcs.blob_exists, blob_name):
+            raise HTTPException(status_code=404, detail=not_found)
+        ttl = settings.SIGNED_URL_TTL_SECONDS
+        url = await asyncio.to_thread(gcs.signed_url, blob_name, ttl, media_type)
+        return RedirectResponse(url, status_code=307, headers={"Cache-Control": f"private, max-age={ttl // 2}"})
+
+    blob = await gcs.open_blob(blob_name)
+    if blob is None:
+        raise HTTPException(status_code=404, detail=not_found)
+
+    headers = {"Accept-Ranges": "bytes", "Content-Length": str(blob.size)}
+    byte_range = gcs.parse_range(request.headers.get("range"), blob.size)
+    if byte_range is None:
+        return StreamingResponse(gcs.stream_blob(blob), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    if start > end:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{blob.size}"})
+    headers.update({"Content-Length": str(end - start + 1), "Content-Range": f"bytes {start}-{end}/{blob.size}"})
+    return StreamingResponse(gcs.stream_blob(blob, start, end), status_code=206, media_type=media_type, headers=headers)
+
+async def call_date(call_sid: str) -> str:
+    """Date folder of a call's recording, from its start time in Twilio."""
+    try:
+        call = await asyncio.to_thread(twilio_client().calls(call_sid).fetch)
+    except Exception as e:
+        logger.error(f"Twilio error fetch call: {e}")
+        raise HTTPException(status_code=404, detail="Call not found in Twilio logs")
+    if not call.start_time:
+        raise HTTPException(status_code=404, detail="Call start time not found, maybe recording not ready")
+    return call.start_time.date().isoformat()
+
 @app.get("/voices/preview/{voice_id}")
-async def get_voice_preview(voice_id: str):
+async def get_voice_preview(voice_id: str, request: Request):
     """
-    Proxy voice preview audio from GCS.
+    Voice preview audio, from the in-memory cache or GCS.
     """
+    cached = previews.cache.get(voice_id)
+    if cached:
+        headers = {"ETag": cached["etag"], "Cache-Control": "public, max-age=86400"}
+        if request.headers.get("if-none-match") == cached["etag"]:
+            return Response(status_code=304, headers=headers)
+        return Response(cached["content"], media_type="audio/mp4", headers=headers)
+
+    if previews.cache.exists(voice_id) is False:
+        raise HTTPException(status_code=404, detail="Audio preview not found") # Not in the manifest: skip the GCS lookup
+
+    # Case-insensitive handling by lowercasing
+    blob_name = f"previews/{voice_id.lower()}.m4a"
     try:
-        from google.cloud import storage
-        from recorder import KEY_FILE, BUCKET_NAME
-        
-        # Initialize GCS client
-        storage_client = storage.Client.from_service_account_json(KEY_FILE)
-        bucket = storage_client.bucket(BUCKET_NAME)
-        
-        # Construct blob path (case-insensitive handling by lowercasing)
-        blob_name = f"previews/{voice_id.lower()}.m4a"
-        blob = bucket.blob(blob_name)
-        
-        if not blob.exists():
-            raise HTTPException(status_code=404, detail="Audio preview not found")
-            
-        # Create a generator to stream the file
-        def iterfile():
-            with blob.open("rb") as f:
-                yield from f
-                
-        return StreamingResponse(iterfile(), media_type="audio/mp4")
-        
+        return await deliver_blob(request, blob_name, "audio/mp4", "Audio preview not found",
+                                  known=previews.cache.exists(voice_id) is True)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to stream preview: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/calls/{call_sid}/recording")
-async def get_call_recording(call_sid: str):
+async def get_call_recording(call_sid: str, request: Request):
     """
-    Proxy call recording from GCS.
+    Call recording from GCS.
     """
     try:
-        from google.cloud import storage
-        from recorder import KEY_FILE, BUCKET_NAME
-        import datetime
+        # The artifact index knows the blob; otherwise find the date folder from Twilio
+        indexed = artifact_index.index.recordings.get(call_sid)
+        if indexed:
+            blob_name = indexed["blob"]
+        else:
+            date_str = await call_date(call_sid)
+            bucket = gcs.get_bucket()
+            # WAV by default; FLAC when the post-call pipeline compresses recordings
+            for extension in (".wav", ".flac"):
+                blob_name = f"grabaciones/{date_str}/{call_sid}{extension}"
+                if await asyncio.to_thread(bucket.blob(blob_name).exists):
+                    break
+            else:
+                raise HTTPException(status_code=404, detail="Recording audio not found")
 
-        # We need to find the date folder. Use Twilio API to get call date.
-        try:
-            call = twilio_client.calls(call_sid).fetch()
-            if not call.start_time:
-                 raise HTTPException(status_code=404, detail="Call start time not found, maybe recording not ready")
-            date_str = call.start_time.date().isoformat()
-        except Exception as e:
-             logger.error(f"Twilio error fetch call: {e}")
-             # Fallback: try to find the file if possible, or fail?
-             # For now, let's assume if Twilio fails, we can't find the folder easily without scanning.
-             raise HTTPException(status_code=404, detail="Call not found in Twilio logs")
+        media_type = "audio/flac" if blob_name.endswith(".flac") else "audio/wav"
+        return await deliver_blob(request, blob_name, media_type, "Recording audio not found")
 
-        
-        storage_client = storage.Client.from_service_account_json(KEY_FILE)
-        bucket = storage_client.bucket(BUCKET_NAME)
-        
-        blob_name = f"grabaciones/{date_str}/{call_sid}.wav"
-        blob = bucket.blob(blob_name)
-        
-        if not blob.exists():
-            raise HTTPException(status_code=404, detail="Recording audio not found")
-            
-        def iterfile():
-            with blob.open("rb") as f:
-                yield from f
-                
-        return StreamingResponse(iterfile(), media_type="audio/wav")
-        
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Failed to stream recording: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/calls/{call_sid}/waveform")
+async def get_call_waveform(call_sid: str, max_points: int = 2000):
+    """
+    Precomputed waveform peaks for the recordings player. Returns the finest
+    level that fits in `max_points`, so the player can draw before loading audio.
+    """
+    blob_name = artifact_index.index.waveforms.get(call_sid)
+    if blob_name is None:
+        blob_name = f"grabaciones/{await call_date(call_sid)}/{call_sid}.waveform.json"
+
+    def load():
+        blob = gcs.get_bucket().blob(blob_name)
+        if not blob.exists():
+            return None
+        return waveform.select_level(json.loads(blob.download_as_bytes()), max(1, max_points))
+
+    try:
+        summary = await asyncio.to_thread(load)
+    except Exception as e:
+        logger.error(f"Failed to fetch waveform: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Waveform not found")
+    # Immutable once uploaded
+    return JSONResponse(summary, headers={"Cache-Control": "private, max-age=86400"})
+
 @app.get("/calls/{call_sid}/transcription")
-async def get_call_transcription(call_sid: str):
+async def get_call_transcription(call_sid: str, request: Request):
     """
-    Proxy transcription JSON from GCS.
+    Transcription JSON from GCS.
     """
     try:
-        from google.cloud import storage
-        from recorder import KEY_FILE, BUCKET_NAME
-        
-        storage_client = storage.Client.from_service_account_json(KEY_FILE)
-        bucket = storage_client.bucket(BUCKET_NAME)
-        
-        blob_name = f"transcripciones/{call_sid}.json"
-        blob = bucket.blob(blob_name)
-        
-        if not blob.exists():
-            raise HTTPException(status_code=404, detail="Transcription not found")
-            
-        content = blob.download_as_text()
-        return Response(content=content, media_type="application/json")
-        
+        return await deliver_blob(request, f"transcripciones/{call_sid}.json", "application/json", "Transcription not found")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to fetch transcription: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -300,13 +525,37 @@ async def voice_handler(request: Request):
     # Trust X-Forwarded-Proto header from Traefik
     forwarded_proto = request.headers.get("x-forwarded-proto")
 
-    # Check for Voicemail
     form_data = await request.form()
+    call_sid = form_data.get("CallSid", "")
+    context = call_context_store.get(call_sid)
     answered_by = form_data.get("AnsweredBy")
-    if answered_by and answered_by.lower() in ["machine_start", "machine_end_beep", "machine_end_silence", "machine_end_other"]:
-         logger.info(f"Machine detected ({answered_by}), hanging up.")
-         response.hangup()
-         return Response(content=str(response), media_type="application/xml")
+    amd_ms = form_data.get("MachineDetectionDuration")
+    if context is not None and "answered_at" not in context:
+        # With sync AMD, Twilio answered MachineDetectionDuration ago and the caller has been waiting since
+        context["answered_at"] = time.time() - (int(amd_ms) / 1000 if amd_ms and amd_ms.isdigit() else 0)
+
+    # Check for Voicemail (sync AMD)
+    if answered_by:
+        result = amd.results.record(call_sid, answered_by, amd_ms)
+        if amd.is_machine(answered_by):
+            logger.info(f"Machine detected ({answered_by}), hanging up.")
+            result["action"] = "hangup"
+            await record_amd_hangup(call_sid, context or {})
+            response.hangup()
+            return Response(content=str(response), media_type="application/xml")
+
+    # Outbound calls were admitted when dialed; inbound ones are checked here
+    if not admission.is_reserved(call_sid):
+        agent_id = call_context_store.get(call_sid, {}).get("agent_id", "default")
+        agent = SettingsManager.get_agent(agent_id) or {}
+        decision = admission.check(agent_id, agent.get("max_concurrent_calls"))
+        if not decision.admitted:
+            attempt = int(request.query_params.get("queue_attempt", 0))
+            return busy_response(agent.get("language", "es-US"), attempt)
+        if call_sid:
+            # Take the slot now: the stream connects a round-trip later, and a burst of inbound
+            # calls would all pass the check against the same load (unused slots expire)
+            admission.reserve(call_sid, agent_id)
 
     if forwarded_proto:
         ws_scheme = "wss" if forwarded_proto == "https" else "ws"
@@ -325,9 +574,208 @@ async def voice_handler(request: Request):
     
     return Response(content=str(response), media_type="application/xml")
 
-from recorder import CallRecorder, RecordingWebSocket
+def amd_fields(call_sid: str, context: dict) -> dict:
+    """AMD mode and result of an outbound call, as stored with its metrics."""
+    result = amd.results.get(call_sid) or {}
+    fields = {"amd_mode": context["amd_mode"], "answered_by": result.get("answered_by"), "amd_ms": result.get("amd_ms")}
+    if result.get("action"):
+        fields["ended_by"] = "voicemail" if result["action"] == "voicemail" else "amd_hangup"
+    return fields
+
+async def record_amd_hangup(call_sid: str, context: dict):
+    """Metrics row for a call sync AMD hung up before the bot started."""
+    if "amd_mode" not in context:
+        return
+    now = time.time()
+    try:
+        await asyncio.to_thread(
+            call_metrics.get_store().record_call, call_sid, context["agent_id"], context.get("agent_version"),
+            None, now, now, [], {"answered_at": context.get("answered_at"), **amd_fields(call_sid, context)},
+        )
+    except Exception as e:
+        logger.error(f"Failed to record AMD result for {call_sid}: {e}")
+
+@app.post("/amd-status")
+async def amd_status(request: Request):
+    """
+    Async AMD result. Humans (and unknowns) keep talking to the bot; a machine
+    gets the agent's voicemail_message once its greeting ended, else a hang up.
+    """
+    form_data = await request.form()
+    call_sid = form_data.get("CallSid", "")
+    answered_by = form_data.get("AnsweredBy")
+    result = amd.results.record(call_sid, answered_by, form_data.get("MachineDetectionDuration"))
+    logger.info(f"AMD result for {call_sid}: {result['answered_by']} after {result['amd_ms']}ms")
+
+    context = call_context_store.get(call_sid, {})
+    if amd.is_machine(answered_by):
+        agent = None
+        if context.get("agent_version") is not None:
+            agent = SettingsManager.get_agent_version(context["agent_id"], context["agent_version"])
+        agent = agent or SettingsManager.get_agent(context.get("agent_id", "default")) or {}
+
+        # Replacing the call's TwiML ends the media stream, and with it the bot
+        response = VoiceResponse()
+        if agent.get("voicemail_message") and result["answered_by"] in amd.MESSAGE_END_RESULTS:
+            message = SettingsManager.render_prompt(agent["voicemail_message"], context.get("variables", {}))
+            response.say(message, language=agent.get("language", "es-US"))
+            result["action"] = "voicemail"
+        else:
+            result["action"] = "hangup"
+        response.hangup()
+        try:
+            await asyncio.to_thread(twilio_client().calls(call_sid).update, twiml=str(response))
+            logger.info(f"Call {call_sid} answered by a machine: {result['action']}")
+        except Exception as e:
+            logger.warning(f"Could not redirect call {call_sid} after AMD (already ended?): {e}")
+
+    # The call may already be over and recorded
+    if "amd_mode" in context:
+        try:
+            await asyncio.to_thread(call_metrics.get_store().merge_data, call_sid, amd_fields(call_sid, context))
+        except Exception as e:
+            logger.error(f"Failed to record AMD result for {call_sid}: {e}")
+    return Response(status_code=204)
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    """Guards every /admin route: with ADMIN_TOKEN set, X-Admin-Token must match it."""
+    if settings.ADMIN_TOKEN and not secrets.compare_digest(x_admin_token or "", settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/admin/amd", dependencies=[Depends(require_admin)])
+async def get_amd_metrics(days: float = 7):
+    """Per AMD mode: answered-by counts, answer-to-greeting latency and early hang-ups of people."""
+    calls = await asyncio.to_thread(call_metrics.get_store().calls_since, time.time() - days * 86400)
+    return {"current_mode": settings.AMD_MODE, "early_hangup_seconds": amd.EARLY_HANGUP_SECONDS, "modes": amd.summarize(calls)}
+
+@app.get("/admin/usage", dependencies=[Depends(require_admin)])
+async def get_usage(days: float = 7, agent_id: Optional[str] = None, campaign_id: Optional[str] = None):
+    """Per agent, campaign and day: call minutes, CPU, media and LLM audio/tokens, artifact sizes and estimated cost."""
+    calls = await asyncio.to_thread(call_metrics.get_store().calls_since, time.time() - days * 86400)
+    rows = call_accounting.summarize(calls)
+    if agent_id:
+        rows = [row for row in rows if row["agent_id"] == agent_id]
+    if campaign_id:
+        rows = [row for row in rows if row["campaign_id"] == campaign_id]
+    return {"days": days, "usage": rows}
+
+@app.get("/admin/export", dependencies=[Depends(require_admin)])
+async def export_calls(since: str, until: Optional[str] = None, agent_id: Optional[str] = None, cursor: Optional[str] = None):
+    """
+    Calls in Twilio's log started in [since, until) (ISO dates, UTC) as
+    streamed JSONL with status, metadata, variables and transcript. Each line
+    has a `cursor`; pass the last one received to resume. Parquet is available
+    from `python export.py`.
+    """
+    try:
+        start = export.parse_time(since)
+        end = export.parse_time(until) if until else time.time()
+        if cursor:
+            export.decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(export.jsonl(export.export_calls(start, end, agent_id, cursor)),
+                             media_type="application/x-ndjson")
+
+QUEUE_POLL_SECONDS = 10
+
+def busy_response(language: str, attempt: int) -> Response:
+    """
+    TwiML for a caller we cannot take right now: keeps them waiting and retries
+    /voice while ADMISSION_QUEUE_SECONDS allows, otherwise apologizes and hangs up.
+    """
+    response = VoiceResponse()
+    if attempt * QUEUE_POLL_SECONDS < settings.ADMISSION_QUEUE_SECONDS:
+        if attempt == 0:
+            response.say("Todas nuestras líneas están ocupadas. Por favor espere un momento en la línea.", language=language)
+        response.pause(length=QUEUE_POLL_SECONDS)
+        response.redirect(f"/voice?queue_attempt={attempt + 1}", method="POST")
+    else:
+        response.say("Todas nuestras líneas están ocupadas en este momento. Por favor intente más tarde. Gracias.", language=language)
+        response.hangup()
+    return Response(content=str(response), media_type="application/xml")
 
-# ... (existing code) ...
+@app.get("/admin/loop", dependencies=[Depends(require_admin)])
+async def get_loop_state(limit: int = 20):
+    """Event loop lag and the call sites that blocked it, worst first."""
+    return {**loop_monitor.snapshot(), **loop_monitor.blocking_report(limit)}
+
+@app.get("/admin/llm-routing", dependencies=[Depends(require_admin)])
+async def get_llm_routing():
+    """Recent setup/response latency per LLM backend and model, and calls routed to each."""
+    return {"window_seconds": llm_routing.router.window, "models": llm_routing.router.snapshot()}
+
+@app.get("/admin/live", dependencies=[Depends(require_admin)])
+async def get_live_state():
+    """Calls being broadcast, live-event subscribers and dropped events."""
+    return live_events.hub.stats()
+
+@app.get("/admin/admission", dependencies=[Depends(require_admin)])
+async def get_admission_state():
+    """Current load, limits and refusal counters."""
+    return admission.snapshot()
+
+@app.get("/admin/uploads", dependencies=[Depends(require_admin)])
+async def get_upload_state():
+    """Upload spool depth, age of the oldest pending artifact and counters."""
+    return {**upload_spool.spool.stats(), "artifact_index": artifact_index.index.stats()}
+
+@app.get("/admin/postcall", dependencies=[Depends(require_admin)])
+async def get_postcall_state():
+    """Post-call process pool: queued/running jobs and reserved CPUs."""
+    return postcall.pipeline.stats()
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process and its event loop respond."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 503 until warm-up finishes, and while draining so the proxy stops routing new calls here."""
+    if admission.draining:
+        return JSONResponse(status_code=503, content={"status": "draining", "active_calls": len(admission.active)})
+    if not startup.ready:
+        return JSONResponse(status_code=503, content={"status": "starting", **startup.snapshot()})
+    return {"status": "ready", **startup.snapshot()}
+
+async def drain_process(timeout: float):
+    """Stops taking calls and waits for live ones (and their uploads) to finish."""
+    admission.start_draining(timeout)
+    # Give the proxy's health check time to see /readyz fail before we stop serving
+    await asyncio.sleep(settings.DRAIN_NOTICE_SECONDS)
+    await admission.drain(timeout)
+    # Calls are gone; push out whatever their hangup left in the spool
+    await postcall.pipeline.flush(max(5.0, admission.drain_deadline - time.time()))
+    await upload_spool.spool.flush(max(5.0, admission.drain_deadline - time.time()))
+    # Open /calls/live streams never end on their own and would keep uvicorn from shutting down
+    live_events.hub.close()
+
+drain_task: Optional[asyncio.Task] = None # Held here: the loop only keeps weak references to tasks
+
+def log_task_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception():
+        logger.opt(exception=task.exception()).error(f"Task {task.get_name()} failed")
+
+def start_drain_task(timeout: float) -> asyncio.Task:
+    """Starts the drain once; later callers get the drain already running."""
+    global drain_task
+    if drain_task is None:
+        drain_task = asyncio.get_running_loop().create_task(drain_process(timeout), name="drain")
+        drain_task.add_done_callback(log_task_failure)
+    return drain_task
+
+@app.post("/admin/drain", dependencies=[Depends(require_admin)])
+async def start_drain(timeout: Optional[float] = None):
+    """Puts the process in drain mode ahead of a deploy. Irreversible until restart."""
+    if not admission.draining:
+        start_drain_task(timeout or settings.DRAIN_TIMEOUT_SECONDS)
+        await asyncio.sleep(0) # Let drain flip the flag before reporting state
+    return admission.snapshot()
+
+@app.get("/admin/drain", dependencies=[Depends(require_admin)])
+async def get_drain_state():
+    return {"draining": admission.draining, "drained": admission.drained, **admission.snapshot()}
 
 @app.websocket("/media-stream")
 async def media_stream(websocket: WebSocket):
@@ -357,15 +805,30 @@ async def media_stream(websocket: WebSocket):
                 context_data = call_context_store.get(call_sid, {})
                 call_variables = context_data.get("variables", {})
                 agent_id = context_data.get("agent_id", "default")
+                agent_version = context_data.get("agent_version")
                 
                 # Cleanup context to free memory? Or keep for debug?
                 # call_context_store.pop(call_sid, None) 
                 
+                import bot # Already loaded by warm-up
+
                 # Wrap WebSocket to intercept audio for recording
                 wrapped_ws = RecordingWebSocket(websocket, recorder)
                 
                 # Start the Pipecat bot pipeline with wrapped socket and variables
-                await run_bot(wrapped_ws, stream_sid, call_sid, call_variables, agent_id)
+                # Tracked until the recording upload finishes so drain waits for it
+                with admission.track(call_sid, agent_id):
+                    try:
+                        await bot.run_bot(wrapped_ws, stream_sid, call_sid, call_variables, agent_id, agent_version,
+                                          context_data.get("answered_at"), context_data.get("campaign_id"))
+                    finally:
+                        if "amd_mode" in context_data:
+                            try:
+                                await asyncio.to_thread(call_metrics.get_store().merge_data, call_sid, amd_fields(call_sid, context_data))
+                            except Exception as e:
+                                logger.error(f"Failed to record AMD result for {call_sid}: {e}")
+                        # No-op if the socket close / Twilio stop already uploaded it
+                        await recorder.stop_and_upload_async()
                 break
                 
             elif event.get("event") == "stop":
@@ -386,34 +849,46 @@ async def media_stream(websocket: WebSocket):
     finally:
         logger.info("Media stream connection closed")
 
-# Mount static files (Frontend)
-# We mount it at the end to avoid shadowing API routes
-# Mount static files (Frontend)
-import os
-from fastapi.responses import FileResponse
-
-# Explicitly serve index.html for root to prevent caching old versions
-@app.get("/")
-async def serve_root():
-    # Check possible locations (local vs docker)
-    if os.path.exists("frontend/dist/index.html"):
-        path = "frontend/dist/index.html"
-    elif os.path.exists("static/index.html"):
-        path = "static/index.html"
-    else:
-        return {"error": "Frontend not found"}
-        
-    response = FileResponse(path)
-    # Force browser to revalidate so it picks up new index-HASH.js
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    return response
+# Frontend (Vite build), registered last so it does not shadow API routes
+frontend = static_assets.StaticAssets(static_assets.find_frontend_dir())
+startup.add("frontend", frontend.load, required=False)
+
+@app.api_route("/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def serve_frontend(path: str, request: Request):
+    return await frontend.serve(path, request)
 
-# Check if frontend/dist exists (Vite build output)
-if os.path.exists("frontend/dist"):
-    app.mount("/", StaticFiles(directory="frontend/dist", html=True), name="frontend")
-elif os.path.exists("static"):
-    app.mount("/", StaticFiles(directory="static", html=True), name="static")
+startup.import_ms = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    Turns the first SIGTERM/SIGINT into a drain: stop admitting calls, let live
+    ones finish (up to DRAIN_TIMEOUT_SECONDS), then shut down. A drain already
+    started by POST /admin/drain is waited for. A second signal exits right away.
+    """
+    exiting = False
+    exit_task: Optional[asyncio.Task] = None # Held here: the loop only keeps weak references to tasks
+
+    def handle_exit(self, sig, frame):
+        if self.exiting:
+            return super().handle_exit(sig, frame)
+
+        self.exiting = True
+        logger.info(f"Received signal {sig}, draining before shutdown...")
+        asyncio.get_running_loop().call_soon_threadsafe(self._start_exit, sig)
+
+    def _start_exit(self, sig):
+        self.exit_task = asyncio.get_running_loop().create_task(self._drain_and_exit(sig), name="drain-and-exit")
+        self.exit_task.add_done_callback(log_task_failure)
+
+    async def _drain_and_exit(self, sig):
+        try:
+            await asyncio.wait([start_drain_task(settings.DRAIN_TIMEOUT_SECONDS)]) # A failed drain is logged by its task
+        finally:
+            super().handle_exit(sig, None)
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=settings.PORT)
+    server = DrainingServer(uvicorn.Config(app, host="0.0.0.0", port=settings.PORT,
+                                           timeout_graceful_shutdown=settings.SHUTDOWN_GRACE_SECONDS))
+    server.run()
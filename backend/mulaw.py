@@ -0,0 +1,106 @@
+"""
+G.711 mu-law codec (bit-exact with audioop.ulaw2lin / audioop.lin2ulaw at width=2).
+
+Lookup-table based and vectorized with NumPy so a whole batch of Twilio frames
+is converted in one call, optionally into a caller-owned buffer. Replaces
+`audioop`, which was removed in Python 3.13.
+"""
+import sys
+from typing import Iterable, Optional, Union
+
+import numpy as np
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+BIAS = 0x84
+CLIP = 8159  # Max magnitude on the 14-bit scale used by the encoder
+SEGMENT_ENDS = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF], dtype=np.int32)
+
+
+def _build_decode_table() -> np.ndarray:
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    t = (((u & 0x0F) << 3) + BIAS) << ((u & 0x70) >> 4)
+    return np.where(u & 0x80, BIAS - t, t - BIAS).astype(np.int16)
+
+
+def _build_encode_table() -> np.ndarray:
+    # Indexed by the 16-bit sample reinterpreted as uint16
+    samples = np.arange(65536, dtype=np.uint16).view(np.int16).astype(np.int32) >> 2
+    mask = np.where(samples < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(samples), CLIP) + (BIAS >> 2)
+    segment = np.searchsorted(SEGMENT_ENDS, magnitude)
+    uval = (segment << 4) | ((magnitude >> (segment + 1)) & 0x0F)
+    uval = np.where(segment >= 8, 0x7F, uval)
+    return ((uval ^ mask) & 0xFF).astype(np.uint8)
+
+
+def _build_pair_decode_table(table: np.ndarray) -> np.ndarray:
+    # Two mu-law bytes (read as one native uint16) -> two int16 samples (as one uint32).
+    # Halves the number of lookups, which is where the decoder spends its time.
+    pairs = np.arange(65536, dtype=np.uint32)
+    first, second = (pairs & 0xFF, pairs >> 8) if sys.byteorder == "little" else (pairs >> 8, pairs & 0xFF)
+    decoded = np.empty((65536, 2), dtype=np.int16)
+    decoded[:, 0] = table[first]
+    decoded[:, 1] = table[second]
+    return decoded.view(np.uint32).ravel()
+
+
+DECODE_TABLE = _build_decode_table()  # mu-law byte -> int16 sample
+PAIR_DECODE_TABLE = _build_pair_decode_table(DECODE_TABLE)
+ENCODE_TABLE = _build_encode_table()  # uint16 view of sample -> mu-law byte
+
+
+def decode(data: Union[BytesLike, np.ndarray], out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Decodes mu-law bytes to int16 PCM samples.
+    If `out` is given (int16, at least len(data) samples) the result is written
+    into it and a view of the used prefix is returned.
+    """
+    codes = data if isinstance(data, np.ndarray) else np.frombuffer(data, dtype=np.uint8)
+    target = np.empty(codes.size, dtype=np.int16) if out is None else out[:codes.size]
+
+    if codes.size % 2 == 0 and codes.flags.c_contiguous and target.flags.c_contiguous:
+        np.take(PAIR_DECODE_TABLE, codes.view(np.uint16), out=target.view(np.uint32))
+    else:
+        np.take(DECODE_TABLE, codes, out=target)
+    return target
+
+
+def encode(pcm: Union[BytesLike, np.ndarray], out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Encodes int16 PCM samples (array or little-endian bytes) to mu-law bytes.
+    If `out` is given (uint8, at least as many samples) the result is written
+    into it and a view of the used prefix is returned.
+    """
+    samples = pcm if isinstance(pcm, np.ndarray) else np.frombuffer(pcm, dtype=np.int16)
+    index = samples.astype(np.int16, copy=False).view(np.uint16)
+    if out is None:
+        return ENCODE_TABLE[index]
+    target = out[:index.size]
+    np.take(ENCODE_TABLE, index, out=target)
+    return target
+
+
+def decode_frames(frames: Iterable[BytesLike], out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Decodes a batch of mu-law frames into one contiguous int16 array."""
+    return decode(b"".join(frames), out=out)
+
+
+def encode_frames(pcm: Union[BytesLike, np.ndarray], frame_size: int = 160,
+                  out: Optional[np.ndarray] = None) -> list:
+    """
+    Encodes PCM to mu-law and splits it into frames of `frame_size` bytes
+    (160 = 20ms at 8kHz). The last frame may be shorter.
+    """
+    encoded = encode(pcm, out=out)
+    return [encoded[i:i + frame_size].tobytes() for i in range(0, encoded.size, frame_size)]
+
+
+def ulaw2lin(data: BytesLike) -> bytes:
+    """Drop-in replacement for audioop.ulaw2lin(data, 2)."""
+    return decode(data).tobytes()
+
+
+def lin2ulaw(data: BytesLike) -> bytes:
+    """Drop-in replacement for audioop.lin2ulaw(data, 2)."""
+    return encode(data).tobytes()
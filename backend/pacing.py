@@ -0,0 +1,58 @@
+"""
+Outbound audio pacing toward Twilio.
+
+Pipecat's websocket output already cuts bot audio into fixed chunks
+(`audio_out_10ms_chunks`), but then sends them at twice real time, so a long
+answer is pushed to Twilio in bursts and buffered there. This transport sends
+one OUTBOUND_FRAME_MS frame per frame period instead, keeping at most
+OUTBOUND_JITTER_MS of audio queued ahead of playout: smooth cadence, no
+bursts on the event loop, and little to discard on barge-in (the serializer
+still sends Twilio a `clear`).
+"""
+import asyncio
+import time
+
+from pipecat.frames.frames import Frame, StartFrame, StartInterruptionFrame
+from pipecat.processors.frame_processor import FrameDirection
+from pipecat.transports.network.fastapi_websocket import (
+    FastAPIWebsocketOutputTransport,
+    FastAPIWebsocketParams,
+    FastAPIWebsocketTransport,
+)
+
+
+class PacedWebsocketOutputTransport(FastAPIWebsocketOutputTransport):
+    def __init__(self, *args, jitter_ms: int = 60, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._jitter = jitter_ms / 1000
+        self._frame_seconds = 0.0
+        self._playout_end = 0.0 # When the audio already sent finishes playing at Twilio
+
+    async def start(self, frame: StartFrame):
+        await super().start(frame)
+        self._frame_seconds = self._params.audio_out_10ms_chunks / 100
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, StartInterruptionFrame):
+            self._playout_end = 0.0 # Twilio was told to clear its buffer
+
+    async def _write_audio_sleep(self):
+        # Called after each frame is sent (or dropped while disconnected)
+        now = time.monotonic()
+        self._playout_end = max(self._playout_end, now) + self._frame_seconds
+        lead = self._playout_end - now
+        if lead > self._jitter:
+            await asyncio.sleep(lead - self._jitter)
+
+
+class PacedWebsocketTransport(FastAPIWebsocketTransport):
+    """FastAPIWebsocketTransport whose output is paced by PacedWebsocketOutputTransport."""
+
+    def __init__(self, websocket, params: FastAPIWebsocketParams, frame_ms: int = 20, jitter_ms: int = 60, **kwargs):
+        params.audio_out_10ms_chunks = max(1, frame_ms // 10)
+        super().__init__(websocket, params, **kwargs)
+        self._output = PacedWebsocketOutputTransport(
+            self, self._client, self._params, jitter_ms=jitter_ms, name=self._output_name
+        )
@@ -0,0 +1,450 @@
+"""
+Post-call job pipeline.
+
+CPU-heavy work on finished artifacts (transcript serialization, loudness
+normalization, silence trimming, compression) runs here, in a pool of worker
+processes, never on the event loop or thread pool that carries live audio.
+Jobs are dispatched by priority with bounded concurrency; results go to the
+upload spool.
+
+Every job's input is written to the spool's staging/ directory (with a small
+`.job.json` descriptor) before it is queued, so artifacts are on disk at
+hangup: jobs a crash interrupted are resumed by start(). A job whose step
+fails in the pool is retried on a thread; one that fails there too, or that
+has been resumed MAX_RESUMES times, is moved to staging/failed/.
+
+With POSTCALL_CPUS set (e.g. "3" or "2,3"), the workers are pinned to those
+cores and the main process is pinned away from them, so live calls never
+share a core with batch audio work. Affinity and niceness are per thread on
+Linux, so every thread of the process is set (threads started later inherit
+them from the thread that starts them).
+"""
+import os
+import json
+import wave
+import shutil
+import pickle
+import asyncio
+import uuid
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from typing import Callable, Optional
+
+import numpy as np
+from loguru import logger
+
+import upload_spool
+import waveform
+
+POSTCALL_WORKERS = int(os.getenv("POSTCALL_WORKERS", "1"))
+POSTCALL_CPUS = os.getenv("POSTCALL_CPUS", "")
+POSTCALL_AUDIO_STEPS = os.getenv("POSTCALL_AUDIO_STEPS", "") # e.g. "trim_silence,normalize,compress"
+
+PRIORITY_TRANSCRIPT = 0 # Small and what the dashboard asks for first
+PRIORITY_WAVEFORM = 5
+PRIORITY_RECORDING = 10
+
+TARGET_RMS_DBFS = -20.0
+PEAK_LIMIT_DBFS = -1.0
+SILENCE_DBFS = -45.0
+SILENCE_KEEP_MS = 300
+MAX_RESUMES = 3 # Restarts a staged job may be resumed across before it is set aside
+
+
+def _parse_cpus(value: str) -> set:
+    return {int(c) for c in value.split(",") if c.strip()}
+
+
+def _threads() -> list:
+    """Ids of this process's threads: on Linux affinity and niceness are per thread, and pid 0 is only the caller."""
+    try:
+        return [int(tid) for tid in os.listdir("/proc/self/task")]
+    except OSError:
+        return [0]
+
+
+def _pin(cpus: set):
+    for tid in _threads():
+        try:
+            os.sched_setaffinity(tid, cpus)
+        except OSError:
+            pass # Exited meanwhile
+
+
+# --- Steps (executed in worker processes) ---
+
+def _init_worker(cpus: set):
+    """Runs once per worker process: lowest priority, reserved cores only (numpy's threads included)."""
+    for tid in _threads():
+        try:
+            os.setpriority(os.PRIO_PROCESS, tid, os.getpriority(os.PRIO_PROCESS, tid) + 10)
+        except OSError:
+            pass
+    if cpus and hasattr(os, "sched_setaffinity"):
+        _pin(cpus)
+
+
+def _read_wav(path: str):
+    with wave.open(path, "rb") as wav:
+        rate = wav.getframerate()
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    return samples, rate
+
+
+def _write_wav(path: str, samples: np.ndarray, rate: int):
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(samples.astype(np.int16).tobytes())
+
+
+def _dbfs_to_amplitude(dbfs: float) -> float:
+    return 32768.0 * 10 ** (dbfs / 20)
+
+
+def trim_silence(samples: np.ndarray, rate: int) -> tuple:
+    """
+    Cuts leading and trailing silence, keeping SILENCE_KEEP_MS on each side.
+    Returns (samples, trimmed_start_ms): offsets into the original recording
+    shift by trimmed_start_ms.
+    """
+    window = rate // 50 # 20ms
+    if samples.size < window:
+        return samples, 0
+
+    usable = samples[:samples.size - samples.size % window].astype(np.float32)
+    rms = np.sqrt(np.mean(usable.reshape(-1, window) ** 2, axis=1))
+    voiced = np.flatnonzero(rms > _dbfs_to_amplitude(SILENCE_DBFS))
+    if voiced.size == 0:
+        return samples, 0
+
+    keep = int(rate * SILENCE_KEEP_MS / 1000)
+    start = max(0, voiced[0] * window - keep)
+    end = min(samples.size, (voiced[-1] + 1) * window + keep)
+    return samples[start:end], int(start * 1000 / rate)
+
+
+def normalize(samples: np.ndarray) -> np.ndarray:
+    """Scales to TARGET_RMS_DBFS without letting peaks exceed PEAK_LIMIT_DBFS."""
+    audio = samples.astype(np.float32)
+    rms = float(np.sqrt(np.mean(audio ** 2))) if audio.size else 0.0
+    peak = float(np.max(np.abs(audio))) if audio.size else 0.0
+    if rms < 1.0:
+        return samples
+    gain = min(_dbfs_to_amplitude(TARGET_RMS_DBFS) / rms, _dbfs_to_amplitude(PEAK_LIMIT_DBFS) / max(peak, 1.0))
+    return np.clip(audio * gain, -32768, 32767).astype(np.int16)
+
+
+def compress(path: str, samples: np.ndarray, rate: int) -> Optional[str]:
+    """Writes a FLAC next to `path`. Needs the optional `soundfile` package."""
+    try:
+        import soundfile
+    except ImportError:
+        return None
+    flac_path = os.path.splitext(path)[0] + ".flac"
+    soundfile.write(flac_path, samples, rate, format="FLAC", subtype="PCM_16")
+    return flac_path
+
+
+def process_recording(path: str, steps: list) -> dict:
+    """Applies `steps` to the WAV at `path`. Returns the artifact to upload."""
+    result = {"path": path, "content_type": "audio/wav", "extension": ".wav", "steps": []}
+    if not steps:
+        return result
+
+    samples, rate = _read_wav(path)
+    for step in steps:
+        if step == "trim_silence":
+            samples, result["trimmed_start_ms"] = trim_silence(samples, rate)
+        elif step == "normalize":
+            samples = normalize(samples)
+        elif step == "compress":
+            continue # Applied last, below
+        else:
+            raise ValueError(f"Unknown post-call step: {step}")
+        result["steps"].append(step)
+
+    if "compress" in steps:
+        flac_path = compress(path, samples, rate)
+        if flac_path:
+            os.remove(path)
+            result.update(path=flac_path, content_type="audio/flac", extension=".flac")
+            result["steps"].append("compress")
+            return result
+
+    _write_wav(path, samples, rate)
+    return result
+
+
+def serialize_transcript(input_path: str, path: str) -> dict:
+    """Staged (pickled) history -> the indented JSON that is uploaded."""
+    with open(input_path, "rb") as f:
+        history = pickle.load(f)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2, ensure_ascii=False)
+    return {"path": path, "content_type": "application/json"}
+
+
+def serialize_waveform(input_path: str, path: str) -> dict:
+    """Staged base buckets (.npz) -> the rendered waveform JSON."""
+    with np.load(input_path) as arrays:
+        base = {name: arrays[name] for name in arrays.files}
+    for name in ("sample_rate", "samples_per_point", "total_samples"):
+        base[name] = int(base[name])
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(waveform.render(base), f, separators=(",", ":"))
+    return {"path": path, "content_type": "application/json"}
+
+
+STAGED_JOBS = {
+    # kind -> (priority, step run in the pool, content type when spooled unprocessed)
+    "recording": (PRIORITY_RECORDING, process_recording, "audio/wav"),
+    "transcript": (PRIORITY_TRANSCRIPT, serialize_transcript, "application/json"),
+    "waveform": (PRIORITY_WAVEFORM, serialize_waveform, "application/json"),
+}
+JOB_SUFFIX = ".job.json"
+
+
+# --- Dispatcher (runs on the event loop) ---
+
+class PostCallPipeline:
+    def __init__(self, workers: int = POSTCALL_WORKERS, cpus: str = POSTCALL_CPUS,
+                 audio_steps: str = POSTCALL_AUDIO_STEPS):
+        self.workers = workers
+        self.cpus = _parse_cpus(cpus)
+        self.audio_steps = [s.strip() for s in audio_steps.split(",") if s.strip()]
+        self.counters = {"done": 0, "failed": 0}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._order = itertools.count() # FIFO within a priority
+        self._tasks = []
+        self._fallbacks = set() # Thread fallbacks in flight
+        self._busy = 0
+
+    @property
+    def started(self) -> bool:
+        return self._pool is not None
+
+    def start(self):
+        if self.started:
+            return
+        if self.cpus and hasattr(os, "sched_setaffinity"):
+            live_cpus = os.sched_getaffinity(0) - self.cpus
+            if live_cpus:
+                _pin(live_cpus)
+                logger.info(f"Live calls pinned to CPUs {sorted(live_cpus)}, post-call work to {sorted(self.cpus)}")
+
+        # spawn, not fork: the parent has running threads and gRPC state
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.cpus,),
+        )
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        self.resume()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def submit(self, priority: int, fn: Callable, args: tuple, on_done: Callable[[dict], None],
+               on_error: Callable[[Exception], None]):
+        self._queue.put_nowait((priority, next(self._order), fn, args, on_done, on_error))
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, fn, args, on_done, on_error = await self._queue.get()
+            self._busy += 1
+            try:
+                result = await loop.run_in_executor(self._pool, fn, *args)
+                self.counters["done"] += 1
+                on_done(result)
+            except Exception as e:
+                self.counters["failed"] += 1
+                logger.error(f"Post-call job {fn.__name__} failed: {e}")
+                try:
+                    on_error(e)
+                except Exception as fallback_error: # Must not end the dispatcher
+                    logger.error(f"Post-call fallback for {fn.__name__} failed: {fallback_error}")
+            finally:
+                self._busy -= 1
+                self._queue.task_done()
+
+    async def flush(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _drain(self):
+        if self._queue:
+            await self._queue.join()
+        while self._fallbacks:
+            await asyncio.gather(*self._fallbacks, return_exceptions=True)
+
+    # --- Artifact hand-off ---
+
+    def submit_recording(self, path: str, blob_name: str, call_sid: str):
+        """Processes a finished WAV (if steps are configured) and spools it for upload."""
+        self._run(self._stage("recording", blob_name, call_sid, path))
+
+    def submit_transcript(self, history: list, blob_name: str, call_sid: str):
+        """Stages the history, serializes it off the loop and spools it for upload."""
+        input_path = upload_spool.spool.staging_path(".transcript.pickle")
+        with open(input_path, "wb") as f:
+            pickle.dump(history, f, pickle.HIGHEST_PROTOCOL) # A fraction of a ms; the JSON encoding is the worker's
+        self._run(self._stage("transcript", blob_name, call_sid, input_path))
+
+    def submit_waveform(self, base: dict, blob_name: str, call_sid: str):
+        """Stages the base buckets, renders the levels off the loop and spools the JSON for upload."""
+        input_path = upload_spool.spool.staging_path(".waveform.npz")
+        with open(input_path, "wb") as f:
+            np.savez(f, **base)
+        self._run(self._stage("waveform", blob_name, call_sid, input_path))
+
+    def _stage(self, kind: str, blob_name: str, call_sid: str, input_path: str) -> dict:
+        job = {"kind": kind, "blob_name": blob_name, "call_sid": call_sid, "input": input_path}
+        job["descriptor"] = os.path.join(upload_spool.spool.staging_dir, f"{uuid.uuid4().hex}{JOB_SUFFIX}")
+        job["resumes"] = 0
+        self._save(job)
+        return job
+
+    def _save(self, job: dict):
+        # Write-then-rename so a crash never leaves a truncated descriptor
+        with open(job["descriptor"] + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(job["descriptor"] + ".tmp", job["descriptor"])
+
+    @property
+    def failed_dir(self) -> str:
+        return os.path.join(upload_spool.spool.staging_dir, "failed")
+
+    def _fail(self, job: dict, error: Exception):
+        """Sets a job that cannot be processed aside in staging/failed/ for manual recovery."""
+        logger.error(f"Post-call {job['kind']} job for {job['call_sid']} failed, moved to {self.failed_dir}: {error}")
+        os.makedirs(self.failed_dir, exist_ok=True)
+        for path in (job["input"], job["descriptor"]):
+            if os.path.exists(path):
+                shutil.move(path, os.path.join(self.failed_dir, os.path.basename(path)))
+        if job.get("output") and os.path.exists(job["output"]):
+            os.remove(job["output"])
+
+    def resume(self):
+        """Requeues the jobs a previous run staged but never handed to the spool."""
+        staging_dir = upload_spool.spool.staging_dir
+        for name in sorted(os.listdir(staging_dir)):
+            if not name.endswith(JOB_SUFFIX):
+                continue
+            try:
+                with open(os.path.join(staging_dir, name), "r", encoding="utf-8") as f:
+                    job = json.load(f)
+                if not os.path.exists(job["input"]):
+                    os.remove(job["descriptor"]) # Spooled just before the crash
+                    continue
+                job["resumes"] = job.get("resumes", 0) + 1
+                if job["resumes"] > MAX_RESUMES: # Probably what brought the process down
+                    self._fail(job, RuntimeError(f"still staged after {MAX_RESUMES} restarts"))
+                    continue
+                self._save(job)
+                logger.info(f"Resuming post-call {job['kind']} job for {job['call_sid']}")
+                self._run(job)
+            except Exception as e:
+                logger.error(f"Unreadable post-call job {name}: {e}")
+
+    def _run(self, job: dict):
+        """Processes a staged job (in the pool when possible) and hands the result to the spool."""
+        priority, step, content_type = STAGED_JOBS[job["kind"]]
+        metadata = {"call_sid": job["call_sid"]}
+        blob_name = job["blob_name"]
+
+        def done():
+            for path in (job["input"], job["descriptor"]):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        if job["kind"] == "recording":
+            base_name = os.path.splitext(blob_name)[0]
+
+            def spool(result: dict):
+                # Trimmed leading silence shifts the recording against the transcript and waveform offsets
+                extra = {"trimmed_start_ms": result["trimmed_start_ms"]} if "trimmed_start_ms" in result else {}
+                upload_spool.spool.enqueue_file(result["path"], base_name + result["extension"],
+                                                result["content_type"], metadata={**metadata, **extra})
+                done()
+
+            def spool_raw(error: Optional[Exception] = None):
+                # Never lose a recording to a processing error
+                if os.path.exists(job["input"]):
+                    upload_spool.spool.enqueue_file(job["input"], blob_name, content_type, metadata=metadata)
+                done()
+
+            if not self.started or not self.audio_steps:
+                return spool_raw()
+            return self.submit(priority, step, (job["input"], self.audio_steps), spool, spool_raw)
+
+        job["output"] = output_path = upload_spool.spool.staging_path(".json")
+        args = (job["input"], output_path)
+
+        def spool(result: dict):
+            upload_spool.spool.enqueue_file(result["path"], blob_name, result["content_type"], metadata=metadata)
+            done()
+
+        def in_thread(error: Optional[Exception] = None):
+            self._fallback(job, step, args, spool)
+
+        if not self.started:
+            return in_thread()
+        self.submit(priority, step, args, spool, in_thread)
+
+    def _fallback(self, job: dict, step: Callable, args: tuple, on_done: Callable[[dict], None]):
+        """Runs a step the pool could not on a thread, so the live-call loop is never held up by it."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError: # No event loop (scripts): nothing live to hold up
+            try:
+                result = step(*args)
+            except Exception as e:
+                return self._fail(job, e)
+            return on_done(result)
+        task = loop.create_task(self._run_in_thread(job, step, args, on_done))
+        self._fallbacks.add(task)
+        task.add_done_callback(self._fallbacks.discard)
+
+    async def _run_in_thread(self, job: dict, step: Callable, args: tuple, on_done: Callable[[dict], None]):
+        try:
+            result = await asyncio.to_thread(step, *args)
+        except Exception as e:
+            return self._fail(job, e)
+        try:
+            on_done(result)
+        except Exception as e: # Input and descriptor stay staged: resumed on the next start
+            logger.error(f"Failed to spool post-call {job['kind']} for {job['call_sid']}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "started": self.started,
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "running": self._busy,
+            "in_threads": len(self._fallbacks),
+            "failed_on_disk": sum(1 for n in os.listdir(self.failed_dir) if n.endswith(JOB_SUFFIX))
+                if os.path.isdir(self.failed_dir) else 0,
+            "reserved_cpus": sorted(self.cpus),
+            "audio_steps": self.audio_steps,
+            **self.counters,
+        }
+
+
+# Process-wide pipeline; started by the app lifespan
+pipeline = PostCallPipeline()
@@ -0,0 +1,71 @@
+import os
+import json
+import hashlib
+from typing import Optional
+from loguru import logger
+
+import gcs
+
+from google.cloud.exceptions import NotFound
+
+PREVIEWS_PREFIX = "previews/"
+MANIFEST_NAME = "manifest.json" # Written by upload_previews.py
+MAX_PREVIEW_BYTES = int(os.getenv("PREVIEW_CACHE_MAX_BYTES", str(1024 * 1024))) # Larger files are streamed from GCS
+
+
+class PreviewCache:
+    """
+    Voice previews kept in memory. There are a few dozen short clips and the
+    agent editor plays them constantly, so they are downloaded once during
+    warm-up instead of proxied from GCS on every click. Voices missing from the
+    cache still fall back to GCS.
+
+    The list of voices comes from the manifest upload_previews.py writes (no
+    bucket listing, and its md5 is the ETag); without one, from a listing.
+    With a manifest, voices it does not have are known to be missing.
+    """
+
+    def __init__(self):
+        self.previews = {} # voice_id -> {"content", "etag"}
+        self.manifest = None # voice_id -> {"name", "size", "md5"}, if there is a manifest
+        self.loaded = False
+
+    def _read_manifest(self, bucket) -> Optional[dict]:
+        try:
+            return json.loads(bucket.blob(PREVIEWS_PREFIX + MANIFEST_NAME).download_as_bytes())["voices"]
+        except NotFound:
+            return None
+
+    def load(self) -> int:
+        """Downloads every preview (blocking; run it in a thread)."""
+        bucket = gcs.get_bucket()
+        manifest = self._read_manifest(bucket)
+        if manifest is not None:
+            entries = [(entry["name"], entry["size"], entry["md5"]) for entry in manifest.values()]
+        else:
+            entries = [(name, size, None) for name, size, _ in gcs.list_blobs(PREVIEWS_PREFIX)]
+
+        previews = {}
+        for name, size, md5 in entries:
+            voice_id, extension = os.path.splitext(name[len(PREVIEWS_PREFIX):])
+            if extension != ".m4a" or not size or size > MAX_PREVIEW_BYTES:
+                continue
+            content = bucket.blob(name).download_as_bytes()
+            previews[voice_id.lower()] = {"content": content, "etag": f'"{md5 or hashlib.md5(content).hexdigest()}"'}
+        self.previews = previews
+        self.manifest = {voice_id.lower(): entry for voice_id, entry in manifest.items()} if manifest is not None else None
+        self.loaded = True
+        logger.info(f"Preview cache: {len(previews)} voices, {sum(len(p['content']) for p in previews.values())} bytes")
+        return len(previews)
+
+    def get(self, voice_id: str) -> Optional[dict]:
+        return self.previews.get(voice_id.lower())
+
+    def exists(self, voice_id: str) -> Optional[bool]:
+        """Whether the voice has a preview per the manifest; None without one (ask GCS)."""
+        if self.manifest is None:
+            return None
+        return voice_id.lower() in self.manifest
+
+
+cache = PreviewCache()
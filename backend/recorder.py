@@ -1,18 +1,19 @@
-import os
 import wave
-import audioop # Restored
 import base64 # Restored
 import tempfile
 import datetime
-import asyncio
 from typing import Optional
+import numpy as np
 from loguru import logger
-from google.cloud import storage
 
-# Constants
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-KEY_FILE = os.path.join(BASE_DIR, "mundimotos-481115-c652dd31ca7c.json")
-BUCKET_NAME = "asistente-siac-voz-logs"
+import mulaw
+import call_accounting
+import postcall
+import upload_spool
+import waveform
+
+FRAME_BYTES = 160 # 20ms of 8kHz mulaw per Twilio media message
+FLUSH_FRAMES = 50 # Decode and write ~1s of audio at a time instead of every frame
 
 class CallRecorder:
     def __init__(self, call_sid: str):
@@ -20,9 +21,14 @@ class CallRecorder:
         self.temp_file = None
         self.wav_file = None
         self.closed = False
+        self._pending = bytearray() # Raw mulaw waiting to be decoded
+        self._pending_frames = 0
+        self._pcm_buffer = np.empty(FRAME_BYTES * FLUSH_FRAMES, dtype=np.int16)
+        self.waveform = waveform.WaveformBuilder(sample_rate=8000)
         
         try:
-            self.temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
+            # Written inside the spool so handing it off on hangup is a rename
+            self.temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".wav", dir=upload_spool.spool.staging_dir)
             self.wav_file = wave.open(self.temp_file.name, 'wb')
             
             # Twilio Audio is 8000Hz, Mono, 8-bit Mulaw -> 16-bit PCM
@@ -38,29 +44,44 @@ class CallRecorder:
     def write_chunk(self, payload: str):
         """
         Processes an inbound audio chunk (Base64 Mulaw).
-        Decodes Base64 -> Decodes Mulaw to PCM -> Writes to WAV.
+        Decodes Base64 and buffers the Mulaw bytes; every FLUSH_FRAMES chunks the
+        batch is decoded to PCM in one call and written to the WAV.
         """
         if self.closed: return
 
         try:
              # Decode Base64 to Raw Mulaw Bytes
-            mulaw_data = base64.b64decode(payload)
-            
-            # Convert Mulaw to 16-bit PCM
-            # width=2 means target is 2 bytes (16-bit)
-            pcm_data = audioop.ulaw2lin(mulaw_data, 2)
-            
-            self.wav_file.writeframes(pcm_data)
+            self._pending += base64.b64decode(payload)
+            self._pending_frames += 1
+
+            if self._pending_frames >= FLUSH_FRAMES:
+                self._flush_pending()
         except Exception as e:
             logger.error(f"Error writing chunk: {e}")
 
+    def _flush_pending(self):
+        """Decodes buffered Mulaw to 16-bit PCM and writes it to the WAV."""
+        if not self._pending:
+            return
+
+        if len(self._pending) > self._pcm_buffer.size:
+            self._pcm_buffer = np.empty(len(self._pending), dtype=np.int16)
+
+        pcm = mulaw.decode(self._pending, out=self._pcm_buffer)
+        self.wav_file.writeframes(pcm)
+        self.waveform.add(pcm) # Peaks for the dashboard player, computed on the batch we already decoded
+
+        self._pending.clear()
+        self._pending_frames = 0
+
     async def stop_and_upload_async(self):
         """
-        Closes the WAV file and uploads to GCS (Non-blocking).
+        Closes the WAV file and hands it to the post-call pipeline / upload spool.
         """
         if self.closed: return
         
         try:
+            self._flush_pending()
             self.wav_file.close()
             self.temp_file.close()
             self.closed = True
@@ -68,36 +89,21 @@ class CallRecorder:
             # Construct GCS Path: grabaciones/YYYY-MM-DD/{call_sid}.wav
             date_str = datetime.date.today().isoformat()
             target_path = f"grabaciones/{date_str}/{self.call_sid}.wav"
-            local_path = self.temp_file.name
-            
-            logger.info(f"Uploading recording to gs://{BUCKET_NAME}/{target_path}...")
             
-            # Offload blocking GCS upload to thread
-            if os.path.exists(KEY_FILE):
-                await asyncio.to_thread(self._upload_file, local_path, target_path)
-                logger.info("Upload complete.")
-            else:
-                logger.error(f"GCS Key file not found: {KEY_FILE}")
+            # Post-processing (if configured) runs in the post-call process pool, then the spool uploads it
+            postcall.pipeline.submit_recording(self.temp_file.name, target_path, self.call_sid)
+            postcall.pipeline.submit_waveform(self.waveform.finish(), f"grabaciones/{date_str}/{self.call_sid}.waveform.json", self.call_sid)
             
         except Exception as e:
-            logger.error(f"Failed to upload recording: {e}")
-        finally:
-            # Cleanup temp file
-            if os.path.exists(self.temp_file.name):
-                try:
-                    os.remove(self.temp_file.name)
-                except:
-                    pass
-
-    def _upload_file(self, local_path, target_path):
-         storage_client = storage.Client.from_service_account_json(KEY_FILE)
-         bucket = storage_client.bucket(BUCKET_NAME)
-         blob = bucket.blob(target_path)
-         blob.upload_from_filename(local_path, content_type='audio/wav')
+            # The WAV stays in the spool's staging dir for manual recovery
+            logger.error(f"Failed to spool recording: {e}")
 
 from fastapi import WebSocket
 import json
 
+MEDIA_PREFIX = '{"event": "media"' # json.dumps layout of MulawTwilioFrameSerializer media messages
+PAYLOAD_MARKER = '"payload": "'
+
 class RecordingWebSocket:
     """
     Wraps a FastAPI WebSocket to intercept Twilio media messages for recording
@@ -127,6 +133,9 @@ class RecordingWebSocket:
             if event_type == "media":
                 payload = event["media"]["payload"]
                 self._recorder.write_chunk(payload)
+                usage = call_accounting.current.get()
+                if usage:
+                    usage.count_media("in", payload)
             elif event_type == "stop":
                 await self._recorder.stop_and_upload_async()
             
@@ -148,12 +157,25 @@ class RecordingWebSocket:
     async def send_text(self, data: str):
         # Intercept outgoing text (AI/Server events) to capture AI audio
         try:
-             # Fast JSON check - outgoing messages are often media
-            if 'media' in data: # Optimization to avoid parsing non-media messages fully if possible, but safer to parse
+            if data.startswith(MEDIA_PREFIX):
+                # Our serializer's layout: slice the payload out instead of parsing the JSON
+                start = data.find(PAYLOAD_MARKER)
+                if start != -1:
+                    start += len(PAYLOAD_MARKER)
+                    payload = data[start:data.index('"', start)]
+                    self._recorder.write_chunk(payload)
+                    usage = call_accounting.current.get()
+                    if usage:
+                        usage.count_media("out", payload)
+            elif data.startswith('{"event": "'):
+                pass # clear / mark / other control events
+            elif '"media"' in data: # Unknown layout, parse it
                 event = json.loads(data)
                 if event.get("event") == "media":
-                    payload = event["media"]["payload"]
-                    self._recorder.write_chunk(payload)
+                    self._recorder.write_chunk(event["media"]["payload"])
+                    usage = call_accounting.current.get()
+                    if usage:
+                        usage.count_media("out", event["media"]["payload"])
         except Exception as e:
             logger.error(f"Recording outgoing tap error: {e}")
 
@@ -0,0 +1,369 @@
+"""
+Offline call replay on a virtual clock.
+
+Feeds caller audio (a WAV at any rate, or raw 8kHz mu-law) through the same
+run_bot pipeline a live call uses (RecordingWebSocket, serializer, Silero
+VAD, TranscriptLogger, turn tracking, paced output), with a ScriptedLLMService
+in place of Gemini. Nothing goes to Twilio, Gemini or GCS: artifacts are
+captured in memory and metrics go to a throwaway database.
+
+Time is virtual. The event loop's clock (and time.time/time.monotonic, which
+Pipecat and the pacing code read) only moves forward when every task is
+waiting on a timer, and then jumps straight to the next one; work handed to
+threads (the VAD) completes in zero virtual time. A 3-minute call replays
+in seconds and the trace is the same on every run.
+
+Usage:
+    python replay.py recording.wav --transcript transcript.json --out trace.json
+    python replay.py caller.ulaw --reply "Hola, ¿hablo con Ana?" --reply "Perfecto, gracias."
+    python replay.py recording.wav --profile replay.prof   # cProfile of the pipeline
+
+A stored recording has both sides mixed in one track, so the bot's old
+audio is part of the "caller" input; clean caller audio gives cleaner turns.
+"""
+import os
+import sys
+import json
+import time
+import wave
+import base64
+import asyncio
+import argparse
+import shutil
+import selectors
+import tempfile
+from contextlib import contextmanager
+from typing import List, Optional
+
+import numpy as np
+from loguru import logger
+
+for _name in ("TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN", "TWILIO_PHONE_NUMBER", "GOOGLE_API_KEY"):
+    os.environ.setdefault(_name, "replay") # Settings requires them; a replay never uses them
+
+from fastapi import WebSocketDisconnect
+from starlette.websockets import WebSocketState
+
+import mulaw
+from resampler import StreamingResampler
+
+FRAME_BYTES = 160 # 20ms of 8kHz mu-law, as Twilio sends it
+FRAME_SECONDS = 0.02
+
+
+# --- Virtual clock ---
+
+class _IdleSkippingSelector(selectors.DefaultSelector):
+    def __init__(self):
+        super().__init__()
+        self.loop = None
+
+    def select(self, timeout=None):
+        events = super().select(0)
+        if events or timeout == 0:
+            return events
+        if self.loop.executor_jobs or timeout is None:
+            # A thread is about to post a result (or nothing is scheduled): wait for it for real
+            return super().select(timeout if timeout is None else 1.0)
+        self.loop.now += timeout # Everyone is sleeping: jump to the next timer
+        return []
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """Event loop whose clock advances only when the loop would otherwise sleep."""
+
+    def __init__(self, start: float = 0.0):
+        selector = _IdleSkippingSelector()
+        super().__init__(selector)
+        selector.loop = self
+        self.now = start
+        self.executor_jobs = 0
+
+    def time(self) -> float:
+        return self.now
+
+    def run_in_executor(self, executor, func, *args):
+        future = super().run_in_executor(executor, func, *args)
+        self.executor_jobs += 1
+        future.add_done_callback(self._executor_done)
+        return future
+
+    def _executor_done(self, _):
+        self.executor_jobs -= 1
+
+
+@contextmanager
+def virtual_time(loop: VirtualClockLoop, epoch: float):
+    """Points time.time/time.monotonic at the loop's clock."""
+    real_time, real_monotonic = time.time, time.monotonic
+    time.time = lambda: epoch + loop.now
+    time.monotonic = lambda: loop.now
+    try:
+        yield
+    finally:
+        time.time, time.monotonic = real_time, real_monotonic
+
+
+# --- Inputs ---
+
+def load_caller_audio(path: str) -> bytes:
+    """8kHz mu-law bytes from a WAV (16-bit, any rate, mixed to mono) or a raw mu-law file."""
+    if not path.lower().endswith(".wav"):
+        with open(path, "rb") as f:
+            return f.read()
+
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit WAV is supported")
+        channels, rate = wav.getnchannels(), wav.getframerate()
+        pcm = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    if channels > 1:
+        pcm = pcm.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    if rate != 8000:
+        pcm = StreamingResampler(rate, 8000, "high").process(pcm)
+    return mulaw.encode(pcm).tobytes()
+
+
+def load_script(path: str) -> dict:
+    """Bot replies (and caller transcriptions) from a stored transcript JSON."""
+    with open(path, "r", encoding="utf-8") as f:
+        history = json.load(f)
+
+    greeting, replies, user_texts = None, [], []
+    pending_user = None
+    for entry in history:
+        if entry.get("type") == "thought":
+            continue
+        if entry.get("role") == "assistant":
+            if not replies and greeting is None and pending_user is None:
+                greeting = entry["content"] # The bot spoke first
+            else:
+                replies.append(entry["content"])
+                user_texts.append(pending_user)
+            pending_user = None
+        else:
+            pending_user = entry["content"] if pending_user is None else f"{pending_user} {entry['content']}"
+    return {"greeting": greeting, "replies": replies, "user_texts": user_texts}
+
+
+# --- Fakes ---
+
+class Trace:
+    def __init__(self, loop: VirtualClockLoop):
+        self.loop = loop
+        self.start = loop.now
+        self.events = []
+
+    def elapsed_ms(self) -> float:
+        return round((self.loop.now - self.start) * 1000, 1)
+
+    def __call__(self, event: str, **fields):
+        self.events.append({"t_ms": self.elapsed_ms(), "event": event, **fields})
+
+
+class FakeTwilioWebSocket:
+    """
+    Plays the Twilio side of a media stream: caller audio as `media` messages
+    every 20ms of virtual time, some trailing silence, then `stop` and a
+    disconnect. Records what the bot sends back.
+    """
+
+    def __init__(self, caller_audio: bytes, trace: Trace, stream_sid: str = "MZreplay", tail_seconds: float = 3.0):
+        silence = b"\xff" * int(tail_seconds / FRAME_SECONDS) * FRAME_BYTES # mu-law zero
+        audio = caller_audio + silence
+        self.frames = [audio[i:i + FRAME_BYTES] for i in range(0, len(audio), FRAME_BYTES)]
+        self.trace = trace
+        self.stream_sid = stream_sid
+        self.client_state = WebSocketState.CONNECTED
+        self.application_state = WebSocketState.CONNECTED
+        self.outbound_frames = [] # (t_ms, mu-law bytes)
+        self._next = 0
+        self._stopped = False
+
+    async def receive_text(self) -> str:
+        if self._next < len(self.frames):
+            due = self.trace.start + self._next * FRAME_SECONDS
+            await asyncio.sleep(max(0.0, due - self.trace.loop.now))
+            payload = base64.b64encode(self.frames[self._next]).decode("ascii")
+            self._next += 1
+            return json.dumps({"event": "media", "streamSid": self.stream_sid, "media": {"payload": payload}})
+        if not self._stopped:
+            self._stopped = True
+            self.trace("caller_hung_up")
+            return json.dumps({"event": "stop", "streamSid": self.stream_sid})
+        raise WebSocketDisconnect(1000)
+
+    async def iter_text(self):
+        while True:
+            yield await self.receive_text()
+
+    async def send_text(self, data: str):
+        message = json.loads(data)
+        if message.get("event") == "media":
+            self.outbound_frames.append((self.trace.elapsed_ms(), base64.b64decode(message["media"]["payload"])))
+        else:
+            self.trace(f"sent_{message.get('event')}")
+
+    async def send_bytes(self, data: bytes):
+        pass
+
+    async def accept(self, *args, **kwargs):
+        pass
+
+    async def close(self, *args, **kwargs):
+        self.client_state = WebSocketState.DISCONNECTED
+        self.application_state = WebSocketState.DISCONNECTED
+
+    def bot_audio_segments(self, gap_ms: float = 100) -> List[dict]:
+        """Outbound audio grouped into utterances (a gap longer than `gap_ms` starts a new one)."""
+        segments = []
+        for t_ms, frame in self.outbound_frames:
+            if segments and t_ms - segments[-1]["end_ms"] <= gap_ms:
+                segments[-1]["end_ms"] = t_ms
+                segments[-1]["bytes"] += len(frame)
+            else:
+                segments.append({"start_ms": t_ms, "end_ms": t_ms, "bytes": len(frame)})
+        for segment in segments:
+            segment["audio_seconds"] = round(segment.pop("bytes") / 8000, 3)
+        return segments
+
+
+class CapturedArtifacts:
+    """Takes postcall.pipeline's place: keeps what a call would upload."""
+
+    def __init__(self):
+        self.recording = None
+        self.transcript = None
+        self.waveform = None
+
+    def submit_recording(self, path: str, blob_name: str, call_sid: str):
+        self.recording = path
+
+    def submit_transcript(self, history: list, blob_name: str, call_sid: str):
+        self.transcript = list(history)
+
+    def submit_waveform(self, base: dict, blob_name: str, call_sid: str):
+        self.waveform = base
+
+
+# --- Replay ---
+
+def replay(caller_audio: bytes, script: dict, agent_id: str = "default", call_sid: str = "CAreplay",
+           response_delay: float = 0.6, tail_seconds: float = 3.0, workdir: Optional[str] = None) -> dict:
+    """Runs one call through run_bot on a virtual clock and returns its trace."""
+    own_workdir = workdir is None # Removed afterwards; a caller's workdir is theirs to inspect
+    workdir = workdir or tempfile.mkdtemp(prefix="replay-")
+    try:
+        return _replay(caller_audio, script, agent_id, call_sid, response_delay, tail_seconds, workdir, own_workdir)
+    finally:
+        if own_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _replay(caller_audio: bytes, script: dict, agent_id: str, call_sid: str, response_delay: float,
+            tail_seconds: float, workdir: str, own_workdir: bool) -> dict:
+    import bot
+    import postcall
+    import upload_spool
+    import call_metrics
+    from fake_llm import ScriptedLLMService
+    from recorder import CallRecorder, RecordingWebSocket
+
+    saved = postcall.pipeline, upload_spool.spool, call_metrics.store
+    artifacts = CapturedArtifacts()
+    postcall.pipeline = artifacts
+    upload_spool.spool = upload_spool.UploadSpool(os.path.join(workdir, "spool")) # Never started: staging only
+    call_metrics.store = call_metrics.CallMetricsStore(os.path.join(workdir, "call_metrics.db"))
+
+    loop = VirtualClockLoop()
+    trace = Trace(loop)
+    websocket = FakeTwilioWebSocket(caller_audio, trace, tail_seconds=tail_seconds)
+    llm = ScriptedLLMService(script.get("replies", []), script.get("user_texts"), script.get("greeting"),
+                             response_delay=response_delay, trace=trace)
+
+    async def run():
+        recorder = CallRecorder(call_sid)
+        try:
+            await bot.run_bot(RecordingWebSocket(websocket, recorder), websocket.stream_sid, call_sid, agent_id=agent_id,
+                              answered_at=time.time(), llm_factory=lambda **_: llm, hang_up=False)
+        finally:
+            await recorder.stop_and_upload_async()
+
+    wall_started, cpu_started = time.perf_counter(), time.process_time()
+    try:
+        with virtual_time(loop, epoch=time.time()):
+            loop.run_until_complete(run())
+    finally:
+        loop.close()
+        postcall.pipeline, upload_spool.spool, call_metrics.store = saved
+    wall, cpu = time.perf_counter() - wall_started, time.process_time() - cpu_started
+
+    input_seconds = len(caller_audio) / 8000
+    virtual_seconds = trace.elapsed_ms() / 1000
+    return {
+        "call_sid": call_sid,
+        "agent_id": agent_id,
+        "input_seconds": round(input_seconds, 3),
+        "virtual_seconds": virtual_seconds,
+        "events": trace.events,
+        "turns": call_metrics.CallMetricsStore(os.path.join(workdir, "call_metrics.db")).turns(call_sid),
+        "bot_audio": websocket.bot_audio_segments(),
+        "transcript": [{k: e.get(k) for k in ("role", "type", "content", "start", "end")} for e in artifacts.transcript or []],
+        "recording_seconds": recording_seconds(artifacts.recording),
+        # Not deterministic: everything above is
+        "run": {"wall_seconds": round(wall, 3), "cpu_seconds": round(cpu, 3),
+                "speedup": round(virtual_seconds / wall, 1) if wall else None,
+                **({} if own_workdir else {"recording": artifacts.recording})},
+    }
+
+
+def recording_seconds(path: Optional[str]) -> Optional[float]:
+    if not path or not os.path.exists(path):
+        return None
+    with wave.open(path, "rb") as wav:
+        return round(wav.getnframes() / wav.getframerate(), 3)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("audio", help="Caller audio: .wav (16-bit) or raw 8kHz mu-law")
+    parser.add_argument("--transcript", help="Stored transcript JSON: its bot lines become the script")
+    parser.add_argument("--reply", action="append", default=[], help="Bot reply, in order (instead of --transcript)")
+    parser.add_argument("--greeting", help="Bot line said before the caller speaks")
+    parser.add_argument("--agent", default="default", help="Agent whose VAD/turn settings apply")
+    parser.add_argument("--response-delay", type=float, default=0.6, help="Simulated model time to first audio (s)")
+    parser.add_argument("--tail", type=float, default=3.0, help="Silence after the audio before hanging up (s)")
+    parser.add_argument("--out", help="Write the trace JSON here (default: stdout)")
+    parser.add_argument("--profile", help="Write a cProfile of the replay here")
+    args = parser.parse_args(argv)
+
+    script = load_script(args.transcript) if args.transcript else {"replies": args.reply, "greeting": args.greeting}
+    caller_audio = load_caller_audio(args.audio)
+    import bot # Loaded before reconfiguring logging, which importing it resets
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING") # Per-frame INFO logs would dominate a profile
+
+    kwargs = dict(agent_id=args.agent, response_delay=args.response_delay, tail_seconds=args.tail)
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        result = profiler.runcall(replay, caller_audio, script, **kwargs)
+        profiler.dump_stats(args.profile)
+    else:
+        result = replay(caller_audio, script, **kwargs)
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    run = result["run"]
+    print(f"Replayed {result['input_seconds']}s of audio ({result['virtual_seconds']}s virtual) in "
+          f"{run['wall_seconds']}s wall, {run['cpu_seconds']}s CPU: {run['speedup']}x real time, "
+          f"{len(result['turns'])} turns", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
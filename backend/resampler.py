@@ -0,0 +1,88 @@
+"""
+Streaming polyphase resampler for 16-bit mono PCM.
+
+Converts between rates with a rational factor L/M (24kHz -> 8kHz is 1/3,
+8kHz -> 16kHz is 2/1) using a Kaiser-windowed sinc low-pass split into L
+phases. The filter history and output position carry over from one chunk to
+the next, so a stream resampled in 20ms pieces matches resampling
+it in one go (to within float rounding): no clicks at chunk boundaries.
+"""
+from math import gcd
+
+import numpy as np
+
+# Zero crossings on each side of the sinc, Kaiser beta, passband edge (fraction of the output Nyquist)
+QUALITY_PRESETS = {
+    "fast": {"zero_crossings": 4, "beta": 5.0, "rolloff": 0.85},
+    "medium": {"zero_crossings": 8, "beta": 7.0, "rolloff": 0.90},
+    "high": {"zero_crossings": 16, "beta": 9.0, "rolloff": 0.94},
+}
+
+
+def design_filter(up: int, down: int, quality: str = "medium") -> np.ndarray:
+    """Low-pass prototype at the upsampled rate, with gain `up` to make up for the inserted zeros."""
+    preset = QUALITY_PRESETS[quality]
+    factor = max(up, down)
+    length = 2 * preset["zero_crossings"] * factor + 1
+    cutoff = preset["rolloff"] / factor # Fraction of the upsampled Nyquist
+    n = np.arange(length) - (length - 1) / 2
+    taps = cutoff * np.sinc(cutoff * n) * np.kaiser(length, preset["beta"])
+    return taps * (up / taps.sum())
+
+
+class StreamingResampler:
+    def __init__(self, in_rate: int, out_rate: int, quality: str = "medium"):
+        if quality not in QUALITY_PRESETS:
+            raise ValueError(f"Unknown resampler quality: {quality}")
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.quality = quality
+        g = gcd(in_rate, out_rate)
+        self.up, self.down = out_rate // g, in_rate // g
+
+        taps = design_filter(self.up, self.down, quality)
+        self.taps_per_phase = -(-taps.size // self.up)
+        taps = np.concatenate((taps, np.zeros(self.taps_per_phase * self.up - taps.size)))
+        # Phase p weights input samples x[k], x[k-1], ...: stored reversed to dot with a window of x
+        self._phases = np.ascontiguousarray(taps.reshape(self.taps_per_phase, self.up).T[:, ::-1], dtype=np.float32)
+        self.delay_seconds = (taps.size - 1) / 2 / (in_rate * self.up)
+        self.reset()
+
+    def reset(self):
+        """Forgets the stream (e.g. after a barge-in discards queued audio)."""
+        self._history = np.zeros(self.taps_per_phase - 1, dtype=np.float32)
+        self._history_start = -(self.taps_per_phase - 1) # Input index of _history[0]
+        self._next_output = 0
+
+    def process(self, pcm: np.ndarray) -> np.ndarray:
+        """Resamples the next chunk of int16 samples; returns int16 samples."""
+        if self.up == self.down or pcm.size == 0:
+            return pcm
+        buffer = np.concatenate((self._history, pcm.astype(np.float32)))
+        last_input = self._history_start + buffer.size - 1
+
+        # Output n needs input up to index (n * down) // up
+        last_output = (last_input * self.up + self.up - 1) // self.down
+        count = last_output - self._next_output + 1
+        out = np.empty(max(count, 0), dtype=np.float32)
+        step = buffer.strides[0]
+        for r in range(min(self.up, count)):
+            # Outputs r, r + up, r + 2*up, ... share a phase and advance `down` inputs each:
+            # their input windows are a strided view of the buffer, no gather needed
+            position = (self._next_output + r) * self.down
+            start = position // self.up - self._history_start - (self.taps_per_phase - 1)
+            rows = len(range(r, count, self.up))
+            windows = np.ndarray((rows, self.taps_per_phase), np.float32, buffer, start * step, (self.down * step, step))
+            out[r::self.up] = windows @ self._phases[position % self.up]
+
+        keep = self.taps_per_phase - 1
+        self._history = buffer[buffer.size - keep:].copy()
+        self._history_start = last_input - keep + 1
+        self._next_output = last_output + 1
+        np.rint(out, out=out)
+        np.minimum(out, 32767, out=out)
+        np.maximum(out, -32768, out=out)
+        return out.astype(np.int16)
+
+    def process_bytes(self, audio: bytes) -> bytes:
+        return self.process(np.frombuffer(audio, dtype=np.int16)).tobytes()
@@ -1,8 +1,11 @@
 import json
 import os
-from typing import Dict, Any
+import hashlib
+from typing import Dict, Any, Optional
 
-SETTINGS_FILE = "agent_settings.json"
+from agent_store import AgentStore, DB_FILE
+
+SETTINGS_FILE = "agent_settings.json" # Legacy storage, imported into DB_FILE on first start
 
 DEFAULT_SETTINGS = {
     "voice_id": "Charon",
@@ -29,96 +32,157 @@ DEFAULT_SETTINGS = {
     "variables": [] # List of {key: str, description: str, example: str}
 }
 
+# Silero VAD parameters (Pipecat's defaults) and barge-in policy, overridable per agent
+DEFAULT_VAD = {"confidence": 0.7, "start_secs": 0.2, "stop_secs": 0.8, "min_volume": 0.6}
+DEFAULT_ALLOW_INTERRUPTIONS = True
+
+# Live LLM session: resume after upstream drops, and cap the context with a sliding window so
+# latency stays flat on long calls (trigger/target in tokens; None leaves the server default)
+DEFAULT_LLM_SESSION = {
+    "session_resumption": True,
+    "max_reconnects": 3,
+    "context_compression": True,
+    "compression_trigger_tokens": 16000,
+    "compression_target_tokens": 8000,
+}
+
+# Backend/model per agent (see llm_backends), with an optional fallback that takes new calls
+# while the primary's recent setup/response latency is over the thresholds (ms; None = no limit)
+DEFAULT_LLM = {
+    "backend": "gemini_live",
+    "model": "models/gemini-2.0-flash-live-001",
+    "fallback": None, # {backend, model}
+    "max_setup_ms": None,
+    "max_response_ms": None,
+}
+
+def _default_agents() -> Dict[str, Any]:
+    default = DEFAULT_SETTINGS.copy()
+    default["name"] = "Agente Principal"
+    default["id"] = "default"
+    return {"default": default}
+
+
+def _legacy_agents() -> Optional[Dict[str, Any]]:
+    """Agents from the old JSON file, if there is one. Handles the single-agent format too."""
+    if not os.path.exists(SETTINGS_FILE):
+        return None
+    try:
+        with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"Error loading {SETTINGS_FILE}: {e}, using defaults.")
+        return None
+
+    if "system_prompt" in data: # Old format: one agent at the root
+        agent = data.copy()
+        agent["name"] = "Agente Principal"
+        agent["id"] = "default"
+        return {"default": agent}
+    return data.get("agents") or None
+
+
+store: Optional[AgentStore] = None
+
+
+def get_store() -> AgentStore:
+    """Opens the agent database on first use, migrating agent_settings.json into it."""
+    global store
+    if store is None:
+        store = AgentStore(DB_FILE)
+        if store.count() == 0:
+            legacy = _legacy_agents()
+            if legacy:
+                print(f"Migrating {len(legacy)} agents from {SETTINGS_FILE} to {DB_FILE}...")
+            store.import_agents(legacy or _default_agents())
+    return store
+
+
 class SettingsManager:
     @staticmethod
     def load_settings() -> Dict[str, Any]:
-        """Load settings from JSON file. Migrates old format to multi-agent format if needed."""
-        if not os.path.exists(SETTINGS_FILE):
-             # Initialize with default agent
-            initial_data = {"agents": {"default": DEFAULT_SETTINGS.copy()}}
-            # Add basic metadata to default agent
-            initial_data["agents"]["default"]["name"] = "Agente Principal"
-            initial_data["agents"]["default"]["id"] = "default"
-            SettingsManager.save_settings(initial_data)
-            return initial_data
-        
-        try:
-            with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                
-            # Migration Logic: Check if it's the old format (has 'system_prompt' at root)
-            if "system_prompt" in data:
-                print("Migrating single-agent settings to multi-agent format...")
-                migrated_data = {
-                    "agents": {
-                        "default": data.copy()
-                    }
-                }
-                migrated_data["agents"]["default"]["name"] = "Agente Principal" 
-                migrated_data["agents"]["default"]["id"] = "default"
-                
-                SettingsManager.save_settings(migrated_data)
-                return migrated_data
-                
-            return data
-        except Exception as e:
-            print(f"Error loading settings: {e}, using defaults.")
-            initial_data = {"agents": {"default": DEFAULT_SETTINGS.copy()}}
-            initial_data["agents"]["default"]["name"] = "Agente Principal"
-            initial_data["agents"]["default"]["id"] = "default"
-            return initial_data
+        """All agents, in the same shape the JSON file had."""
+        return {"agents": get_store().list()}
 
     @staticmethod
-    def save_settings(settings: Dict[str, Any]) -> None:
-        """Save settings to JSON file."""
-        try:
-            with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-                json.dump(settings, f, indent=4, ensure_ascii=False)
-        except Exception as e:
-            print(f"Error saving settings: {e}")
+    def get_agent(agent_id: str) -> Dict[str, Any]:
+        """Current version of the agent (its `version` field included)."""
+        return get_store().get(agent_id)
 
     @staticmethod
-    def get_agent(agent_id: str) -> Dict[str, Any]:
-        data = SettingsManager.load_settings()
-        agents = data.get("agents", {})
-        return agents.get(agent_id, None)
+    def get_agent_version(agent_id: str, version: int) -> Dict[str, Any]:
+        """A specific version, still available after later edits or deletion."""
+        return get_store().get_version(agent_id, version)
 
     @staticmethod
     def create_agent(agent_id: str, agent_data: Dict[str, Any]) -> Dict[str, Any]:
-        data = SettingsManager.load_settings()
-        if "agents" not in data:
-            data["agents"] = {}
-        
         # Ensure ID and Name exist
         agent_data["id"] = agent_id
         if "name" not in agent_data:
-            agent_data["name"] = f"Agente {len(data['agents']) + 1}"
-            
-        data["agents"][agent_id] = agent_data
-        SettingsManager.save_settings(data)
-        return agent_data
+            agent_data["name"] = f"Agente {get_store().count() + 1}"
+        return get_store().put(agent_id, agent_data)
 
     @staticmethod
-    def update_agent(agent_id: str, agent_data: Dict[str, Any]) -> Dict[str, Any]:
-        data = SettingsManager.load_settings()
-        if "agents" not in data:
-            data["agents"] = {}
-            
-        if agent_id in data["agents"]:
-            # Merge updates
-            data["agents"][agent_id].update(agent_data)
-            SettingsManager.save_settings(data)
-            return data["agents"][agent_id]
-        return None
+    def update_agent(agent_id: str, agent_data: Dict[str, Any], expected_version: Optional[int] = None) -> Dict[str, Any]:
+        """Merges updates into one agent. Raises VersionConflict if `expected_version` is stale."""
+        return get_store().update(agent_id, agent_data, expected_version)
 
     @staticmethod
     def delete_agent(agent_id: str) -> bool:
-        data = SettingsManager.load_settings()
-        if "agents" in data and agent_id in data["agents"]:
-            del data["agents"][agent_id]
-            SettingsManager.save_settings(data)
-            return True
-        return False
+        return get_store().delete(agent_id)
+
+    @staticmethod
+    def turn_taking(agent: Dict[str, Any], call_sid: str) -> Dict[str, Any]:
+        """
+        VAD parameters and interruption policy for one call. With
+        `turn_taking_variants`, the call is assigned a variant by weight,
+        deterministically from its call_sid (a reconnect gets the same one);
+        a variant's settings override the agent's.
+        """
+        def apply(vad, overrides):
+            vad.update({k: v for k, v in (overrides or {}).items() if k in DEFAULT_VAD and v is not None})
+
+        vad = dict(DEFAULT_VAD)
+        apply(vad, agent.get("vad"))
+        allow_interruptions = agent.get("allow_interruptions", DEFAULT_ALLOW_INTERRUPTIONS)
+        variant = None
+
+        variants = [v for v in agent.get("turn_taking_variants") or [] if v.get("weight", 1) > 0]
+        if variants:
+            digest = hashlib.sha1(f"{agent.get('id')}:{call_sid}".encode()).digest()
+            point = int.from_bytes(digest[:8], "big") / 2**64 * sum(v.get("weight", 1) for v in variants)
+            for candidate in variants:
+                point -= candidate.get("weight", 1)
+                if point < 0:
+                    break
+            variant = candidate.get("name")
+            apply(vad, candidate.get("vad"))
+            if candidate.get("allow_interruptions") is not None:
+                allow_interruptions = candidate["allow_interruptions"]
+
+        return {"variant": variant, "vad": vad, "allow_interruptions": allow_interruptions}
+
+    @staticmethod
+    def llm_session(agent: Dict[str, Any]) -> Dict[str, Any]:
+        """Live session settings for the agent's calls (its `llm_session` over the defaults)."""
+        session = dict(DEFAULT_LLM_SESSION)
+        session.update({k: v for k, v in (agent.get("llm_session") or {}).items() if k in DEFAULT_LLM_SESSION})
+        return session
+
+    @staticmethod
+    def llm_route(agent: Dict[str, Any]) -> Dict[str, Any]:
+        """Backend, model and fallback for the agent's calls (its `llm` over the defaults)."""
+        llm = dict(DEFAULT_LLM)
+        llm.update({k: v for k, v in (agent.get("llm") or {}).items() if k in DEFAULT_LLM and v is not None})
+        return llm
+
+    @staticmethod
+    def render_prompt(system_prompt: str, variables: Dict[str, Any]) -> str:
+        """Replace {{key}} placeholders in the agent prompt with call variables."""
+        for key, value in variables.items():
+            placeholder = "{{" + key + "}}"
+            system_prompt = system_prompt.replace(placeholder, str(value))
+        return system_prompt
 
     @staticmethod
     def get_available_voices():
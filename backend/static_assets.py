@@ -0,0 +1,185 @@
+"""
+Frontend (Vite build) serving.
+
+Vite fingerprints everything under assets/ (index-DEtFKXSG.js), so those
+files never change under the same URL: they are sent `immutable` with a one
+year max-age. index.html is what points at the current bundle, so it is
+always revalidated, cheaply, through its ETag. Compressible files are served
+as brotli or gzip, from `.br`/`.gz` files written at build time
+(`python static_assets.py frontend/dist`) or, failing that, compressed once
+at load. Files up to STATIC_MEMORY_MAX_BYTES are held in memory.
+
+    python static_assets.py <dist dir>
+"""
+import os
+import re
+import sys
+import gzip
+import asyncio
+import hashlib
+import mimetypes
+import threading
+from typing import Optional
+from loguru import logger
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+try:
+    import brotli # Optional: without it only gzip is offered
+except ImportError:
+    brotli = None
+
+FRONTEND_DIRS = ("frontend/dist", "static") # Local checkout / docker
+MEMORY_MAX_BYTES = int(os.getenv("STATIC_MEMORY_MAX_BYTES", str(2 * 1024 * 1024)))
+COMPRESS_MIN_BYTES = 1024
+COMPRESSIBLE = (".html", ".js", ".mjs", ".css", ".svg", ".json", ".txt", ".map", ".xml", ".wasm")
+ENCODINGS = (("br", ".br"), ("gzip", ".gz")) # In order of preference
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache" # May be stored, but checked (ETag) before every use
+DEFAULT_CACHE = "public, max-age=3600"
+HASHED_NAME = re.compile(r"[-.][A-Za-z0-9_-]{8,}\.[a-z0-9]+$")
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def accepted_encodings(header: Optional[str]) -> set:
+    """Encodings from Accept-Encoding, without the ones refused with q=0."""
+    accepted = set()
+    for part in (header or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip())
+    return accepted
+
+
+def find_frontend_dir() -> Optional[str]:
+    return next((path for path in FRONTEND_DIRS if os.path.isdir(path)), None)
+
+
+def precompress(directory: str) -> int:
+    """Writes .br/.gz next to every compressible file (build step)."""
+    written = 0
+    for root, _, files in os.walk(directory):
+        for filename in files:
+            path = os.path.join(root, filename)
+            if not filename.endswith(COMPRESSIBLE) or os.path.getsize(path) < COMPRESS_MIN_BYTES:
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            for encoding, suffix in ENCODINGS:
+                if encoding == "br" and brotli is None:
+                    continue
+                with open(path + suffix, "wb") as f:
+                    f.write(compress(data, encoding))
+                written += 1
+    return written
+
+
+class StaticAssets:
+    """The files of one build directory, indexed by URL path."""
+
+    def __init__(self, directory: Optional[str]):
+        self.directory = directory
+        self.files = {} # url path -> {"path", "size", "etag", "media_type", "cache_control", "content"?, "variants"}
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Reads (and if needed compresses) the build; blocking, run it in a thread."""
+        with self._lock:
+            if self.loaded or not self.directory:
+                return
+            files = {}
+            memory = 0
+            for root, _, filenames in os.walk(self.directory):
+                for filename in filenames:
+                    if filename.endswith((".br", ".gz")):
+                        continue
+                    path = os.path.join(root, filename)
+                    url_path = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                    files[url_path] = entry = self._load_file(path, url_path)
+                    memory += len(entry.get("content", b"")) + sum(len(v.get("content", b"")) for v in entry["variants"].values())
+            self.files = files
+            self.loaded = True
+            logger.info(f"Frontend: {len(files)} files from {self.directory}, {memory} bytes in memory")
+
+    def _load_file(self, path: str, url_path: str) -> dict:
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.md5(data).hexdigest()[:16]
+        if url_path == "index.html":
+            cache_control = REVALIDATE
+        elif url_path.startswith("assets/") and HASHED_NAME.search(url_path):
+            cache_control = IMMUTABLE
+        else:
+            cache_control = DEFAULT_CACHE
+        entry = {
+            "path": path,
+            "size": len(data),
+            "etag": f'"{digest}"',
+            "media_type": mimetypes.guess_type(path)[0] or "application/octet-stream",
+            "cache_control": cache_control,
+            "variants": {},
+        }
+        in_memory = len(data) <= MEMORY_MAX_BYTES
+        if in_memory:
+            entry["content"] = data
+
+        if not path.endswith(COMPRESSIBLE) or len(data) < COMPRESS_MIN_BYTES:
+            return entry
+        for encoding, suffix in ENCODINGS:
+            variant = {"path": path + suffix, "etag": f'"{digest}-{encoding}"'}
+            if os.path.exists(path + suffix): # Built with the app
+                if in_memory:
+                    with open(path + suffix, "rb") as f:
+                        variant["content"] = f.read()
+            elif in_memory and (encoding != "br" or brotli is not None):
+                variant["content"] = compress(data, encoding)
+            else:
+                continue
+            entry["variants"][encoding] = variant
+        return entry
+
+    async def serve(self, path: str, request: Request) -> Response:
+        if not self.directory:
+            return Response('{"error":"Frontend not found"}', status_code=404, media_type="application/json")
+        if not self.loaded:
+            await asyncio.to_thread(self.load)
+
+        path = path.strip("/") or "index.html"
+        entry = self.files.get(path) or self.files.get(f"{path}/index.html")
+        if entry is None:
+            return Response("Not Found", status_code=404, media_type="text/plain")
+
+        body = entry
+        headers = {"Cache-Control": entry["cache_control"]}
+        if entry["variants"]:
+            headers["Vary"] = "Accept-Encoding"
+            accepted = accepted_encodings(request.headers.get("accept-encoding"))
+            for encoding, _ in ENCODINGS:
+                if encoding in accepted and encoding in entry["variants"]:
+                    body = entry["variants"][encoding]
+                    headers["Content-Encoding"] = encoding
+                    break
+        headers["ETag"] = body["etag"]
+
+        if body["etag"] in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        if "content" in body:
+            return Response(body["content"], media_type=entry["media_type"], headers=headers)
+        return FileResponse(body["path"], media_type=entry["media_type"], headers=headers)
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else find_frontend_dir()
+    if not directory or not os.path.isdir(directory):
+        sys.exit(f"Frontend directory not found: {directory}")
+    if brotli is None:
+        logger.warning("brotli is not installed, writing only .gz files")
+    print(f"Wrote {precompress(directory)} compressed files in {directory}")
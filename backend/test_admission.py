@@ -0,0 +1,60 @@
+import time
+import asyncio
+
+import admission
+from admission import AdmissionController
+from loop_monitor import LoopLagMonitor
+
+
+def controller(max_calls: int = 2, max_loop_lag_ms: float = 200) -> AdmissionController:
+    return AdmissionController(max_calls, max_loop_lag_ms, LoopLagMonitor(stall_threshold_ms=0))
+
+
+def test_reserved_and_live_calls_count_against_the_limits():
+    gate = controller(max_calls=3)
+    assert gate.check("ventas").admitted
+    gate.reserve("CA1", "ventas") # Admitted and ringing
+    assert gate.check("ventas", agent_limit=1) == (False, "agent_capacity", 30)
+    assert gate.check("cobros", agent_limit=1).admitted
+
+    async def live():
+        with gate.track("CA1", "ventas"): # The stream connected: no longer pending
+            gate.reserve("CA2", "cobros")
+            gate.reserve("CA3", "cobros")
+            assert (gate.load(), gate.load("ventas"), len(gate.pending)) == (3, 1, 2)
+            assert gate.check("soporte").reason == "capacity"
+
+    asyncio.run(live())
+    assert gate.load() == 2 and gate.check("soporte").admitted
+    assert gate.rejected["capacity"] == 1 and gate.rejected["agent_capacity"] == 1
+
+
+def test_reservations_expire(monkeypatch):
+    gate = controller(max_calls=1)
+    gate.reserve("CA1", "ventas")
+    assert gate.is_reserved("CA1") and not gate.check("ventas").admitted
+    monkeypatch.setattr(time, "time", lambda now=time.time(): now + admission.PENDING_TTL_SECONDS + 1)
+    assert not gate.is_reserved("CA1") and gate.check("ventas").admitted
+
+
+def test_loop_lag_and_draining_refuse_calls():
+    gate = controller(max_calls=0, max_loop_lag_ms=200)
+    gate.lag_monitor.record(350)
+    assert gate.check("ventas").reason == "loop_lag"
+    gate.lag_monitor.samples.clear()
+    assert gate.check("ventas").admitted
+    gate.start_draining(30)
+    assert gate.check("ventas").reason == "draining"
+
+
+def test_waiting_caller_gets_the_freed_slot():
+    async def run():
+        gate = controller(max_calls=1)
+        gate.reserve("CA1", "ventas")
+        waiting = asyncio.ensure_future(gate.wait_for_capacity("ventas", None, timeout=5))
+        await asyncio.sleep(0.1)
+        assert not waiting.done()
+        gate.pending.pop("CA1") # The ringing call was never answered
+        return await waiting
+
+    assert asyncio.run(run()).admitted
@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+from agent_store import AgentStore, VersionConflict
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = AgentStore(str(tmp_path / "agents.db"))
+    store.put("ventas", {"name": "Ventas", "voice": "Aoede", "prompt": "Hola"})
+    return store
+
+
+def test_every_write_bumps_the_version(store):
+    assert store.get("ventas")["version"] == 1
+    assert store.update("ventas", {"voice": "Puck"})["version"] == 2
+    assert store.put("ventas", {"name": "Ventas", "voice": "Kore"})["version"] == 3
+    store.delete("ventas")
+    assert store.put("ventas", {"name": "Ventas 2"})["version"] == 4 # Never reuses a pinned version
+    assert store.update("nadie", {"voice": "Puck"}) is None
+
+
+def test_concurrent_updates_from_the_same_version_conflict(store):
+    read = store.get("ventas")["version"]
+    barrier = threading.Barrier(2)
+    results = []
+
+    def save(voice):
+        barrier.wait()
+        try:
+            results.append(store.update("ventas", {"voice": voice}, expected_version=read)["version"])
+        except VersionConflict as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=save, args=(voice,)) for voice in ("Puck", "Kore")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    saved = [r for r in results if not isinstance(r, Exception)]
+    conflicts = [r for r in results if isinstance(r, VersionConflict)]
+    assert saved == [2] and len(conflicts) == 1
+    assert (conflicts[0].expected, conflicts[0].current) == (1, 2)
+    assert store.get("ventas")["version"] == 2
+
+
+def test_concurrent_merges_lose_nothing(store):
+    def save(i):
+        store.update("ventas", {f"field_{i}": i})
+
+    threads = [threading.Thread(target=save, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    agent = store.get("ventas")
+    assert agent["version"] == 9
+    assert all(agent[f"field_{i}"] == i for i in range(8))
+
+
+def test_pinned_version_is_stable_after_updates_and_delete(store):
+    pinned = store.get("ventas")["version"] # A call starts on it
+    store.update("ventas", {"prompt": "Buenas tardes"})
+    assert store.get("ventas")["prompt"] == "Buenas tardes"
+    assert store.get_version("ventas", pinned) == {"name": "Ventas", "voice": "Aoede", "prompt": "Hola", "version": 1}
+    store.delete("ventas")
+    assert store.get("ventas") is None
+    assert store.get_version("ventas", pinned)["prompt"] == "Hola"
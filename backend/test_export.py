@@ -0,0 +1,75 @@
+import os
+import asyncio
+
+import pytest
+
+for name, value in (("TWILIO_ACCOUNT_SID", "ACtest"), ("TWILIO_AUTH_TOKEN", "test"),
+                    ("TWILIO_PHONE_NUMBER", "+10000000000"), ("GOOGLE_API_KEY", "test")):
+    os.environ.setdefault(name, value) # config.Settings requires them; Twilio is never called here
+
+import export
+import call_metrics
+
+DAY = 86400
+SINCE = 1_790_000_000.0 # Window-aligned start of the exported range
+
+
+def twilio_call(sid: str, started_at: float, status: str = "completed") -> dict:
+    return {"call_sid": sid, "status": status, "direction": "outbound-api", "from": "+1", "to": "+2",
+            "started_at": started_at, "ended_at": started_at + 60, "duration": 60}
+
+
+LOG = [
+    twilio_call("CA1", SINCE + 10), # Has metrics
+    twilio_call("CA2", SINCE + 20), # Its metrics write failed
+    twilio_call("CA3", SINCE + 30, "busy"),
+    twilio_call("CA4", SINCE + DAY + 5), # Next window
+    twilio_call("CA5", SINCE + DAY + 5),
+]
+
+
+def list_calls(start: float, end: float) -> list:
+    return [dict(call) for call in LOG if start <= call["started_at"] < end]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = call_metrics.CallMetricsStore(str(tmp_path / "metrics.db"))
+    monkeypatch.setattr(call_metrics, "store", store)
+    for sid, agent in (("CA1", "ventas"), ("CA4", "ventas"), ("CA5", "cobros")):
+        store.record_call(sid, agent, 3, None, SINCE, SINCE + 60, [], {"ended_by": "agent", "variables": {"nombre": "Ana"}})
+    return store
+
+
+def export_all(**kwargs) -> tuple:
+    fetched = []
+
+    def fetch(call_sid):
+        fetched.append(call_sid)
+        return [{"role": "user", "content": call_sid}]
+
+    async def run():
+        return [entry async for entry in export.export_calls(SINCE, SINCE + 2 * DAY, fetch=fetch, list_calls=list_calls,
+                                                             page_size=2, concurrency=2, **kwargs)]
+
+    records = asyncio.run(run())
+    return records, fetched
+
+
+def test_every_call_in_the_log_is_exported(store):
+    records, fetched = export_all()
+    assert [entry["call_sid"] for entry in records] == ["CA1", "CA2", "CA3", "CA4", "CA5"]
+    first, no_metrics, busy = records[:3]
+    assert first["agent_id"] == "ventas" and first["ended_by"] == "agent" and first["variables"] == {"nombre": "Ana"}
+    assert first["status"] == "completed" and first["transcript"] == [{"role": "user", "content": "CA1"}]
+    assert no_metrics["agent_id"] is None and no_metrics["data"] is None and no_metrics["transcript"]
+    assert busy["status"] == "busy" and busy["transcript"] is None
+    assert "CA3" not in fetched
+
+
+def test_agent_filter_and_resume(store):
+    records, _ = export_all(agent_id="ventas")
+    assert [entry["call_sid"] for entry in records] == ["CA1", "CA4"]
+    everything, _ = export_all()
+    resumed, _ = export_all(cursor=everything[3]["cursor"]) # Same start time as the next call
+    assert [entry["call_sid"] for entry in resumed] == ["CA5"]
@@ -0,0 +1,20 @@
+import pytest
+
+import gcs
+
+
+@pytest.mark.parametrize("header,expected", [
+    ("bytes=0-", (0, 999)),
+    ("bytes=100-199", (100, 199)),
+    ("bytes=900-5000", (900, 999)), # End past the object: clamped
+    ("bytes=-300", (700, 999)), # Suffix: last 300 bytes
+    ("bytes=-5000", (0, 999)),
+    ("bytes=1000-", (1000, 999)), # Starts past the end: the caller answers 416
+    (None, None),
+    ("", None),
+    ("items=0-10", None),
+    ("bytes=0-10,20-30", None), # Multiple ranges: served whole
+    ("bytes=abc-", None),
+])
+def test_parse_range(header, expected):
+    assert gcs.parse_range(header, 1000) == expected
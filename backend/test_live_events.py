@@ -0,0 +1,49 @@
+import asyncio
+
+import live_events
+from live_events import LiveEvents
+
+
+def test_close_ends_open_streams():
+    async def run():
+        hub = LiveEvents()
+        stream = hub.stream(hub.subscribe())
+        assert await stream.__anext__() == "retry: 3000\n\n"
+        waiting = asyncio.ensure_future(stream.__anext__()) # Idle browser tab
+        await asyncio.sleep(0.01)
+        hub.publish("CA1", "call_ended")
+        assert "event: call_ended" in await waiting
+        rest = asyncio.ensure_future(_drain(stream))
+        await asyncio.sleep(0.01)
+        hub.close()
+        assert await asyncio.wait_for(rest, 1) == []
+        assert not hub.subscribers
+        late = [chunk async for chunk in hub.stream(hub.subscribe())] # Opened after the close
+        assert late == ["retry: 3000\n\n"]
+
+    asyncio.run(run())
+
+
+async def _drain(stream) -> list:
+    return [chunk async for chunk in stream]
+
+
+def test_slow_subscriber_drops_oldest_and_is_told():
+    async def run():
+        hub = LiveEvents()
+        hub.publish("CA1", "call_started", agent_id="ventas")
+        slow = hub.subscribe(agent_id="ventas")
+        other = hub.subscribe(call_sid="CA2")
+        for i in range(live_events.SUBSCRIBER_BUFFER + 10):
+            hub.publish("CA1", "turn", content=str(i)) # Never waits on the subscribers
+        stream = hub.stream(slow)
+        chunks = [await stream.__anext__() for _ in range(3)]
+        await stream.aclose()
+        return hub, chunks, other
+
+    hub, chunks, other = asyncio.run(run())
+    assert chunks[0] == "retry: 3000\n\n"
+    assert chunks[1] == 'event: dropped\ndata: {"count": 11}\n\n' # call_started replay + 10 turns
+    assert '"content": "10"' in chunks[2] # Oldest kept event
+    assert not other.events # Other call's subscriber saw nothing
+    assert hub.stats()["subscribers"] == 1 and hub.stats()["active_calls"] == 1
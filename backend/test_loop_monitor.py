@@ -0,0 +1,28 @@
+import time
+import asyncio
+
+from loop_monitor import LoopLagMonitor
+
+
+def block(seconds: float):
+    time.sleep(seconds) # Synchronous code on the loop
+
+
+def test_stall_just_over_the_threshold_is_caught():
+    async def run():
+        monitor = LoopLagMonitor(stall_threshold_ms=100)
+        monitor.start()
+        try:
+            await asyncio.sleep(0.3)
+            await asyncio.sleep(0.03) # Off the lag timer's beat: the old watchdog missed this one
+            block(0.15)
+            await asyncio.sleep(0.1)
+        finally:
+            await monitor.stop()
+        return monitor
+
+    monitor = asyncio.run(run())
+    assert monitor.stalls == 1
+    (site, offender), = monitor.offenders.items()
+    assert "in block" in offender["stack"][-1]
+    assert offender["max_ms"] >= 150
@@ -0,0 +1,54 @@
+import warnings
+
+import numpy as np
+import pytest
+
+import mulaw
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    audioop = pytest.importorskip("audioop") # The reference; gone in Python 3.13
+
+ALL_CODES = bytes(range(256))
+ALL_SAMPLES = np.arange(-32768, 32768, dtype=np.int16)
+
+
+def test_decode_matches_audioop_for_every_code():
+    assert mulaw.ulaw2lin(ALL_CODES) == audioop.ulaw2lin(ALL_CODES, 2)
+    assert mulaw.decode(ALL_CODES).tobytes() == audioop.ulaw2lin(ALL_CODES, 2)
+
+
+def test_encode_matches_audioop_for_every_sample():
+    pcm = ALL_SAMPLES.tobytes()
+    assert mulaw.lin2ulaw(pcm) == audioop.lin2ulaw(pcm, 2)
+    assert mulaw.encode(ALL_SAMPLES).tobytes() == audioop.lin2ulaw(pcm, 2)
+
+
+@pytest.mark.parametrize("start,stop", [(0, 255), (1, 256), (1, 255), (3, 160), (7, 8)])
+def test_decode_odd_lengths_and_offset_views(start, stop):
+    expected = audioop.ulaw2lin(ALL_CODES[start:stop], 2)
+    codes = np.frombuffer(ALL_CODES, dtype=np.uint8)
+    assert mulaw.decode(codes[start:stop]).tobytes() == expected # Unaligned view
+    assert mulaw.decode(memoryview(ALL_CODES)[start:stop]).tobytes() == expected
+    out = np.zeros(300, dtype=np.int16)
+    assert mulaw.decode(codes[start:stop], out=out[1:]).tobytes() == expected # Into an offset buffer
+    strided = np.frombuffer(bytes(b for c in ALL_CODES[start:stop] for b in (c, 0)), dtype=np.uint8)[::2]
+    assert mulaw.decode(strided).tobytes() == expected
+
+
+@pytest.mark.parametrize("start,stop", [(0, 65535), (1, 65536), (12345, 12346), (3, 163)])
+def test_encode_odd_lengths_and_offset_views(start, stop):
+    expected = audioop.lin2ulaw(ALL_SAMPLES[start:stop].tobytes(), 2)
+    assert mulaw.encode(ALL_SAMPLES[start:stop]).tobytes() == expected
+    assert mulaw.encode(ALL_SAMPLES.tobytes()[2 * start:2 * stop]).tobytes() == expected
+    out = np.zeros(70000, dtype=np.uint8)
+    assert mulaw.encode(ALL_SAMPLES[start:stop], out=out[1:]).tobytes() == expected
+    assert mulaw.encode(np.repeat(ALL_SAMPLES[start:stop], 2)[::2]).tobytes() == expected # Strided
+
+
+def test_frames_round_trip_like_audioop():
+    pcm = ALL_SAMPLES[::7][:1001].tobytes() # Not a whole number of frames
+    frames = mulaw.encode_frames(pcm, frame_size=160)
+    assert b"".join(frames) == audioop.lin2ulaw(pcm, 2)
+    assert [len(frame) for frame in frames[-2:]] == [160, 1001 % 160]
+    assert mulaw.decode_frames(frames).tobytes() == audioop.ulaw2lin(b"".join(frames), 2)
@@ -0,0 +1,139 @@
+import os
+import json
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+import postcall
+import upload_spool
+import waveform
+from upload_spool import UploadSpool
+
+
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    spool = UploadSpool(str(tmp_path), workers=1, uploader=lambda *args: None)
+    monkeypatch.setattr(upload_spool, "spool", spool)
+    return spool
+
+
+def spooled(spool: UploadSpool) -> dict:
+    """blob name -> uploaded content, for the jobs waiting in the spool."""
+    result = {}
+    for job in spool.jobs.values():
+        with open(spool._data_path(job["id"]), "rb") as f:
+            result[job["blob_name"]] = f.read()
+    return result
+
+
+def test_artifacts_are_staged_until_spooled(spool):
+    async def run():
+        pipeline = postcall.PostCallPipeline(workers=1)
+        pipeline.start()
+        try:
+            history = [{"role": "user", "content": "Sí, dígame", "type": "transcription"}]
+            pipeline.submit_transcript(history, "transcripciones/CA1.json", "CA1")
+            builder = waveform.WaveformBuilder(sample_rate=8000)
+            builder.add(np.arange(8000, dtype=np.int16))
+            pipeline.submit_waveform(builder.finish(), "grabaciones/2026-10-19/CA1.waveform.json", "CA1")
+            assert len([n for n in os.listdir(spool.staging_dir) if n.endswith(postcall.JOB_SUFFIX)]) == 2
+            assert await pipeline.flush(60)
+        finally:
+            await pipeline.stop()
+
+    asyncio.run(run())
+    artifacts = spooled(spool)
+    assert json.loads(artifacts["transcripciones/CA1.json"])[0]["content"] == "Sí, dígame"
+    assert json.loads(artifacts["grabaciones/2026-10-19/CA1.waveform.json"])
+    assert not os.listdir(spool.staging_dir)
+
+
+def test_staged_jobs_are_resumed_after_a_crash(spool):
+    crashed = postcall.PostCallPipeline(workers=1)
+    crashed._run = lambda job: None # Died before processing anything
+    crashed.submit_transcript([{"role": "assistant", "content": "Hola", "type": "text"}], "transcripciones/CA2.json", "CA2")
+    with open(os.path.join(spool.staging_dir, "CA2.wav"), "wb") as f:
+        f.write(b"RIFF")
+    crashed._stage("recording", "grabaciones/2026-10-19/CA2.wav", "CA2", os.path.join(spool.staging_dir, "CA2.wav"))
+
+    async def run():
+        pipeline = postcall.PostCallPipeline(workers=1)
+        pipeline.start() # Resumes what is staged
+        try:
+            assert await pipeline.flush(60)
+        finally:
+            await pipeline.stop()
+
+    asyncio.run(run())
+    artifacts = spooled(spool)
+    assert json.loads(artifacts["transcripciones/CA2.json"])[0]["content"] == "Hola"
+    assert artifacts["grabaciones/2026-10-19/CA2.wav"] == b"RIFF"
+    assert not os.listdir(spool.staging_dir)
+
+
+def test_step_falls_back_to_a_thread_off_the_loop(spool, monkeypatch):
+    threads = []
+
+    def serialize(input_path, path):
+        threads.append(threading.get_ident())
+        return postcall.serialize_transcript(input_path, path)
+
+    monkeypatch.setitem(postcall.STAGED_JOBS, "transcript", (postcall.PRIORITY_TRANSCRIPT, serialize, "application/json"))
+
+    async def run():
+        pipeline = postcall.PostCallPipeline(workers=1) # Never started: no pool
+        pipeline.submit_transcript([{"role": "user", "content": "Hola"}], "transcripciones/CA3.json", "CA3")
+        assert threads == [] # Not run on the loop
+        assert await pipeline.flush(5)
+
+    asyncio.run(run())
+    assert threads and threads[0] != threading.get_ident()
+    assert json.loads(spooled(spool)["transcripciones/CA3.json"])[0]["content"] == "Hola"
+
+
+def test_jobs_that_keep_failing_are_set_aside(spool, monkeypatch):
+    def broken(input_path, path):
+        raise ValueError("corrupt input")
+
+    monkeypatch.setitem(postcall.STAGED_JOBS, "transcript", (postcall.PRIORITY_TRANSCRIPT, broken, "application/json"))
+
+    async def run():
+        pipeline = postcall.PostCallPipeline(workers=1)
+        pipeline.submit_transcript([{"role": "user", "content": "Hola"}], "transcripciones/CA4.json", "CA4")
+        assert await pipeline.flush(5)
+        return pipeline
+
+    pipeline = asyncio.run(run())
+    assert not spool.jobs
+    assert pipeline.stats()["failed_on_disk"] == 1
+    assert [n for n in os.listdir(spool.staging_dir) if n != "failed"] == [] # Not resumed again
+
+    crashing = postcall.PostCallPipeline(workers=1)
+    crashing._run = lambda job: None
+    crashing.submit_transcript([{"role": "user", "content": "Hola"}], "transcripciones/CA5.json", "CA5")
+    for _ in range(postcall.MAX_RESUMES):
+        crashing.resume() # Each restart died while processing it
+    crashing.resume()
+    assert crashing.stats()["failed_on_disk"] == 2
+
+
+def test_trimmed_recording_records_its_offset(spool):
+    rate = 8000
+    silence, tone = np.zeros(rate, dtype=np.int16), (np.sin(np.arange(rate) / 3) * 8000).astype(np.int16)
+    path = os.path.join(spool.staging_dir, "CA6.wav")
+    postcall._write_wav(path, np.concatenate([silence, tone]), rate)
+
+    async def run():
+        pipeline = postcall.PostCallPipeline(workers=1, audio_steps="trim_silence")
+        pipeline.start()
+        try:
+            pipeline.submit_recording(path, "grabaciones/2026-10-19/CA6.wav", "CA6")
+            assert await pipeline.flush(60)
+        finally:
+            await pipeline.stop()
+
+    asyncio.run(run())
+    (job,) = spool.jobs.values()
+    assert job["metadata"]["trimmed_start_ms"] == 1000 - postcall.SILENCE_KEEP_MS
@@ -0,0 +1,44 @@
+import os
+import glob
+import tempfile
+
+import numpy as np
+import pytest
+
+for name, value in (("TWILIO_ACCOUNT_SID", "ACtest"), ("TWILIO_AUTH_TOKEN", "test"),
+                    ("TWILIO_PHONE_NUMBER", "+10000000000"), ("GOOGLE_API_KEY", "test")):
+    os.environ.setdefault(name, value) # config.Settings requires them; nothing external is called
+
+import mulaw
+import replay
+import settings_manager
+from agent_store import AgentStore
+
+
+@pytest.fixture(autouse=True)
+def agents(tmp_path, monkeypatch):
+    store = AgentStore(str(tmp_path / "agents.db"))
+    store.import_agents(settings_manager._default_agents())
+    monkeypatch.setattr(settings_manager, "store", store)
+
+
+def caller_audio() -> bytes:
+    t = np.arange(8000 * 3) / 8000
+    speech = np.sin(2 * np.pi * 220 * t) * 8000 * ((t > 0.5) & (t < 2))
+    return mulaw.encode(speech.astype(np.int16)).tobytes()
+
+
+def test_replays_are_deterministic_and_leave_nothing_behind(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMPDIR", str(tmp_path))
+    monkeypatch.setattr(tempfile, "tempdir", None) # Re-read TMPDIR
+    script = {"replies": ["Hola", "Gracias"]}
+    first, second = (replay.replay(caller_audio(), script, agent_id="default") for _ in range(2))
+    assert first.pop("run") and second.pop("run")
+    assert first == second
+    assert first["recording_seconds"] > 0
+    assert glob.glob(os.path.join(str(tmp_path), "replay-*")) == []
+
+
+def test_caller_workdir_is_kept(tmp_path):
+    trace = replay.replay(caller_audio(), {"replies": ["Hola"]}, workdir=str(tmp_path / "work"))
+    assert os.path.exists(trace["run"]["recording"])
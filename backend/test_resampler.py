@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from resampler import StreamingResampler
+
+
+def tone(frequency: float, rate: int, seconds: float = 1.0, amplitude: float = 10000) -> np.ndarray:
+    t = np.arange(int(rate * seconds)) / rate
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+
+
+def rms(samples: np.ndarray) -> float:
+    return float(np.sqrt(np.mean(samples.astype(np.float64) ** 2)))
+
+
+@pytest.mark.parametrize("in_rate,out_rate", [(24000, 8000), (8000, 16000), (16000, 8000), (8000, 24000)])
+def test_chunked_stream_matches_one_pass(in_rate, out_rate):
+    pcm = (np.random.default_rng(7).standard_normal(in_rate) * 4000).astype(np.int16)
+    whole = StreamingResampler(in_rate, out_rate).process(pcm)
+    chunked = StreamingResampler(in_rate, out_rate)
+    step = in_rate // 50 + 3 # Chunks that do not line up with the ratio
+    pieces = np.concatenate([chunked.process(pcm[i:i + step]) for i in range(0, pcm.size, step)])
+    assert pieces.size == whole.size == pcm.size * out_rate // in_rate
+    assert np.max(np.abs(pieces.astype(np.int32) - whole)) <= 1
+
+
+def test_passband_kept_and_aliases_removed():
+    resampler = StreamingResampler(24000, 8000)
+    kept = resampler.process(tone(1000, 24000))[400:] # Past the filter's warm-up
+    assert rms(kept) == pytest.approx(rms(tone(1000, 24000)), rel=0.02)
+    resampler.reset()
+    folded = resampler.process(tone(6000, 24000))[400:] # Above 4kHz: would alias to 2kHz
+    assert rms(folded) < rms(tone(6000, 24000)) * 0.01
+
+
+def test_reset_forgets_the_stream():
+    resampler = StreamingResampler(8000, 16000)
+    first = resampler.process(tone(440, 8000, 0.1))
+    resampler.process(tone(3000, 8000, 0.1))
+    resampler.reset()
+    assert np.array_equal(resampler.process(tone(440, 8000, 0.1)), first)
@@ -0,0 +1,43 @@
+from transcript_logger import ResponseAggregator
+
+
+def feed(chunks) -> list:
+    aggregator = ResponseAggregator()
+    for at, chunk in enumerate(chunks):
+        aggregator.feed(chunk, float(at), f"t{at}")
+    return [(segment.kind, "".join(segment.chunks).strip(), segment.first_at, segment.last_at)
+            for segment in aggregator.finish()]
+
+
+def test_thought_then_speech():
+    assert feed(["**Saludo**\n\nEl cliente", " contestó.\n\n\n", "Buenos días, ", "¿hablo con Ana?"]) == [
+        ("thought", "**Saludo**\n\nEl cliente contestó.", 0.0, 1.0),
+        ("text", "Buenos días, ¿hablo con Ana?", 2.0, 3.0),
+    ]
+
+
+def test_boundaries_split_across_chunks():
+    # The closing newline run and the opening ** each arrive in pieces
+    assert [kind for kind, *_ in feed(["*", "*Plan**\n", "\n", "\nClaro", ", con gusto.\n\n*", "*Nota**\n\nrevisar"])] == [
+        "thought", "text", "thought",
+    ]
+
+
+def test_plain_speech_with_paragraphs_stays_one_segment():
+    assert feed(["Hola.\n\n", "Le llamo de SIAC.\n\n\n", "*Oferta* especial"]) == [
+        ("text", "Hola.\n\nLe llamo de SIAC.\n\n\n*Oferta* especial", 0.0, 2.0),
+    ]
+
+
+def test_finish_resets_for_the_next_response():
+    aggregator = ResponseAggregator()
+    aggregator.feed("**Idea**\n\n", 0.0, "t0")
+    assert [s.kind for s in aggregator.finish()] == ["thought"]
+    aggregator.feed("Listo", 1.0, "t1")
+    (segment,) = aggregator.finish()
+    assert (segment.kind, segment.timestamp) == ("text", "t1")
+
+
+def test_lone_star_after_a_paragraph_is_text():
+    assert feed(["Precio final.\n\n", "*", "\nGracias"]) == [("text", "Precio final.\n\n*\nGracias", 0.0, 2.0)]
+    assert feed(["Precio final.\n\n", "*"]) == [("text", "Precio final.\n\n*", 0.0, 1.0)]
@@ -0,0 +1,80 @@
+import os
+import asyncio
+
+from upload_spool import UploadSpool
+
+
+class FakeUploader:
+    def __init__(self):
+        self.uploaded = {} # blob name -> bytes
+
+    def __call__(self, local_path: str, blob_name: str, content_type: str):
+        with open(local_path, "rb") as f:
+            self.uploaded[blob_name] = f.read()
+
+
+def test_worker_survives_job_whose_data_file_is_gone(tmp_path):
+    async def run():
+        uploader = FakeUploader()
+        spool = UploadSpool(str(tmp_path), workers=1, uploader=uploader, max_attempts=1)
+        lost = spool.enqueue_bytes(b"lost", "grabaciones/lost.wav", "audio/wav")
+        os.remove(spool._data_path(lost))
+        await spool.start()
+        try:
+            assert await spool.flush(5)
+            spool.enqueue_bytes(b"next", "transcripciones/next.json", "application/json")
+            assert await spool.flush(5)
+            assert uploader.uploaded == {"transcripciones/next.json": b"next"}
+            stats = spool.stats()
+            assert stats["workers"] == 1 and stats["failed"] == 1 and stats["failed_on_disk"] == 1
+        finally:
+            await spool.stop()
+
+    asyncio.run(run())
+
+
+def test_worker_survives_failed_bookkeeping(tmp_path):
+    async def run():
+        def failing_uploader(local_path, blob_name, content_type):
+            raise ConnectionError("GCS down")
+
+        spool = UploadSpool(str(tmp_path), workers=1, uploader=failing_uploader, max_attempts=3)
+        spool.enqueue_bytes(b"a", "transcripciones/a.json", "application/json")
+        save = spool._save
+
+        def disk_full(job):
+            raise OSError(28, "No space left on device")
+
+        spool._save = disk_full # Recording the retry fails
+        await spool.start()
+        try:
+            assert await spool.flush(5)
+            spool._save = save
+            uploader = FakeUploader()
+            spool.uploader = uploader
+            spool.enqueue_bytes(b"b", "transcripciones/b.json", "application/json")
+            assert await spool.flush(5)
+            assert uploader.uploaded == {"transcripciones/b.json": b"b"}
+            assert spool.stats()["workers"] == 1
+        finally:
+            await spool.stop()
+
+    asyncio.run(run())
+
+
+def test_jobs_left_on_disk_are_resumed(tmp_path):
+    first = UploadSpool(str(tmp_path), workers=1, uploader=FakeUploader())
+    first.enqueue_bytes(b"pending", "grabaciones/2026-10-19/CA1.wav", "audio/wav") # Never started: a crash
+
+    async def run():
+        uploader = FakeUploader()
+        spool = UploadSpool(str(tmp_path), workers=1, uploader=uploader)
+        await spool.start()
+        try:
+            assert await spool.flush(5)
+            assert uploader.uploaded == {"grabaciones/2026-10-19/CA1.wav": b"pending"}
+            assert not os.listdir(spool.pending_dir)
+        finally:
+            await spool.stop()
+
+    asyncio.run(run())
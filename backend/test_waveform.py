@@ -0,0 +1,46 @@
+import numpy as np
+
+import waveform
+
+
+def pcm(seconds: float = 2.0, seed: int = 3) -> np.ndarray:
+    return (np.random.default_rng(seed).standard_normal(int(8000 * seconds) + 37) * 6000).astype(np.int16)
+
+
+def test_batches_give_the_same_buckets_as_one_pass():
+    samples = pcm()
+    whole = waveform.WaveformBuilder()
+    whole.add(samples)
+    batched = waveform.WaveformBuilder()
+    for i in range(0, samples.size, 333): # Batches that split buckets
+        batched.add(samples[i:i + 333])
+    a, b = whole.finish(), batched.finish()
+    assert all(np.array_equal(a[k], b[k]) for k in ("min", "max", "sumsq", "counts"))
+
+    per_point = waveform.BASE_SAMPLES_PER_POINT
+    assert a["total_samples"] == samples.size and a["counts"][-1] == samples.size % per_point
+    assert a["min"][0] == samples[:per_point].min() and a["max"][-1] == samples[-37:].max()
+
+
+def test_levels_summarize_the_finer_ones():
+    samples = pcm()
+    builder = waveform.WaveformBuilder()
+    builder.add(samples)
+    document = waveform.render(builder.finish())
+    base, coarser = (level["channels"][0] for level in document["levels"][:2])
+    quant = waveform.QUANT
+    assert base["min"][0] == samples[:160].min() // quant
+    assert coarser["min"][0] == samples[:640].min() // quant and coarser["max"][0] == samples[:640].max() // quant
+    expected_rms = np.sqrt(np.mean(samples[:640].astype(np.float64) ** 2))
+    assert coarser["rms"][0] == round(expected_rms / quant)
+    assert document["duration_seconds"] == round(samples.size / 8000, 3)
+    assert [level["samples_per_point"] for level in document["levels"]] == [160, 640, 2560, 10240, 40960]
+
+
+def test_select_level_picks_the_finest_that_fits():
+    builder = waveform.WaveformBuilder()
+    builder.add(pcm(seconds=10))
+    document = waveform.render(builder.finish())
+    assert waveform.select_level(document, 2000)["samples_per_point"] == 160 # 501 points
+    assert waveform.select_level(document, 200)["samples_per_point"] == 640
+    assert waveform.select_level(document, 1)["samples_per_point"] == 40960 # Coarsest if none fits
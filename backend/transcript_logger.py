@@ -1,172 +1,215 @@
-import os
-import json
+import re
+import time
 import datetime
-import asyncio
+from typing import List, Optional
 from loguru import logger
-from google.cloud import storage
 
 from pipecat.processors.frame_processor import FrameProcessor
 from pipecat.frames.frames import (
-    Frame, 
-    TranscriptionFrame, 
-    TextFrame, 
-    EndFrame, 
-    LLMFullResponseStartFrame, 
-    LLMFullResponseEndFrame, # <--- Restored
-    InterimTranscriptionFrame, # Added
+    Frame,
+    StartFrame,
+    TranscriptionFrame,
+    TextFrame,
+    TTSTextFrame,
+    EndFrame,
+    LLMFullResponseStartFrame,
+    LLMFullResponseEndFrame,
+    InterimTranscriptionFrame,
     UserStartedSpeakingFrame,
     UserStoppedSpeakingFrame
 )
-import re # For thought filtering
 
-# Constants
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-KEY_FILE = os.path.join(BASE_DIR, "mundimotos-481115-c652dd31ca7c.json")
-BUCKET_NAME = "asistente-siac-voz-logs"
+import postcall
+import live_events
+
+NEWLINES = re.compile(r"(\n+)")
+
+
+class Segment:
+    """One transcript entry being built: chunks, kind and when its first/last chunk arrived."""
+
+    def __init__(self, at: float, timestamp: str):
+        self.chunks: List[str] = []
+        self.kind: Optional[str] = None # "thought" / "text", None until its first characters arrive
+        self.first_at = at
+        self.last_at = at
+        self.timestamp = timestamp
+
+    def add(self, text: str, at: float):
+        self.chunks.append(text)
+        self.last_at = at
+        if self.kind is None:
+            head = "".join(self.chunks).lstrip() # Only until decided: a couple of characters
+            if len(head) >= 2 or (head and not head.startswith("*")):
+                self.kind = "thought" if head.startswith("**") else "text"
+
+
+class ResponseAggregator:
+    """
+    Splits the assistant's streamed text into thought and speech segments as
+    it arrives. Chunks are kept in a list and joined once per segment.
+
+    Gemini's thoughts look like `**Header**\\n\\nreasoning...\\n\\n\\n` ahead of
+    what is actually said: a segment that starts with `**` is a thought, a
+    run of 3+ newlines ends it, and a `**` paragraph inside speech starts a
+    new thought. Boundaries are only looked for at newline runs, so each chunk
+    is split once instead of rescanning the whole response.
+    """
+
+    def __init__(self):
+        self.segment: Optional[Segment] = None
+        self.done: List[Segment] = [] # Closed segments not yet taken
+        self._newlines = 0 # Newlines at the end of what has arrived (a run can span chunks)
+        self._held = "" # A lone "*" after a paragraph break: may open a `**` thought split across chunks
+        self._held_at = 0.0
+
+    def feed(self, text: str, at: float, timestamp: str):
+        for piece in NEWLINES.split(text):
+            if not piece:
+                continue
+            if piece[0] == "\n":
+                if self._held: # It was just text
+                    self._text(self._held, self._held_at, timestamp)
+                    self._held = ""
+                self._newlines += len(piece)
+                if self.segment:
+                    self.segment.add(piece, at)
+                continue
+
+            piece, self._held = self._held + piece, ""
+            if piece == "*" and self.segment and self.segment.kind == "text" and self._newlines >= 2:
+                self._held, self._held_at = piece, at # The next chunk decides
+                continue
+            self._text(piece, at, timestamp)
+
+    def _text(self, piece: str, at: float, timestamp: str):
+        segment = self.segment
+        if segment and segment.kind == "thought" and self._newlines >= 3:
+            self._close()
+        elif segment and segment.kind == "text" and self._newlines >= 2 and piece.startswith("**"):
+            self._close()
+        self._newlines = 0
+        if self.segment is None:
+            self.segment = Segment(at, timestamp)
+        self.segment.add(piece, at)
+
+    def _close(self):
+        if self.segment:
+            self.done.append(self.segment)
+        self.segment = None
+
+    def finish(self) -> List[Segment]:
+        """Ends the response: every segment it produced, in order."""
+        if self._held:
+            self._text(self._held, self._held_at, self.segment.timestamp)
+            self._held = ""
+        self._close()
+        self._newlines = 0
+        segments, self.done = self.done, []
+        return segments
+
 
 class TranscriptLogger(FrameProcessor):
     def __init__(self, call_sid: str):
         super().__init__()
         self.call_sid = call_sid
         self.history = []
-        self.ai_buffer = "" # Buffer for aggregating AI tokens
+        self.aggregator = ResponseAggregator() # Assistant text of the response in progress
+        self.uploaded_count = 0 # History length at last upload (EndFrame and pipeline teardown both upload)
+        self.started_at = time.monotonic() # Reset on StartFrame: entry offsets are from the pipeline start
+        self._user_speech = None # (start, end) offsets of the caller's latest speech, for their transcription
         logger.info(f"TranscriptLogger started for {call_sid}")
 
+    def _offset(self) -> float:
+        return round(time.monotonic() - self.started_at, 2)
+
     async def process_frame(self, frame: Frame, direction: int):
         await super().process_frame(frame, direction)
-        
+
         # DEBUG: Log every frame type to understand flow
-        logger.info(f"Frame received: {type(frame).__name__}") 
+        logger.info(f"Frame received: {type(frame).__name__}")
+
+        if isinstance(frame, StartFrame):
+            self.started_at = time.monotonic()
+
+        elif isinstance(frame, UserStartedSpeakingFrame):
+            self._user_speech = (self._offset(), None)
+        elif isinstance(frame, UserStoppedSpeakingFrame) and self._user_speech:
+            self._user_speech = (self._user_speech[0], self._offset())
 
-        timestamp = datetime.datetime.now().isoformat()
-        
         # 1. User Transcription
-        if isinstance(frame, (TranscriptionFrame, InterimTranscriptionFrame)):
+        elif isinstance(frame, (TranscriptionFrame, InterimTranscriptionFrame)):
             logger.info(f"CAPTURED TRANSCRIPTION ({type(frame).__name__}): {frame.text}") # Debug log
-            
-            # Only log final transcriptions to history to avoid noise, or log all for now to debug
+
+            # Only final transcriptions go to the history
             if isinstance(frame, TranscriptionFrame):
-                entry = {
-                    "timestamp": timestamp,
+                now = self._offset()
+                start, end = self._user_speech or (now, now) # Transcriptions arrive after the speech ended
+                self._user_speech = None
+                self._append({
+                    "timestamp": datetime.datetime.now().isoformat(),
                     "role": "user" if getattr(frame, "user_id", "user") != "assistant" else "assistant",
                     "content": frame.text,
-                    "type": "transcription"
-                }
-                self.history.append(entry)
+                    "type": "transcription",
+                    "start": start,
+                    "end": end if end is not None else now,
+                })
 
-        # 2. AI Text Aggregation
-        elif isinstance(frame, TextFrame):
-            self.ai_buffer += frame.text
+        # 2. AI Text Aggregation. Gemini sends its output transcription as both LLMTextFrame
+        # and TTSTextFrame; only one of them is kept so the text is not doubled.
+        elif isinstance(frame, TextFrame) and not isinstance(frame, TTSTextFrame):
+            self.aggregator.feed(frame.text, self._offset(), datetime.datetime.now().isoformat())
 
         elif isinstance(frame, LLMFullResponseEndFrame):
-            # Flush buffer on end of response
-            if self.ai_buffer.strip():
-                self._flush_ai_buffer(timestamp)
+            self._flush_response()
 
         # 3. Handle End of Call
         elif isinstance(frame, EndFrame):
-            # Ensure any remaining buffer is flushed
-            if self.ai_buffer.strip():
-                self._flush_ai_buffer(timestamp)
+            self._flush_response() # Whatever was left mid-response
             await self.upload_history()
-            
+
         # Push frame downstream
         await self.push_frame(frame, direction)
 
-    def _flush_ai_buffer(self, timestamp: str):
-        """Processes and logs the buffered AI text."""
-        full_text = self.ai_buffer.strip()
-        if not full_text:
-            return
+    def _flush_response(self):
+        """Logs the thought and speech segments of the finished response."""
+        for segment in self.aggregator.finish():
+            content = "".join(segment.chunks).strip()
+            if not content:
+                continue
+            self._append({
+                "timestamp": segment.timestamp, # When its first chunk arrived
+                "role": "assistant",
+                "content": content,
+                "type": segment.kind or "text", # "thought" so the frontend can hide it
+                "start": segment.first_at,
+                "end": segment.last_at,
+            })
+            logger.info(f"AI Response Logged (Length: {len(content)}, Type: {segment.kind})")
 
-        # Attempt to separate "Thought" from "Speech"
-        # Removing thought blocks that look like **Header**\n\nContent...
-        # Or simple **Thoughts** style.
-        # Regex to remove blocks starting with ** and ending with newline or ** (if it's a inline thought?)
-        # Based on user input: "**Initiating The Interaction**\n\nI've established... ....\n\n\n"
-        # Since the model output seems to put thoughts *before* speech, we can try to split.
-        
-        # Strategy: Remove lines starting with ** if they seem to be headers, and following lines until we hit "Normal text"?
-        # Actually, simpler: Remove content matching `\*\*.*?\*\*(\n\n)?` or similar.
-        # The user JSON showed: `**Initiating The Interaction**\n\nI've established...`
-        # It seems the entire buffer MIGHT be a thought if it's just thought? 
-        # Or does the TextFrame stream contain BOTH thought and speech?
-        # The JSON showed separate entries for thoughts in the *old* logic? No, the user provided JSON showed:
-        # { "content": "**Initiating...**\n\n..." } -> ONE entry.
-        # Then { "content": "Hola..." } -> ANOTHER entry.
-        # This implies the Model emitted a Thought block, then maybe a pause/break (EndFrame?), then speech?
-        # If they are separate LLM responses, we need to detect if the *entire* buffer is a thought.
-        
-        # Rule: If text starts with ** and has no "speech" indicators (difficult), mark as thought.
-        # But wait, looking at the user's json again:
-        # Entry 1: **Initiating...**\n\nI've established... (Type: text)
-        # Entry 2: Hola, buenas (Type: text)
-        
-        # If Gemini sends Thoughts as a separate Turn, we can filter it out by checking if it starts with **.
-        
-        is_thought = False
-        if full_text.startswith("**") and ("**" in full_text[2:] or "\n" in full_text):
-             # Likely a thought block.
-             # We can log it as 'thought' type or skip it.
-             # User wants to clean it. Let's skip it OR log as type="thought" so frontend can hide it.
-             is_thought = True
-        
-        if is_thought:
-            logger.info("Detected thought block. Marking as internal.")
-            type_field = "thought" # Custom type
-        else:
-            type_field = "text"
-
-        entry = {
-            "timestamp": timestamp,
-            "role": "assistant",
-            "content": full_text,
-            "type": type_field 
-        }
+    def _append(self, entry: dict):
         self.history.append(entry)
-        logger.info(f"AI Response Logged (Length: {len(full_text)}, Type: {type_field})")
-        
-        self.ai_buffer = "" # Reset buffer
-    
+        live_events.hub.publish(self.call_sid, "turn", **entry) # Supervisors watching the call
+
     async def upload_history(self):
 
         logger.info(f"Attempting to upload history. Count: {len(self.history)}")
         if not self.history:
             logger.info("No transcript history to upload. (Empty list)")
             return
+        if len(self.history) == self.uploaded_count:
+            logger.info("Transcript unchanged since last upload, skipping.")
+            return
 
         try:
-            # Construct JSON content
-            json_content = json.dumps(self.history, indent=2, ensure_ascii=False)
-            
             # Construct GCS Path: transcripciones/{call_sid}.json
             # (User asked for /transcripciones/)
             blob_name = f"transcripciones/{self.call_sid}.json"
-            
-            if os.path.exists(KEY_FILE):
-                # Run sync GCS upload in executor to avoid blocking loop? 
-                # For "EndFrame", we are shutting down, so blocking is less critical but good practice.
-                # Here we just do it sync for simplicity as `upload_from_string` is fast-ish.
-                # Or use asyncio.to_thread
-                
-                logger.info(f"Uploading transcript to gs://{BUCKET_NAME}/{blob_name}...")
-                
-                # Use asyncio.to_thread to unblock event loop
-                await asyncio.to_thread(
-                    self._upload_string, 
-                    json_content, 
-                    blob_name
-                )
-                
-                logger.info("Transcript upload complete.")
-            else:
-                logger.error(f"GCS Key file not found: {KEY_FILE}. Transcript not uploaded.")
-                
-        except Exception as e:
-            logger.error(f"Failed to upload transcript: {e}")
 
-    def _upload_string(self, content: str, blob_name: str):
-        storage_client = storage.Client.from_service_account_json(KEY_FILE)
-        bucket = storage_client.bucket(BUCKET_NAME)
-        blob = bucket.blob(blob_name)
-        blob.upload_from_string(content, content_type='application/json')
+            # JSON serialization of long transcripts runs in the post-call process pool,
+            # then the spool persists it and uploads it with retries
+            postcall.pipeline.submit_transcript(self.history, blob_name, self.call_sid)
+            self.uploaded_count = len(self.history)
+
+        except Exception as e:
+            logger.error(f"Failed to spool transcript: {e}")
@@ -0,0 +1,98 @@
+import time
+from typing import Callable, Optional
+
+from pipecat.frames.frames import (
+    BotStartedSpeakingFrame,
+    BotStoppedSpeakingFrame,
+    Frame,
+    MetricsFrame,
+    TTSAudioRawFrame,
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.metrics.metrics import LLMUsageMetricsData
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+import call_accounting
+
+
+class TurnLatencyTracker(FrameProcessor):
+    """
+    Measures how long the caller waits for the bot after they stop talking.
+
+    Goes right before transport.output(): it sees the VAD's
+    UserStoppedSpeakingFrame on its way down and the BotStartedSpeakingFrame
+    the output transport sends back up when the answer's first audio goes
+    out. `response_ms` is the time between the two; `latency_ms` adds the VAD
+    stop_secs, because the caller actually went quiet that long before the VAD
+    decided the turn was over (the part a lower stop_secs buys back).
+    `on_turn(turn)` is called with each of them as it is measured, and
+    `on_interruption()` when the caller talks over the bot.
+    """
+
+    def __init__(self, stop_secs: float, on_turn: Optional[Callable[[dict], None]] = None,
+                 on_interruption: Optional[Callable[[], None]] = None):
+        super().__init__()
+        self.stop_secs = stop_secs
+        self.on_turn = on_turn
+        self.on_interruption = on_interruption
+        self.turns = [] # {"latency_ms", "response_ms"} per bot answer
+        self.interruptions = 0 # Caller started talking over the bot
+        self.greeted_at = None # Wall clock of the bot's first audio
+        self._user_stopped_at = None
+        self._bot_speaking = False
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, UserStartedSpeakingFrame):
+            self._user_stopped_at = None # Still the same turn
+            if self._bot_speaking:
+                self.interruptions += 1
+                if self.on_interruption:
+                    self.on_interruption()
+        elif isinstance(frame, UserStoppedSpeakingFrame):
+            self._user_stopped_at = time.monotonic()
+        elif isinstance(frame, BotStartedSpeakingFrame) and direction == FrameDirection.UPSTREAM:
+            self._bot_speaking = True
+            if self.greeted_at is None:
+                self.greeted_at = time.time()
+            if self._user_stopped_at is not None: # Not the greeting
+                response_ms = (time.monotonic() - self._user_stopped_at) * 1000
+                turn = {
+                    "latency_ms": round(response_ms + self.stop_secs * 1000, 1),
+                    "response_ms": round(response_ms, 1),
+                }
+                self.turns.append(turn)
+                if self.on_turn:
+                    self.on_turn(turn)
+                self._user_stopped_at = None
+        elif isinstance(frame, BotStoppedSpeakingFrame) and direction == FrameDirection.UPSTREAM:
+            self._bot_speaking = False
+
+        await self.push_frame(frame, direction)
+
+
+class LLMUsageMeter(FrameProcessor):
+    """
+    Goes right after the LLM: adds the audio it generates and the token usage
+    it reports (PipelineParams(enable_usage_metrics=True)) to the call's usage.
+    """
+
+    def __init__(self, usage: "call_accounting.CallUsage"):
+        super().__init__()
+        self.usage = usage
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, TTSAudioRawFrame):
+            self.usage.llm_audio_out_seconds += len(frame.audio) / (frame.sample_rate * frame.num_channels * 2)
+        elif isinstance(frame, MetricsFrame):
+            for data in frame.data:
+                if isinstance(data, LLMUsageMetricsData):
+                    self.usage.llm_tokens["prompt"] += data.value.prompt_tokens
+                    self.usage.llm_tokens["completion"] += data.value.completion_tokens
+                    self.usage.llm_tokens["total"] += data.value.total_tokens
+
+        await self.push_frame(frame, direction)
@@ -0,0 +1,56 @@
+import base64
+import json
+
+import numpy as np
+from pipecat.frames.frames import AudioRawFrame, Frame, InputAudioRawFrame, StartInterruptionFrame
+from pipecat.serializers.twilio import TwilioFrameSerializer
+
+import mulaw
+from resampler import StreamingResampler
+
+
+class MulawTwilioFrameSerializer(TwilioFrameSerializer):
+    """
+    TwilioFrameSerializer that converts media payloads with the in-project
+    mulaw codec instead of audioop, and resamples with one StreamingResampler
+    per direction (filter state carried across chunks) instead of resampling
+    every chunk independently. Everything that is not audio (clear, DTMF,
+    hang up, transport messages) is handled by the base class.
+    """
+
+    def __init__(self, *args, resampler_quality: str = "medium", **kwargs):
+        super().__init__(*args, **kwargs)
+        self._resampler_quality = resampler_quality
+        self._out_resampler = None # Created on the first frame, when the rates are known
+        self._in_resampler = None
+
+    def _resampler_for(self, current, in_rate: int, out_rate: int) -> StreamingResampler:
+        if current is None or current.in_rate != in_rate or current.out_rate != out_rate:
+            current = StreamingResampler(in_rate, out_rate, self._resampler_quality)
+        return current
+
+    async def serialize(self, frame: Frame) -> str | bytes | None:
+        if isinstance(frame, StartInterruptionFrame) and self._out_resampler:
+            self._out_resampler.reset() # The audio in its history was discarded
+        if not isinstance(frame, AudioRawFrame):
+            return await super().serialize(frame)
+
+        # Output: PCM at the frame's rate -> 8kHz mulaw for Twilio
+        self._out_resampler = self._resampler_for(self._out_resampler, frame.sample_rate, self._twilio_sample_rate)
+        pcm = self._out_resampler.process(np.frombuffer(frame.audio, dtype=np.int16))
+        payload = base64.b64encode(mulaw.encode(pcm)).decode("utf-8")
+        return json.dumps({
+            "event": "media",
+            "streamSid": self._stream_sid,
+            "media": {"payload": payload},
+        })
+
+    async def deserialize(self, data: str | bytes) -> Frame | None:
+        message = json.loads(data)
+        if message.get("event") != "media":
+            return await super().deserialize(data)
+
+        # Input: Twilio 8kHz mulaw -> PCM at the pipeline input rate
+        self._in_resampler = self._resampler_for(self._in_resampler, self._twilio_sample_rate, self._sample_rate)
+        pcm = self._in_resampler.process(mulaw.decode(base64.b64decode(message["media"]["payload"])))
+        return InputAudioRawFrame(audio=pcm.tobytes(), num_channels=1, sample_rate=self._sample_rate)
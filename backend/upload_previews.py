@@ -1,46 +1,188 @@
+"""
+Syncs the voice preview clips (frontend/audios_voz/*.m4a) to previews/ in the bucket.
 
+One listing gets every remote object's checksum; only new or changed files are
+uploaded, by a pool of parallel workers, and `--delete` removes remote clips
+that no longer exist locally. It also writes previews/manifest.json (voice ->
+object, size, md5), which the server's preview cache loads instead of listing
+the bucket.
+
+Usage:
+    python upload_previews.py                     # sync to GCS
+    python upload_previews.py --dry-run --delete  # show what would change
+    python upload_previews.py --target /tmp/bucket  # local directory instead of GCS (offline tests)
+"""
 import os
-from google.cloud import storage
-
-# Configuration
-BUCKET_NAME = "asistente-siac-voz-logs"
-KEY_FILE = "mundimotos-481115-c652dd31ca7c.json"
-SOURCE_DIR = "frontend/audios_voz"
-DEST_FOLDER = "previews"
-
-def upload_files():
-    if not os.path.exists(KEY_FILE):
-        print(f"Error: Key file {KEY_FILE} not found.")
-        return
-
-    storage_client = storage.Client.from_service_account_json(KEY_FILE)
-    bucket = storage_client.bucket(BUCKET_NAME)
-
-    # Ensure source dir exists
-    if not os.path.exists(SOURCE_DIR):
-        print(f"Error: Source directory {SOURCE_DIR} not found.")
-        return
-
-    files = [f for f in os.listdir(SOURCE_DIR) if f.endswith('.m4a')]
-    
-    print(f"Found {len(files)} files to upload...")
-
-    for filename in files:
-        local_path = os.path.join(SOURCE_DIR, filename)
-        # Force filename to lowercase for consistency in storage
-        dest_blob_name = f"{DEST_FOLDER}/{filename.lower()}"
-        
-        blob = bucket.blob(dest_blob_name)
-        print(f"Uploading {filename} to gs://{BUCKET_NAME}/{dest_blob_name}...")
-        
-        blob.upload_from_filename(local_path, content_type='audio/mp4')
-        try:
-            blob.make_public()
-            print(f"Public URL: {blob.public_url}")
-        except Exception as e:
-            print(f"Could not make public (will need proxy): {e}")
-
-    print("Upload complete!")
+import sys
+import json
+import time
+import base64
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import google_crc32c
+
+import gcs
+from previews import PREVIEWS_PREFIX, MANIFEST_NAME
+
+SOURCE_DIR = os.path.join(gcs.BASE_DIR, "..", "frontend", "audios_voz")
+CONTENT_TYPE = "audio/mp4"
+UPLOAD_WORKERS = 8
+
+
+def file_checksums(path: str) -> Dict[str, str]:
+    """md5 and crc32c, base64 like GCS reports them."""
+    md5, crc = hashlib.md5(), google_crc32c.Checksum()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            md5.update(chunk)
+            crc.update(chunk)
+    return {"md5": base64.b64encode(md5.digest()).decode(), "crc32c": base64.b64encode(crc.digest()).decode()}
+
+
+def unchanged(local: Dict[str, str], remote: Dict[str, Optional[str]]) -> bool:
+    # Composite objects have no md5, only crc32c
+    if remote.get("md5"):
+        return remote["md5"] == local["md5"]
+    return remote.get("crc32c") == local["crc32c"]
+
+
+class GCSBackend:
+    def __init__(self):
+        self.bucket = gcs.get_bucket()
+
+    def list(self, prefix: str) -> Dict[str, dict]:
+        blobs = self.bucket.list_blobs(prefix=prefix, fields="items(name,size,md5Hash,crc32c),nextPageToken")
+        return {blob.name: {"size": blob.size, "md5": blob.md5_hash, "crc32c": blob.crc32c} for blob in blobs}
+
+    def upload(self, local_path: str, name: str, content_type: str):
+        # checksum="md5": GCS rejects the upload if what it got does not match
+        self.bucket.blob(name).upload_from_filename(local_path, content_type=content_type, checksum="md5")
+
+    def upload_bytes(self, data: bytes, name: str, content_type: str):
+        blob = self.bucket.blob(name)
+        blob.cache_control = "no-cache"
+        blob.upload_from_string(data, content_type=content_type)
+
+    def delete(self, name: str):
+        self.bucket.blob(name).delete()
+
+    def describe(self, name: str) -> str:
+        return f"gs://{gcs.BUCKET_NAME}/{name}"
+
+
+class LocalBackend:
+    """A directory standing in for the bucket (object name = relative path)."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def list(self, prefix: str) -> Dict[str, dict]:
+        objects = {}
+        root = os.path.join(self.directory, prefix)
+        if not os.path.isdir(root):
+            return objects
+        for filename in os.listdir(root):
+            path = os.path.join(root, filename)
+            if os.path.isfile(path):
+                objects[prefix + filename] = {"size": os.path.getsize(path), **file_checksums(path)}
+        return objects
+
+    def upload(self, local_path: str, name: str, content_type: str):
+        target = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(local_path, target + ".tmp")
+        os.replace(target + ".tmp", target)
+
+    def upload_bytes(self, data: bytes, name: str, content_type: str):
+        target = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            f.write(data)
+
+    def delete(self, name: str):
+        os.remove(os.path.join(self.directory, name))
+
+    def describe(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+
+def sync(backend, source_dir: str = SOURCE_DIR, delete: bool = False, dry_run: bool = False,
+         workers: int = UPLOAD_WORKERS) -> dict:
+    """Uploads new/changed clips, optionally deletes orphans, and writes the manifest."""
+    local = {}
+    for filename in sorted(os.listdir(source_dir)):
+        if filename.lower().endswith(".m4a"):
+            path = os.path.join(source_dir, filename)
+            # Lowercase names: the preview endpoint looks voices up case-insensitively
+            local[PREVIEWS_PREFIX + filename.lower()] = {"path": path, "size": os.path.getsize(path), **file_checksums(path)}
+
+    remote = {name: meta for name, meta in backend.list(PREVIEWS_PREFIX).items() if name.endswith(".m4a")}
+    changed = [name for name, meta in local.items() if name not in remote or not unchanged(meta, remote[name])]
+    orphans = sorted(set(remote) - set(local)) if delete else []
+    print(f"{len(local)} local clips: {len(changed)} to upload, {len(local) - len(changed)} unchanged"
+          + (f", {len(orphans)} remote orphans to delete" if delete else ""))
+
+    def upload(name: str):
+        started = time.perf_counter()
+        backend.upload(local[name]["path"], name, CONTENT_TYPE)
+        print(f"  uploaded {backend.describe(name)} ({local[name]['size']} bytes, {time.perf_counter() - started:.2f}s)")
+
+    def remove(name: str):
+        backend.delete(name)
+        print(f"  deleted {backend.describe(name)}")
+
+    if dry_run:
+        for name in changed:
+            print(f"  would upload {name}")
+        for name in orphans:
+            print(f"  would delete {name}")
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # list() so the first failure is raised here
+            list(pool.map(upload, changed))
+            list(pool.map(remove, orphans))
+
+    manifest = {
+        "generated_at": int(time.time()),
+        "voices": {
+            os.path.splitext(name[len(PREVIEWS_PREFIX):])[0]: {
+                "name": name,
+                "size": meta["size"],
+                "md5": base64.b64decode(meta["md5"]).hex(), # Hex: served as the ETag
+            }
+            for name, meta in local.items()
+        },
+    }
+    if not dry_run:
+        backend.upload_bytes(json.dumps(manifest, indent=1).encode("utf-8"), PREVIEWS_PREFIX + MANIFEST_NAME, "application/json")
+        print(f"Wrote {backend.describe(PREVIEWS_PREFIX + MANIFEST_NAME)} ({len(local)} voices)")
+    return {"uploaded": changed, "deleted": orphans, "unchanged": len(local) - len(changed), "manifest": manifest}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=SOURCE_DIR, help="Directory with the .m4a clips")
+    parser.add_argument("--target", help="Sync into this local directory instead of the GCS bucket")
+    parser.add_argument("--delete", action="store_true", help="Delete remote clips that are not in --source")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    parser.add_argument("--workers", type=int, default=UPLOAD_WORKERS, help="Parallel uploads")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.source):
+        print(f"Error: Source directory {args.source} not found.")
+        return 1
+    try:
+        backend = LocalBackend(args.target) if args.target else GCSBackend()
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        return 1
+    sync(backend, args.source, delete=args.delete, dry_run=args.dry_run, workers=args.workers)
+    return 0
+
 
 if __name__ == "__main__":
-    upload_files()
+    sys.exit(main())
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import uuid
+import random
+import shutil
+import asyncio
+from typing import Callable, Optional
+from loguru import logger
+
+import gcs
+
+SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", os.path.join(gcs.BASE_DIR, "spool"))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+MAX_ATTEMPTS = int(os.getenv("UPLOAD_MAX_ATTEMPTS", "10"))
+BASE_DELAY_SECONDS = 2.0
+MAX_DELAY_SECONDS = 600.0
+
+
+class UploadSpool:
+    """
+    Durable queue of artifacts waiting to be uploaded.
+
+    Every job is a data file plus a small JSON descriptor in `pending/`, so a
+    crash or redeploy loses nothing: start() picks up whatever is left. A fixed
+    number of workers drains the queue, retrying failures with exponential
+    backoff; jobs that keep failing are moved to `failed/` for inspection.
+    """
+
+    def __init__(self, directory: str = SPOOL_DIR, workers: int = UPLOAD_WORKERS,
+                 uploader: Callable[[str, str, str], None] = gcs.upload_file,
+                 max_attempts: int = MAX_ATTEMPTS):
+        self.directory = directory
+        self.pending_dir = os.path.join(directory, "pending")
+        self.failed_dir = os.path.join(directory, "failed")
+        self.staging_dir = os.path.join(directory, "staging")
+        self.workers = workers
+        self.uploader = uploader
+        self.max_attempts = max_attempts
+
+        self.jobs = {} # job_id -> descriptor, for every job not yet uploaded or failed
+        self.in_flight = set()
+        self.counters = {"uploaded": 0, "retried": 0, "failed": 0}
+        self.listeners = [] # Called with the job descriptor after each successful upload
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._idle = None # Set whenever nothing is queued or uploading
+
+        for path in (self.pending_dir, self.failed_dir, self.staging_dir):
+            os.makedirs(path, exist_ok=True)
+
+    # --- Producers ---
+
+    def staging_path(self, suffix: str = "") -> str:
+        """A path on the spool's filesystem, so enqueue_file() is a rename, not a copy."""
+        return os.path.join(self.staging_dir, f"{uuid.uuid4().hex}{suffix}")
+
+    def enqueue_file(self, local_path: str, blob_name: str, content_type: str, metadata: Optional[dict] = None) -> str:
+        """Takes ownership of `local_path` (moved into the spool) and schedules its upload."""
+        job_id = uuid.uuid4().hex
+        shutil.move(local_path, self._data_path(job_id))
+        return self._add_job(job_id, blob_name, content_type, metadata)
+
+    def enqueue_bytes(self, data: bytes, blob_name: str, content_type: str, metadata: Optional[dict] = None) -> str:
+        job_id = uuid.uuid4().hex
+        with open(self._data_path(job_id), "wb") as f:
+            f.write(data)
+        return self._add_job(job_id, blob_name, content_type, metadata)
+
+    def _add_job(self, job_id: str, blob_name: str, content_type: str, metadata: Optional[dict]) -> str:
+        job = {
+            "id": job_id,
+            "blob_name": blob_name,
+            "content_type": content_type,
+            "metadata": metadata or {},
+            "created_at": time.time(),
+            "attempts": 0,
+            "next_attempt_at": 0,
+            "size": os.path.getsize(self._data_path(job_id)),
+        }
+        self._save(job)
+        self._schedule(job)
+        logger.info(f"Spooled {blob_name} ({job['size']} bytes), queue depth {len(self.jobs)}")
+        return job_id
+
+    # --- Lifecycle ---
+
+    async def start(self):
+        """Starts the workers and resumes every job left over from a previous run."""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._idle = asyncio.Event()
+
+        for job in self.jobs.values(): # Enqueued before start()
+            self._queue.put_nowait(job["id"])
+        for name in os.listdir(self.pending_dir):
+            if name.endswith(".json") and name[:-5] not in self.jobs:
+                try:
+                    with open(os.path.join(self.pending_dir, name), "r", encoding="utf-8") as f:
+                        self._schedule(json.load(f))
+                except Exception as e:
+                    logger.error(f"Unreadable spool descriptor {name}: {e}")
+
+        self._update_idle()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Upload spool started with {self.workers} workers, {len(self.jobs)} jobs pending")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def flush(self, timeout: float) -> bool:
+        """Waits until nothing is queued or uploading. Returns False on timeout."""
+        if not self._idle:
+            return not self.jobs
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"Upload spool flush timed out with {len(self.jobs)} jobs pending")
+            return False
+
+    # --- Workers ---
+
+    def _schedule(self, job: dict):
+        self.jobs[job["id"]] = job
+        if not self._queue:
+            return # Picked up by start()
+        delay = job["next_attempt_at"] - time.time()
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, job["id"])
+        else:
+            self._queue.put_nowait(job["id"])
+        self._update_idle()
+
+    async def _worker(self, index: int):
+        while True:
+            job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            if job is None:
+                continue
+
+            self.in_flight.add(job_id)
+            started = time.monotonic()
+            try:
+                try:
+                    await asyncio.to_thread(self.uploader, self._data_path(job_id), job["blob_name"], job["content_type"])
+                except Exception as e:
+                    self._retry_or_fail(job, e)
+                else:
+                    job["upload_seconds"] = time.monotonic() - started
+                    self._complete(job)
+            except Exception as e:
+                # Bookkeeping failed (disk full, files removed by hand): forget the job so the worker
+                # and flush() keep going; whatever is left of it on disk is resumed on restart
+                self.jobs.pop(job_id, None)
+                logger.error(f"Upload spool bookkeeping failed for {job['blob_name']}: {e!r}")
+            finally:
+                self.in_flight.discard(job_id)
+                self._update_idle()
+
+    def _complete(self, job: dict):
+        self.jobs.pop(job["id"], None)
+        self.counters["uploaded"] += 1
+        for path in (self._data_path(job["id"]), self._descriptor_path(job["id"])):
+            if os.path.exists(path):
+                os.remove(path)
+        logger.info(f"Uploaded gs://{gcs.BUCKET_NAME}/{job['blob_name']} in {job['upload_seconds']:.2f}s")
+        for listener in self.listeners:
+            try:
+                listener(job)
+            except Exception as e:
+                logger.error(f"Upload listener failed for {job['blob_name']}: {e}")
+
+    def _retry_or_fail(self, job: dict, error: Exception):
+        job["attempts"] += 1
+        job["last_error"] = str(error)
+
+        if job["attempts"] >= self.max_attempts:
+            self.jobs.pop(job["id"], None)
+            self.counters["failed"] += 1
+            self._save(job)
+            for path in (self._data_path(job["id"]), self._descriptor_path(job["id"])):
+                if os.path.exists(path): # The data file may be what went missing
+                    shutil.move(path, os.path.join(self.failed_dir, os.path.basename(path)))
+            logger.error(f"Giving up on {job['blob_name']} after {job['attempts']} attempts: {error}")
+            return
+
+        delay = min(MAX_DELAY_SECONDS, BASE_DELAY_SECONDS * 2 ** (job["attempts"] - 1))
+        delay *= random.uniform(0.8, 1.2) # Jitter so a GCS outage does not end in a synchronized burst
+        job["next_attempt_at"] = time.time() + delay
+        self.counters["retried"] += 1
+        self._save(job)
+        self._schedule(job)
+        logger.warning(f"Upload of {job['blob_name']} failed (attempt {job['attempts']}), retrying in {delay:.0f}s: {error}")
+
+    # --- Helpers ---
+
+    def _data_path(self, job_id: str) -> str:
+        return os.path.join(self.pending_dir, f"{job_id}.data")
+
+    def _descriptor_path(self, job_id: str) -> str:
+        return os.path.join(self.pending_dir, f"{job_id}.json")
+
+    def _save(self, job: dict):
+        # Write-then-rename so a crash never leaves a truncated descriptor
+        tmp_path = self._descriptor_path(job["id"]) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, self._descriptor_path(job["id"]))
+
+    def _update_idle(self):
+        if not self._idle:
+            return
+        if self.jobs or self.in_flight:
+            self._idle.clear()
+        else:
+            self._idle.set()
+
+    def stats(self) -> dict:
+        now = time.time()
+        oldest = min((job["created_at"] for job in self.jobs.values()), default=None)
+        return {
+            "depth": len(self.jobs),
+            "in_flight": len(self.in_flight),
+            "bytes_pending": sum(job["size"] for job in self.jobs.values()),
+            "oldest_age_seconds": round(now - oldest, 1) if oldest else 0,
+            "failed_on_disk": sum(1 for n in os.listdir(self.failed_dir) if n.endswith(".json")),
+            "workers": sum(1 for task in self._tasks if not task.done()), # Running, not configured
+            **self.counters,
+        }
+
+
+# Process-wide spool; recorder and transcript logger enqueue here
+spool = UploadSpool()
@@ -0,0 +1,39 @@
+"""
+Silero VAD with one ONNX session per process.
+
+SileroVADAnalyzer loads the model file and builds an InferenceSession in its
+constructor, i.e. ~50ms of blocking work on the event loop at the start of
+every call. The session itself is stateless (the recurrent state lives in
+SileroOnnxModel), so calls can share it: each analyzer gets its own model
+state on top of the session loaded once during warm-up.
+"""
+import time
+import functools
+
+from pipecat.audio.vad.silero import SileroOnnxModel, SileroVADAnalyzer
+from pipecat.audio.vad.vad_analyzer import VADAnalyzer, VADParams
+
+
+@functools.cache
+def model_session():
+    """Loads the Silero model (first call only)."""
+    return SileroVADAnalyzer()._model.session
+
+
+class SharedSileroVADAnalyzer(SileroVADAnalyzer):
+    def __init__(self, *, sample_rate=None, params: VADParams = VADParams()):
+        VADAnalyzer.__init__(self, sample_rate=sample_rate, params=params)
+        model = SileroOnnxModel.__new__(SileroOnnxModel)
+        model.session = model_session()
+        model.sample_rates = [8000, 16000]
+        model.reset_states()
+        self._model = model
+        self._last_reset_time = 0
+        self.cpu_seconds = 0.0 # Inference runs in the executor, outside the call's loop accounting
+
+    def voice_confidence(self, buffer) -> float:
+        started = time.thread_time()
+        try:
+            return super().voice_confidence(buffer)
+        finally:
+            self.cpu_seconds += time.thread_time() - started
@@ -0,0 +1,69 @@
+import time
+import asyncio
+from typing import Callable, Optional
+from loguru import logger
+
+
+class Warmup:
+    """
+    Startup work that has to happen before the process takes calls: heavy
+    imports, models, clients and caches. The app starts serving right away
+    (so /healthz answers while this runs) and /readyz reports ready only once
+    every required step has finished.
+
+    Steps run in threads, concurrently unless one names another in `after`.
+    A failed optional step is logged and only costs its own cache.
+    """
+
+    def __init__(self):
+        self.steps = {} # name -> (fn, required, after)
+        self.timings = {} # name -> {"ms", "ok", "error"?}
+        self.import_ms: Optional[float] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.ready = False
+        self._tasks = {}
+
+    def add(self, name: str, fn: Callable, required: bool = True, after: Optional[str] = None):
+        self.steps[name] = (fn, required, after)
+
+    async def _run_step(self, name: str) -> bool:
+        fn, required, after = self.steps[name]
+        if after and not await self._tasks[after]:
+            self.timings[name] = {"ms": 0, "ok": False, "error": f"{after} failed"}
+            return False
+
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(fn)
+        except Exception as e:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.timings[name] = {"ms": round(elapsed, 1), "ok": False, "error": str(e)}
+            log = logger.error if required else logger.warning
+            log(f"Warm-up step {name} failed after {elapsed:.0f}ms: {e}")
+            return False
+
+        elapsed = (time.perf_counter() - started) * 1000
+        self.timings[name] = {"ms": round(elapsed, 1), "ok": True}
+        logger.info(f"Warm-up step {name}: {elapsed:.0f}ms")
+        return True
+
+    async def run(self):
+        self.started_at = time.perf_counter()
+        self._tasks = {name: asyncio.ensure_future(self._run_step(name)) for name in self.steps}
+        results = dict(zip(self._tasks, await asyncio.gather(*self._tasks.values())))
+        self.finished_at = time.perf_counter()
+
+        failed = [name for name, (_, required, _) in self.steps.items() if required and not results[name]]
+        self.ready = not failed
+        total = (self.finished_at - self.started_at) * 1000
+        if failed:
+            logger.error(f"Warm-up finished in {total:.0f}ms, NOT ready: {', '.join(failed)} failed")
+        else:
+            logger.info(f"Warm-up finished in {total:.0f}ms, ready")
+
+    def snapshot(self) -> dict:
+        total = None
+        if self.finished_at:
+            total = round((self.finished_at - self.started_at) * 1000, 1)
+        return {"import_ms": self.import_ms, "warmup_ms": total, "steps": self.timings}
@@ -0,0 +1,105 @@
+"""
+Compact multi-resolution waveform summary (min/max/RMS per bucket) of a call
+recording, so the dashboard can draw and seek before fetching any audio.
+
+The recorder feeds decoded PCM batches to WaveformBuilder while the call is
+live; render() turns the base buckets into the stored levels.
+"""
+import numpy as np
+
+BASE_SAMPLES_PER_POINT = 160 # 20ms at 8kHz, one Twilio frame
+LEVEL_FACTOR = 4 # Each level is 4x coarser: 20ms, 80ms, 320ms, 1.28s, 5.12s
+LEVELS = 5
+QUANT = 256 # int16 -> int8 range, plenty for drawing
+
+
+class WaveformBuilder:
+    def __init__(self, sample_rate: int = 8000, samples_per_point: int = BASE_SAMPLES_PER_POINT):
+        self.sample_rate = sample_rate
+        self.samples_per_point = samples_per_point
+        self.total_samples = 0
+        self._carry = np.empty(0, dtype=np.int16) # Samples that do not fill a bucket yet
+        self._mins, self._maxs, self._sumsq = [], [], []
+
+    def add(self, pcm: np.ndarray):
+        """Accumulates a batch of int16 mono samples."""
+        self.total_samples += pcm.size
+        samples = np.concatenate((self._carry, pcm)) if self._carry.size else pcm
+        usable = samples.size - samples.size % self.samples_per_point
+        if usable:
+            self._append(samples[:usable].reshape(-1, self.samples_per_point))
+        self._carry = samples[usable:].copy()
+
+    def _append(self, blocks: np.ndarray):
+        self._mins.append(blocks.min(axis=1))
+        self._maxs.append(blocks.max(axis=1))
+        self._sumsq.append(np.square(blocks, dtype=np.float64).sum(axis=1))
+
+    def finish(self) -> dict:
+        """Base-resolution buckets (NumPy arrays), ready for render()."""
+        if self._carry.size:
+            self._append(self._carry.reshape(1, -1))
+        counts = np.full(sum(m.size for m in self._mins), self.samples_per_point, dtype=np.int64)
+        if self._carry.size:
+            counts[-1] = self._carry.size
+            self._carry = np.empty(0, dtype=np.int16)
+        concat = lambda parts, dtype: np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+        return {
+            "sample_rate": self.sample_rate,
+            "samples_per_point": self.samples_per_point,
+            "total_samples": self.total_samples,
+            "min": concat(self._mins, np.int16),
+            "max": concat(self._maxs, np.int16),
+            "sumsq": concat(self._sumsq, np.float64),
+            "counts": counts,
+        }
+
+
+def _coarsen(values: np.ndarray, factor: int, reduce, fill) -> np.ndarray:
+    padded = np.concatenate((values, np.full(-values.size % factor, fill, dtype=values.dtype)))
+    return reduce(padded.reshape(-1, factor), axis=1)
+
+
+def render(base: dict, levels: int = LEVELS, factor: int = LEVEL_FACTOR) -> dict:
+    """Builds the stored JSON document: one entry per level, finest first."""
+    mins, maxs, sumsq, counts = base["min"], base["max"], base["sumsq"], base["counts"]
+    samples_per_point = base["samples_per_point"]
+    output = []
+    for _ in range(levels):
+        rms = np.sqrt(sumsq / np.maximum(counts, 1))
+        output.append({
+            "samples_per_point": samples_per_point,
+            "channels": [{
+                "min": np.floor_divide(mins, QUANT).astype(int).tolist(),
+                "max": np.floor_divide(maxs, QUANT).astype(int).tolist(),
+                "rms": np.round(rms / QUANT).astype(int).tolist(),
+            }],
+        })
+        if mins.size <= 1:
+            break
+        mins = _coarsen(mins, factor, np.min, np.iinfo(np.int16).max)
+        maxs = _coarsen(maxs, factor, np.max, np.iinfo(np.int16).min)
+        sumsq = _coarsen(sumsq, factor, np.sum, 0)
+        counts = _coarsen(counts, factor, np.sum, 0)
+        samples_per_point *= factor
+
+    return {
+        "version": 1,
+        "sample_rate": base["sample_rate"],
+        "duration_seconds": round(base["total_samples"] / base["sample_rate"], 3),
+        "scale": 32768 // QUANT, # Values are amplitudes divided by QUANT: full scale is +-128
+        "levels": output,
+    }
+
+
+def select_level(document: dict, max_points: int) -> dict:
+    """Finest level with at most `max_points` points (the coarsest if none fits)."""
+    levels = document["levels"]
+    chosen = next((l for l in levels if len(l["channels"][0]["min"]) <= max_points), levels[-1])
+    return {
+        "sample_rate": document["sample_rate"],
+        "duration_seconds": document["duration_seconds"],
+        "scale": document["scale"],
+        "levels_available": [l["samples_per_point"] for l in levels],
+        **chosen,
+    }
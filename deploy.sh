@@ -16,9 +16,47 @@ echo "📤 Uploading frontend/dist to VPS..."
 # but sticking to strict guide command:
 scp -o BatchMode=yes -r frontend/dist root@srv1135658.hstgr.cloud:/opt/siac_voz/frontend/
 
-# 3. Deploy on VPS
-echo "🔄 Connecting to VPS to restart services..."
-# Using reset --hard to ensure server matches repo and overwrites any untracked conflicting files
-ssh root@srv1135658.hstgr.cloud "cd /opt/siac_voz && git fetch origin main && git reset --hard origin/main && docker compose build && docker compose up -d"
+# 3. Deploy on VPS (blue/green)
+echo "🔄 Connecting to VPS to roll out the new version..."
+# Using reset --hard to ensure server matches repo and overwrites any untracked conflicting files.
+# The idle colour is started and must pass /readyz before the live one gets SIGTERM, so calls keep
+# being answered throughout: the old replica drains (refuses new calls, lets live ones finish and
+# upload, up to stop_grace_period) while the new one takes the new calls.
+ssh root@srv1135658.hstgr.cloud 'bash -s' <<'EOF'
+set -e
+cd /opt/siac_voz
+git fetch origin main && git reset --hard origin/main
+
+if [ -n "$(docker compose ps -q --status running app-green)" ]; then
+    old=app-green new=app-blue
+else
+    # Also the first roll-out: the pre-blue/green container still uses blue's spool volume
+    old=app-blue new=app-green
+fi
+echo "Live: $old, starting $new"
+docker compose build "$new"
+docker compose up -d --no-deps --force-recreate "$new"
+
+ready=""
+for _ in $(seq 90); do
+    if docker compose exec -T "$new" python -c "import urllib.request; urllib.request.urlopen('http://localhost:8765/readyz', timeout=2)" 2>/dev/null; then
+        ready=1
+        break
+    fi
+    sleep 2
+done
+if [ -z "$ready" ]; then
+    echo "❌ $new never became ready; leaving $old in service"
+    docker compose logs --tail 50 "$new"
+    docker compose stop "$new"
+    exit 1
+fi
+
+echo "$new is ready; draining $old..."
+if [ -n "$(docker ps -q --filter name=^siac_voz$)" ]; then
+    docker stop --time 660 siac_voz && docker rm siac_voz # Pre-blue/green container
+fi
+docker compose stop "$old"
+EOF
 
 echo "✅ Deployment Complete!"